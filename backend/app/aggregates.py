@@ -0,0 +1,157 @@
+"""
+Per-course aggregates for course listings and instructor pages.
+
+Totals live in the course_stats table and are kept current by the write paths
+that change them — bump_course_stats() on enrollment, lesson completion and
+lesson/module create/delete (and on reviews and payments, once those have
+endpoints); refresh_course_stats() where a delta is awkward (bulk deletes).
+Readers join against course_stats instead of aggregating the fact tables.
+
+A missing row is rebuilt on first read with one GROUP BY course_id per fact
+table, so the number of queries stays constant no matter how many courses
+are involved. rebuild_course_stats() (POST /api/admin/course-stats/rebuild,
+backend/rebuild_course_stats.py) recomputes every row.
+"""
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.models import Course, CourseStats, Enrollment, Payment, Review, Lesson, Module
+
+_COUNTERS = ("students", "completion_sum", "revenue", "rating_sum", "rating_count", "lesson_count", "module_count")
+
+
+def _zero():
+    return dict.fromkeys(_COUNTERS, 0)
+
+
+def compute_course_stats(db: Session, course_ids: list[int]) -> dict[int, dict]:
+    """Aggregate the fact tables: {course_id: {counter: value}} for every id passed."""
+    stats = {cid: _zero() for cid in course_ids}
+    if not course_ids:
+        return stats
+
+    for cid, students, completion in (
+        db.query(Enrollment.course_id, func.count(Enrollment.id), func.sum(Enrollment.completion_pct))
+        .filter(Enrollment.course_id.in_(course_ids))
+        .group_by(Enrollment.course_id)
+    ):
+        stats[cid]["students"] = students
+        stats[cid]["completion_sum"] = float(completion or 0)
+
+    for cid, gross in (
+        db.query(Payment.course_id, func.sum(Payment.amount))
+        .filter(Payment.course_id.in_(course_ids), Payment.status == "completed")
+        .group_by(Payment.course_id)
+    ):
+        stats[cid]["revenue"] = float(gross or 0)
+
+    for cid, total, n in (
+        db.query(Review.course_id, func.sum(Review.rating), func.count(Review.rating))
+        .filter(Review.course_id.in_(course_ids))
+        .group_by(Review.course_id)
+    ):
+        stats[cid]["rating_sum"] = float(total or 0)
+        stats[cid]["rating_count"] = n
+
+    for cid, n in (
+        db.query(Lesson.course_id, func.count(Lesson.id))
+        .filter(Lesson.course_id.in_(course_ids))
+        .group_by(Lesson.course_id)
+    ):
+        stats[cid]["lesson_count"] = n
+
+    for cid, n in (
+        db.query(Module.course_id, func.count(Module.id))
+        .filter(Module.course_id.in_(course_ids))
+        .group_by(Module.course_id)
+    ):
+        stats[cid]["module_count"] = n
+
+    return stats
+
+
+def ensure_course_stats(db: Session, course_ids: list[int] | None = None):
+    """Build the course_stats rows that are missing (all courses if course_ids is None). Commits if it wrote any."""
+    q = db.query(Course.id).outerjoin(CourseStats, CourseStats.course_id == Course.id).filter(CourseStats.course_id.is_(None))
+    if course_ids is not None:
+        if not course_ids:
+            return
+        q = q.filter(Course.id.in_(course_ids))
+    missing = [cid for (cid,) in q]
+    if not missing:
+        return
+    db.bulk_insert_mappings(CourseStats, [{"course_id": cid, **s} for cid, s in compute_course_stats(db, missing).items()])
+    try:
+        db.commit()
+    except IntegrityError:
+        # Another request built some of them first
+        db.rollback()
+    if course_ids is not None:
+        # The commit expired the caller's Course objects: reload them in one query, not one per course
+        db.query(Course).filter(Course.id.in_(course_ids)).all()
+
+
+def rebuild_course_stats(db: Session) -> int:
+    """Recompute every row from the fact tables. Caller commits."""
+    db.query(CourseStats).delete(synchronize_session=False)
+    course_ids = [cid for (cid,) in db.query(Course.id)]
+    db.bulk_insert_mappings(CourseStats, [{"course_id": cid, **s} for cid, s in compute_course_stats(db, course_ids).items()])
+    return len(course_ids)
+
+
+def bump_course_stats(db: Session, course_id: int, **deltas):
+    """
+    Add deltas to the course's counters in the caller's transaction, e.g.
+    bump_course_stats(db, cid, students=1). A course without a row is left
+    alone — its row is built from the fact tables on the next read.
+    """
+    db.query(CourseStats).filter(CourseStats.course_id == course_id).update(
+        {getattr(CourseStats, k): getattr(CourseStats, k) + v for k, v in deltas.items()},
+        synchronize_session=False)
+
+
+def refresh_course_stats(db: Session, course_ids):
+    """Drop the rows so they are rebuilt on next read. Caller commits."""
+    course_ids = list(course_ids)
+    if course_ids:
+        db.query(CourseStats).filter(CourseStats.course_id.in_(course_ids)).delete(synchronize_session=False)
+
+
+def stats_dict(row: CourseStats | None) -> dict:
+    """Listing shape of a course_stats row (None → zeros)."""
+    if row is None:
+        return {"students": 0, "revenue": 0.0, "avg_completion": 0.0, "avg_rating": 0.0,
+                "rating_count": 0, "lesson_count": 0, "module_count": 0}
+    return {
+        "students": row.students,
+        "revenue": row.revenue,
+        "avg_completion": row.completion_sum / row.students if row.students else 0.0,
+        "avg_rating": row.rating_sum / row.rating_count if row.rating_count else 0.0,
+        "rating_count": row.rating_count,
+        "lesson_count": row.lesson_count,
+        "module_count": row.module_count,
+    }
+
+
+def course_aggregates(db: Session, course_ids: list[int]) -> dict[int, dict]:
+    """
+    Returns {course_id: {students, revenue, avg_completion, avg_rating,
+    rating_count, lesson_count, module_count}}. Revenue is gross (completed payments).
+    """
+    if not course_ids:
+        return {}
+    ensure_course_stats(db, course_ids)
+    rows = {r.course_id: r for r in db.query(CourseStats).filter(CourseStats.course_id.in_(course_ids))}
+    return {cid: stats_dict(rows.get(cid)) for cid in course_ids}
+
+
+def aggregate_totals(stats: dict[int, dict]) -> dict:
+    """Roll per-course aggregates up to instructor-wide totals (weighted averages)."""
+    students = sum(s["students"] for s in stats.values())
+    ratings = sum(s["rating_count"] for s in stats.values())
+    return {
+        "students": students,
+        "revenue": sum(s["revenue"] for s in stats.values()),
+        "avg_completion": sum(s["avg_completion"] * s["students"] for s in stats.values()) / students if students else 0,
+        "avg_rating": sum(s["avg_rating"] * s["rating_count"] for s in stats.values()) / ratings if ratings else 0,
+    }
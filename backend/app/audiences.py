@@ -0,0 +1,128 @@
+"""
+Typed notification audiences (notification_audiences).
+
+Notification.target stays as the human-readable label shown in admin lists,
+but visibility is decided by NotificationAudience rows:
+
+  kind='all'                  everyone
+  kind='role',   role=...     every user with that role
+  kind='course', course_id=.. students enrolled in the course
+  kind='user',   user_id=...  one user (notify_many() adds many to one notification)
+
+Rows are derived from the target automatically when a Notification is
+flushed (and replaced when its target changes), so creating notifications
+through the ORM needs no extra calls. "Visible to user X" is then a semi-join
+on the (user_id | role | course_id | kind, notification_id) indexes instead of
+matching target strings.
+"""
+from sqlalchemy import event, select, or_, and_, exists, insert, literal, inspect, Select
+from sqlalchemy.orm import Session
+from app.models import Notification, NotificationAudience, Enrollment, User, RoleEnum
+
+_ROLE_TARGETS = {
+    "students": (RoleEnum.student,),
+    "all_students": (RoleEnum.student,),
+    "instructors": (RoleEnum.instructor,),
+    "admins": (RoleEnum.admin, RoleEnum.super_admin),
+    "admin": (RoleEnum.admin,),
+    "super_admin": (RoleEnum.super_admin,),
+}
+
+
+def parse_target(target: str | None) -> list[dict]:
+    """Notification.target -> audience row values. Unknown targets address nobody."""
+    target = target or ""
+    if target == "all":
+        return [{"kind": "all"}]
+    if target.isdigit():
+        return [{"kind": "user", "user_id": int(target)}]
+    if target.startswith("course_") and target[7:].isdigit():
+        return [{"kind": "course", "course_id": int(target[7:])}]
+    return [{"kind": "role", "role": r} for r in _ROLE_TARGETS.get(target, ())]
+
+
+def _role(user: User) -> RoleEnum:
+    return user.role if isinstance(user.role, RoleEnum) else RoleEnum(user.role)
+
+
+def visible_to(user: User):
+    """SELECT of ids of every notification (any notif_type) addressed to user."""
+    A = NotificationAudience
+    role = _role(user)
+    match = [
+        A.kind == "all",
+        and_(A.kind == "role", A.role == role),
+        and_(A.kind == "user", A.user_id == user.id),
+    ]
+    if role == RoleEnum.student:
+        match.append(and_(A.kind == "course", A.course_id.in_(
+            select(Enrollment.course_id).where(Enrollment.student_id == user.id))))
+    return select(A.notification_id).where(or_(*match))
+
+
+def audience_members(notification_id: int):
+    """SELECT of ids of every user a stored notification is addressed to."""
+    A = NotificationAudience
+    return select(User.id).where(exists().where(
+        A.notification_id == notification_id,
+        or_(
+            A.kind == "all",
+            and_(A.kind == "role", A.role == User.role),
+            and_(A.kind == "user", A.user_id == User.id),
+            and_(A.kind == "course", User.role == RoleEnum.student, exists().where(
+                Enrollment.course_id == A.course_id, Enrollment.student_id == User.id)),
+        ),
+    ))
+
+
+def add_users(db: Session, notification_id: int, recipients) -> int:
+    """Address an existing notification to more users (a SELECT of ids or a list). Caller commits."""
+    if not isinstance(recipients, Select):
+        recipients = list(recipients)
+        if not recipients:
+            return 0
+        db.execute(insert(NotificationAudience), [
+            {"notification_id": notification_id, "kind": "user", "user_id": uid} for uid in recipients])
+        return len(recipients)
+    user_id = recipients.subquery().c[0]
+    stmt = insert(NotificationAudience).from_select(
+        ["notification_id", "kind", "user_id"],
+        select(literal(notification_id), literal("user"), user_id),
+    )
+    return db.execute(stmt).rowcount
+
+
+def _target_changed(n: Notification) -> bool:
+    return inspect(n).attrs.target.history.has_changes()
+
+
+@event.listens_for(Session, "before_flush")
+def _derive_audiences(session, flush_context, instances):
+    with session.no_autoflush:
+        for obj in session.new:
+            if isinstance(obj, Notification) and not obj.audiences:
+                obj.audiences = [NotificationAudience(**a) for a in parse_target(obj.target)]
+        for obj in session.dirty:
+            if isinstance(obj, Notification) and session.is_modified(obj) and _target_changed(obj):
+                obj.audiences = [NotificationAudience(**a) for a in parse_target(obj.target)]
+
+
+def backfill_audiences(db: Session, batch: int = 1000) -> int:
+    """
+    Create audience rows for notifications written before the table existed.
+    Returns the number of rows created. Caller commits.
+    """
+    done = 0
+    last_id = 0
+    while True:
+        rows = db.query(Notification.id, Notification.target).filter(
+            Notification.id > last_id,
+            ~exists().where(NotificationAudience.notification_id == Notification.id),
+        ).order_by(Notification.id).limit(batch).all()
+        if not rows:
+            return done
+        values = [{"notification_id": nid, **a} for nid, target in rows for a in parse_target(target)]
+        if values:
+            db.execute(insert(NotificationAudience), values)
+        done += len(values)
+        last_id = rows[-1][0]
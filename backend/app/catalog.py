@@ -0,0 +1,119 @@
+"""
+Public course catalog (GET /api/student/catalog).
+
+Apart from each student's `enrolled` flags the catalog is the same for every
+caller, so it is built once per catalog version: catalog_version holds a
+counter that write paths bump with bump_catalog() whenever a listed course can
+change — publish/unpublish and other status changes, course edits and deletes,
+enrollments, lesson create/delete, instructor renames (and reviews, once they
+have an endpoint). A request reads the version (one primary-key lookup) and
+the student's enrolled course ids (ix_enrollments_student_course); the catalog
+query only runs again once the version has moved. Courses are kept
+pre-serialized and the enrolled flag is appended per request.
+
+Search terms go through app/search.py (ranked full-text matches); the page of
+ids it returns is rendered from the same cached courses. Without a term the
+cached list is filtered in place. Both paginate with limit/offset.
+
+The ETag covers the version, the query and the enrolled ids, so a client
+revalidating with If-None-Match gets a 304 without the body being built.
+"""
+import hashlib, json, threading
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.models import Course, CourseStats, CatalogVersion, Enrollment, User
+from app.aggregates import ensure_course_stats
+from app.search import search_index
+
+_lock = threading.Lock()
+# (version, [(course_id, language, level, json without the closing brace)] newest first, {course_id: entry})
+_payload: tuple[int, list[tuple], dict[int, tuple]] | None = None
+
+
+def catalog_version(db: Session) -> int:
+    version = db.query(CatalogVersion.version).filter(CatalogVersion.id == 1).scalar()
+    if version is None:
+        db.add(CatalogVersion(id=1, version=1))
+        try:
+            db.commit()
+        except IntegrityError:
+            # Another request created it first
+            db.rollback()
+        version = db.query(CatalogVersion.version).filter(CatalogVersion.id == 1).scalar()
+    return version
+
+
+def bump_catalog(db: Session):
+    """Invalidate the cached catalog in the caller's transaction. Caller commits."""
+    db.query(CatalogVersion).filter(CatalogVersion.id == 1).update(
+        {CatalogVersion.version: CatalogVersion.version + 1}, synchronize_session=False)
+
+
+def enrolled_course_ids(db: Session, student_id: int) -> set[int]:
+    return {cid for (cid,) in db.query(Enrollment.course_id).filter(Enrollment.student_id == student_id)}
+
+
+def catalog_etag(version: int, enrolled: set[int], *query) -> str:
+    key = json.dumps([*query, sorted(enrolled)]).encode()
+    return f'"c{version}-{hashlib.blake2b(key, digest_size=10).hexdigest()}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+
+def _build(db: Session) -> list[tuple]:
+    ensure_course_stats(db)
+    rows = db.query(
+        Course,
+        User.name.label("instructor_name"),
+        User.avatar_initials.label("instructor_initials"),
+        func.coalesce(CourseStats.lesson_count, 0).label("lesson_count"),
+        func.coalesce(CourseStats.students, 0).label("student_count"),
+        func.coalesce(CourseStats.rating_sum / func.nullif(CourseStats.rating_count, 0), 0).label("avg_rating"),
+    ).outerjoin(User, User.id == Course.instructor_id
+    ).outerjoin(CourseStats, CourseStats.course_id == Course.id
+    ).filter(Course.status == "published"
+    ).order_by(Course.created_at.desc()).all()
+    courses = []
+    for c, instructor_name, instructor_initials, lesson_count, student_count, avg_rating in rows:
+        fields = json.dumps({
+            "id": c.id, "title": c.title, "description": c.description, "language": c.language,
+            "level": c.level, "flag_emoji": c.flag_emoji, "thumbnail_url": c.thumbnail_url,
+            "price": c.price, "instructor": instructor_name or "", "instructor_initials": instructor_initials or "",
+            "lesson_count": lesson_count, "student_count": student_count,
+            "rating": round(float(avg_rating), 1),
+        }, ensure_ascii=False, separators=(",", ":"))
+        courses.append((c.id, (c.language or "").lower(), c.level, fields[:-1]))
+    return courses
+
+
+def _courses(db: Session, version: int) -> tuple[list[tuple], dict[int, tuple]]:
+    global _payload
+    payload = _payload
+    if payload is None or payload[0] != version:
+        with _lock:
+            payload = _payload
+            if payload is None or payload[0] != version:
+                courses = _build(db)
+                payload = _payload = (version, courses, {c[0]: c for c in courses})
+    return payload[1], payload[2]
+
+
+def catalog_page(db: Session, version: int, enrolled: set[int], search: str, language: str, level: str,
+                 limit: int | None, offset: int) -> tuple[bytes, int]:
+    """(JSON array of published courses, total matches). Best match first when searching, else newest first."""
+    courses, by_id = _courses(db, version)
+    if search:
+        ids, total = search_index.courses(db, search, language, level, limit, offset)
+        page = [by_id[cid] for cid in ids if cid in by_id]
+    else:
+        language = language.lower()
+        matches = [c for c in courses if language in c[1] and (not level or c[2] == level)]
+        total, page = len(matches), matches[offset:offset + limit if limit else None]
+    items = [f'{fields},"enrolled":{"true" if cid in enrolled else "false"}}}' for cid, _, _, fields in page]
+    return f"[{','.join(items)}]".encode(), total
@@ -0,0 +1,87 @@
+"""
+Course curriculum tree (modules → lessons, quizzes → questions) in a constant
+number of queries: one flat query per level, stitched together by id, instead
+of one query per level per parent. Shared by the course detail endpoints of
+the student, instructor and admin routers.
+"""
+from collections import defaultdict
+from sqlalchemy import func, or_, and_
+from sqlalchemy.orm import Session
+from app.models import Module, Lesson, ModuleQuiz, QuizQuestion
+
+
+class Curriculum:
+    def __init__(self, modules: list[Module], lessons: dict[int, list[Lesson]], loose_lessons: list[Lesson],
+                 quizzes: dict[int, list[ModuleQuiz]]):
+        self.modules = modules
+        self.lessons = lessons                  # module id → lessons, by order
+        self.loose_lessons = loose_lessons      # lessons of the course outside any module
+        self.quizzes = quizzes                  # module id → quizzes, by order
+        self.questions: dict[int, list[QuizQuestion]] = {}   # quiz id → questions (with_questions)
+        self.question_counts: dict[int, int] = {}            # quiz id → count (otherwise)
+
+
+def load_curriculum(db: Session, course_id: int, with_questions: bool = True) -> Curriculum:
+    """
+    Four queries whatever the course size: modules, lessons, quizzes, and
+    either the questions or (with_questions=False) their counts per quiz.
+    """
+    modules = db.query(Module).filter(Module.course_id == course_id).order_by(Module.order).all()
+    module_ids = [m.id for m in modules]
+
+    lessons, loose = defaultdict(list), []
+    in_course = and_(Lesson.course_id == course_id, Lesson.module_id.is_(None))
+    for l in db.query(Lesson).filter(or_(Lesson.module_id.in_(module_ids), in_course) if module_ids else in_course).order_by(Lesson.order):
+        (lessons[l.module_id] if l.module_id is not None else loose).append(l)
+
+    quizzes = defaultdict(list)
+    quiz_ids = []
+    if module_ids:
+        for q in db.query(ModuleQuiz).filter(ModuleQuiz.module_id.in_(module_ids)).order_by(ModuleQuiz.order):
+            quizzes[q.module_id].append(q)
+            quiz_ids.append(q.id)
+
+    curriculum = Curriculum(modules=modules, lessons=lessons, loose_lessons=loose, quizzes=quizzes)
+    if not quiz_ids:
+        return curriculum
+    if with_questions:
+        questions = defaultdict(list)
+        for qu in db.query(QuizQuestion).filter(QuizQuestion.quiz_id.in_(quiz_ids)).order_by(QuizQuestion.order):
+            questions[qu.quiz_id].append(qu)
+        curriculum.questions = questions
+    else:
+        curriculum.question_counts = dict(
+            db.query(QuizQuestion.quiz_id, func.count(QuizQuestion.id))
+            .filter(QuizQuestion.quiz_id.in_(quiz_ids)).group_by(QuizQuestion.quiz_id).all())
+    return curriculum
+
+
+def quiz_dict(q: ModuleQuiz) -> dict:
+    return {
+        "id": q.id, "title": q.title, "position": q.position, "passing_score": q.passing_score,
+        "time_limit_min": q.time_limit_min, "is_required": q.is_required, "order": q.order,
+    }
+
+
+def question_dict(qu: QuizQuestion) -> dict:
+    return {
+        "id": qu.id, "question_text": qu.question_text, "question_type": qu.question_type,
+        "options": qu.options, "correct_answer": qu.correct_answer, "explanation": qu.explanation,
+        "points": qu.points, "order": qu.order
+    }
+
+
+def editor_lesson_dict(l: Lesson) -> dict:
+    return {"id": l.id, "title": l.title, "lesson_type": l.lesson_type, "duration_min": l.duration_min,
+            "video_url": l.video_url, "content": l.content, "resource_url": l.resource_url,
+            "description": l.description, "order": l.order, "is_preview": l.is_preview}
+
+
+def editor_modules(cur: Curriculum) -> list[dict]:
+    """Full module tree with answers — the instructor course editor's shape."""
+    return [{
+        "id": m.id, "title": m.title, "description": m.description, "order": m.order,
+        "lessons": [editor_lesson_dict(l) for l in cur.lessons.get(m.id, [])],
+        "quizzes": [{**quiz_dict(q), "questions": [question_dict(qu) for qu in cur.questions.get(q.id, [])]}
+                    for q in cur.quizzes.get(m.id, [])],
+    } for m in cur.modules]
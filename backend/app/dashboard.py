@@ -0,0 +1,91 @@
+"""
+Admin dashboard snapshot.
+
+Every KPI on GET /api/admin/dashboard comes from one SELECT: one single-row
+aggregate subquery per table (counts split with FILTER clauses), cross-joined
+into a single result row. Monthly revenue is the only other query.
+
+The snapshot is cached for ADMIN_DASHBOARD_TTL seconds (default 30, 0
+disables). When it expires one request recomputes it; concurrent requests keep
+getting the previous snapshot meanwhile, and only wait when there is none.
+Responses carry generated_at and snapshot_age_seconds.
+"""
+import os, threading, time
+from datetime import datetime
+from sqlalchemy import func, select, true
+from sqlalchemy.orm import Session
+from app.models import User, Course, Payment, Enrollment, Payout, Report, MonthlyRevenue, RoleEnum, PulseStateEnum
+from app.pulse_distribution import STATES
+
+TTL = float(os.getenv("ADMIN_DASHBOARD_TTL", "30"))
+
+
+def _kpi_select():
+    users = select(
+        func.count(User.id).label("total_users"),
+        func.count(User.id).filter(User.role == RoleEnum.student).label("total_students"),
+        func.count(User.id).filter(User.role == RoleEnum.instructor).label("total_instructors"),
+        *(func.count(User.id).filter(User.pulse_state == PulseStateEnum(s)).label(f"pulse_{s}") for s in STATES),
+    ).subquery()
+    courses = select(
+        func.count(Course.id).filter(Course.status == "published").label("active_courses"),
+        func.count(Course.id).filter(Course.status == "pending").label("pending_courses"),
+    ).subquery()
+    payments = select(
+        func.coalesce(func.sum(Payment.amount).filter(Payment.status == "completed"), 0).label("total_revenue"),
+    ).subquery()
+    enrollments = select(func.count(Enrollment.id).label("total_enrollments")).subquery()
+    payouts = select(func.count(Payout.id).filter(Payout.status == "pending").label("pending_payouts")).subquery()
+    reports = select(func.count(Report.id).filter(Report.status == "open").label("open_reports")).subquery()
+    return (
+        select(users, courses, payments, enrollments, payouts, reports)
+        .select_from(users)
+        .join(courses, true()).join(payments, true()).join(enrollments, true())
+        .join(payouts, true()).join(reports, true())
+    )
+
+
+def compute_snapshot(db: Session) -> dict:
+    row = db.execute(_kpi_select()).mappings().one()
+    monthly = (db.query(MonthlyRevenue).filter(MonthlyRevenue.instructor_id == None)
+               .order_by(MonthlyRevenue.year, MonthlyRevenue.month).all())
+    return {
+        "total_users": row["total_users"],
+        "total_students": row["total_students"],
+        "total_instructors": row["total_instructors"],
+        "total_revenue": round(float(row["total_revenue"]), 2),
+        "active_courses": row["active_courses"],
+        "pending_courses": row["pending_courses"],
+        "total_enrollments": row["total_enrollments"],
+        "pending_payouts": row["pending_payouts"],
+        "open_reports": row["open_reports"],
+        "pulse_distribution": {s: row[f"pulse_{s}"] for s in STATES},
+        "monthly_revenue": [{"month": r.month, "year": r.year, "gross": r.gross, "net": r.net} for r in monthly],
+    }
+
+
+class DashboardSnapshot:
+    def __init__(self, ttl: float = TTL):
+        self.ttl = ttl
+        self._refresh = threading.Lock()   # held by the one request recomputing
+        # (kpis, generated_at, time.monotonic() when computed), swapped as a whole
+        self._snapshot: tuple[dict, datetime, float] | None = None
+
+    def _fresh(self) -> bool:
+        snap = self._snapshot
+        return snap is not None and time.monotonic() - snap[2] < self.ttl
+
+    def get(self, db: Session) -> dict:
+        if not self._fresh():
+            # Serve the stale snapshot rather than queue behind whoever is refreshing it
+            if self._refresh.acquire(blocking=self._snapshot is None):
+                try:
+                    if not self._fresh():
+                        self._snapshot = (compute_snapshot(db), datetime.utcnow(), time.monotonic())
+                finally:
+                    self._refresh.release()
+        kpis, generated_at, computed = self._snapshot
+        return {**kpis, "generated_at": generated_at,
+                "snapshot_age_seconds": round(time.monotonic() - computed, 3)}
+
+dashboard_snapshot = DashboardSnapshot()
@@ -0,0 +1,18 @@
+"""
+Batch user hydration — load the name/initials/avatar shown next to reactions,
+replies and senders with one IN query instead of a lookup per row.
+"""
+from typing import Iterable
+from sqlalchemy.orm import Session
+from app.models import User
+
+UNKNOWN_USER = {"name": "Unknown", "initials": "?", "avatar_url": None}
+
+
+def user_summaries(db: Session, user_ids: Iterable[int | None]) -> dict[int, dict]:
+    """{user_id: {name, initials, avatar_url}} for the given ids (missing users are omitted)."""
+    ids = {uid for uid in user_ids if uid is not None}
+    if not ids:
+        return {}
+    rows = db.query(User.id, User.name, User.avatar_initials, User.avatar_url).filter(User.id.in_(ids))
+    return {uid: {"name": name, "initials": initials, "avatar_url": url} for uid, name, initials, url in rows}
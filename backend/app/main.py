@@ -5,7 +5,13 @@ from app.models import Base, engine
 from app.routers import auth, admin, instructor, student, messages, meetings, notifications
 from app.routers import ethics as ethics_router
 from app.routers import translate as translate_router
-import os
+from app.routers import realtime as realtime_router
+from app.realtime import hub
+from app.pulse_worker import pulse_worker
+from app.pulse_predictor import predictor
+from app.pulse_pool import pulse_pool
+from fastapi.responses import JSONResponse
+import asyncio, os
 
 Base.metadata.create_all(bind=engine)
 
@@ -29,6 +35,8 @@ def _run_migrations():
         ("users",         "pending_email",         "VARCHAR"),
         ("users",         "email_change_token",    "VARCHAR"),
         ("users",         "email_change_expiry",   "TIMESTAMP"),
+        ("users",         "pulse_changed_at",      "TIMESTAMP"),
+        ("users",         "pulse_scored_at",       "TIMESTAMP"),
         # courses
         ("courses",       "subtitle",              "VARCHAR"),
         ("courses",       "category",              "VARCHAR"),
@@ -55,6 +63,21 @@ def _run_migrations():
         ("lessons",       "mime_type",              "VARCHAR"),
         ("lessons",       "file_size_bytes",        "INTEGER"),
     ]
+    # Indexes declared on models are only created with their table — add them to existing tables here
+    indexes = [
+        ("ix_messages_sender_receiver_created", "messages", "sender_id, receiver_id, created_at"),
+        ("ix_messages_receiver_is_read",        "messages", "receiver_id, is_read"),
+        ("ix_enrollments_student_course",       "enrollments", "student_id, course_id"),
+        ("ix_users_created_id",                 "users",       "created_at, id"),
+        ("ix_users_name_id",                    "users",       "name, id"),
+        ("ix_courses_created_id",               "courses",     "created_at, id"),
+        ("ix_courses_title_id",                 "courses",     "title, id"),
+        ("ix_payments_created_id",              "payments",    "created_at, id"),
+        ("ix_payments_amount_id",               "payments",    "amount, id"),
+        ("ix_payouts_requested_id",             "payouts",     "requested_at, id"),
+        ("ix_payouts_amount_id",                "payouts",     "amount, id"),
+        ("ix_audit_logs_created_id",            "audit_logs",  "created_at, id"),
+    ]
     with engine.connect() as conn:
         for table, col, definition in migrations:
             try:
@@ -62,9 +85,33 @@ def _run_migrations():
                 conn.commit()
             except Exception:
                 conn.rollback()
+        for name, table, cols in indexes:
+            try:
+                conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({cols})"))
+                conn.commit()
+            except Exception:
+                conn.rollback()
 
 _run_migrations()
 
+from app.search import install_indexes as _install_search_indexes
+_install_search_indexes(engine)
+
+def _backfill_audiences():
+    from app.models import SessionLocal
+    from app.audiences import backfill_audiences
+    from app.notification_state import reset_unread_counters
+    db = SessionLocal()
+    try:
+        # Counters built before audiences existed used the old target matching
+        if backfill_audiences(db):
+            reset_unread_counters(db)
+        db.commit()
+    finally:
+        db.close()
+
+_backfill_audiences()
+
 app = FastAPI(title="FluentFusion API")
 
 _frontend = os.getenv("FRONTEND_URL", "http://localhost:5173")
@@ -79,12 +126,26 @@ _origins = [
 if _frontend not in _origins:
     _origins.append(_frontend)
 
+@app.on_event("startup")
+async def _start_realtime():
+    hub.start(asyncio.get_running_loop())
+
+@app.on_event("startup")
+def _start_pulse_worker():
+    predictor.load_async()
+    pulse_worker.start()
+
+@app.on_event("shutdown")
+def _stop_pulse_pool():
+    pulse_pool.shutdown()
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=_origins,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Total-Count", "X-Total-Count-Estimated", "X-Next-Cursor"],
 )
 
 # Required for Google One Tap postMessage to work cross-origin
@@ -107,6 +168,7 @@ app.include_router(meetings.router)
 app.include_router(notifications.router)
 app.include_router(ethics_router.router)
 app.include_router(translate_router.router)
+app.include_router(realtime_router.router)
 
 @app.get("/")
 def root():
@@ -123,6 +185,14 @@ def root():
 def health():
     return {"status": "ok"}
 
+@app.get("/health/pulse")
+def health_pulse():
+    """Readiness probe for the PULSE model — 503 until it has finished loading."""
+    body = {"status": predictor.status, "layout": predictor.layout, "load_seconds": predictor.load_seconds}
+    if predictor.error:
+        body["error"] = predictor.error
+    return JSONResponse(body, status_code=200 if predictor.status == "ready" else 503)
+
 @app.get("/test-email")
 def test_email():
     from app.email_utils import EMAIL_ENABLED, SENDGRID_API_KEY, FROM_EMAIL, send_email
@@ -0,0 +1,75 @@
+"""
+Shared direct-message queries used by the messages, student and instructor routers.
+"""
+from sqlalchemy import func, case, or_
+from sqlalchemy.orm import Session
+from app.models import User, Message
+
+
+def list_threads(db: Session, user_id: int, inbound_only: bool = False) -> list[tuple[User, Message, int]]:
+    """
+    One row per conversation partner: (peer, last message, unread count),
+    newest conversation first. Two queries total regardless of peer count:
+    a ROW_NUMBER() window over the peer side of each message picks the latest
+    message per conversation (joined to the peer's User row), and a single
+    GROUP BY sender_id counts unread messages.
+    inbound_only restricts threads to peers who have messaged the user.
+    """
+    if inbound_only:
+        mine = Message.receiver_id == user_id
+    else:
+        mine = or_(Message.sender_id == user_id, Message.receiver_id == user_id)
+    peer_id = case((Message.sender_id == user_id, Message.receiver_id), else_=Message.sender_id)
+    ranked = (
+        db.query(
+            Message.id.label("id"),
+            peer_id.label("peer_id"),
+            func.row_number().over(
+                partition_by=peer_id,
+                order_by=(Message.created_at.desc(), Message.id.desc()),
+            ).label("rn"),
+        )
+        .filter(mine)
+        .subquery()
+    )
+    rows = (
+        db.query(User, Message)
+        .join(ranked, ranked.c.peer_id == User.id)
+        .join(Message, Message.id == ranked.c.id)
+        .filter(ranked.c.rn == 1)
+        .order_by(Message.created_at.desc(), Message.id.desc())
+        .all()
+    )
+    unread = dict(
+        db.query(Message.sender_id, func.count(Message.id))
+        .filter(Message.receiver_id == user_id, Message.is_read == False)
+        .group_by(Message.sender_id)
+        .all()
+    )
+    return [(peer, last, unread.get(peer.id, 0)) for peer, last in rows]
+
+
+def conversation_page(db: Session, user_id: int, peer_id: int, before_id: int | None = None,
+                      after_id: int | None = None, limit: int = 50) -> list[Message]:
+    """
+    Keyset page of a two-person conversation, oldest first.
+      after_id  — only messages newer than this id (incremental "since" fetch)
+      before_id — the `limit` messages immediately older than this id (scroll back)
+      neither   — the latest `limit` messages
+    """
+    q = db.query(Message).filter(or_(
+        (Message.sender_id == user_id) & (Message.receiver_id == peer_id),
+        (Message.sender_id == peer_id) & (Message.receiver_id == user_id),
+    ))
+    if after_id is not None:
+        return q.filter(Message.id > after_id).order_by(Message.id).limit(limit).all()
+    if before_id is not None:
+        q = q.filter(Message.id < before_id)
+    return list(reversed(q.order_by(Message.id.desc()).limit(limit).all()))
+
+
+def mark_delivered_read(db: Session, user_id: int, msgs: list[Message]):
+    """Mark only the delivered messages addressed to user_id as read. Caller commits."""
+    ids = [m.id for m in msgs if m.receiver_id == user_id and not m.is_read]
+    if ids:
+        db.query(Message).filter(Message.id.in_(ids)).update({"is_read": True}, synchronize_session="evaluate")
@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, Boolean, DateTime, ForeignKey, Text, Enum
+from sqlalchemy import create_engine, Column, Integer, String, Float, Boolean, Date, DateTime, ForeignKey, Text, Enum, Index
 from sqlalchemy.orm import declarative_base, sessionmaker, relationship
 from datetime import datetime
 import enum, os, json
@@ -88,12 +88,20 @@ class User(Base):
     courses = relationship("Course", back_populates="instructor", foreign_keys="Course.instructor_id")
     enrollments = relationship("Enrollment", back_populates="student")
     pulse_state = Column(Enum(PulseStateEnum), default=PulseStateEnum.coasting)
+    # PULSE features changed since pulse_scored_at → picked up by the next incremental scoring run
+    pulse_changed_at = Column(DateTime, default=datetime.utcnow)
+    pulse_scored_at = Column(DateTime, nullable=True)
     xp = Column(Integer, default=0)
     first_login = Column(Boolean, default=True)
     avatar_url = Column(String, nullable=True)
     pending_email = Column(String, nullable=True)
     email_change_token = Column(String, nullable=True)
     email_change_expiry = Column(DateTime, nullable=True)
+    # Admin list sort keys (app/pagination.py)
+    __table_args__ = (
+        Index("ix_users_created_id", "created_at", "id"),
+        Index("ix_users_name_id", "name", "id"),
+    )
 
 class Course(Base):
     __tablename__ = "courses"
@@ -127,6 +135,10 @@ class Course(Base):
     enrollments = relationship("Enrollment", back_populates="course")
     sessions = relationship("LiveSession", back_populates="course")
     quizzes = relationship("Quiz", back_populates="course")
+    __table_args__ = (
+        Index("ix_courses_created_id", "created_at", "id"),
+        Index("ix_courses_title_id", "title", "id"),
+    )
 
 class Module(Base):
     __tablename__ = "modules"
@@ -162,6 +174,34 @@ class Lesson(Base):
     course = relationship("Course", back_populates="lessons")
     module = relationship("Module", back_populates="lessons")
 
+class CourseStats(Base):
+    """Maintained per-course totals — see app/aggregates.py. Missing rows are rebuilt on first read."""
+    __tablename__ = "course_stats"
+    course_id      = Column(Integer, ForeignKey("courses.id", ondelete="CASCADE"), primary_key=True)
+    students       = Column(Integer, default=0, nullable=False)
+    completion_sum = Column(Float, default=0.0, nullable=False)   # Σ enrollment completion_pct
+    revenue        = Column(Float, default=0.0, nullable=False)   # gross, completed payments
+    rating_sum     = Column(Float, default=0.0, nullable=False)
+    rating_count   = Column(Integer, default=0, nullable=False)
+    lesson_count   = Column(Integer, default=0, nullable=False)
+    module_count   = Column(Integer, default=0, nullable=False)
+    updated_at     = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class CourseSearchDocument(Base):
+    """Text indexed for catalog search — see app/search.py. Missing rows are rebuilt on first search."""
+    __tablename__ = "course_search_documents"
+    course_id   = Column(Integer, ForeignKey("courses.id", ondelete="CASCADE"), primary_key=True)
+    title       = Column(Text, nullable=False, default="")   # title + subtitle (weight A)
+    keywords    = Column(Text, nullable=False, default="")   # language + instructor name (weight B)
+    description = Column(Text, nullable=False, default="")   # weight C
+
+class CatalogVersion(Base):
+    """Single row (id 1) counting changes to the public catalog — see app/catalog.py."""
+    __tablename__ = "catalog_version"
+    id         = Column(Integer, primary_key=True)
+    version    = Column(Integer, default=1, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
 class ContentVersion(Base):
     __tablename__ = "content_versions"
     id = Column(Integer, primary_key=True, index=True)
@@ -197,6 +237,9 @@ class Enrollment(Base):
     enrolled_at = Column(DateTime, default=datetime.utcnow)
     student = relationship("User", back_populates="enrollments")
     course = relationship("Course", back_populates="enrollments")
+    __table_args__ = (
+        Index("ix_enrollments_student_course", "student_id", "course_id"),
+    )
 
 class LiveSession(Base):
     __tablename__ = "live_sessions"
@@ -271,6 +314,10 @@ class Payment(Base):
     method = Column(String, default="Card")
     status = Column(String, default="completed")
     created_at = Column(DateTime, default=datetime.utcnow)
+    __table_args__ = (
+        Index("ix_payments_created_id", "created_at", "id"),
+        Index("ix_payments_amount_id", "amount", "id"),
+    )
 
 class Payout(Base):
     __tablename__ = "payouts"
@@ -281,6 +328,10 @@ class Payout(Base):
     reference = Column(String)
     requested_at = Column(DateTime, default=datetime.utcnow)
     paid_at = Column(DateTime)
+    __table_args__ = (
+        Index("ix_payouts_requested_id", "requested_at", "id"),
+        Index("ix_payouts_amount_id", "amount", "id"),
+    )
 
 class Notification(Base):
     __tablename__ = "notifications"
@@ -297,6 +348,23 @@ class Notification(Base):
     # 'notification' = system-generated event alert | 'announcement' = human-composed broadcast
     notif_type = Column(String, default="announcement")
     link = Column(String, nullable=True)   # e.g. "/dashboard/quizzes" — rendered as clickable link
+    audiences = relationship("NotificationAudience", cascade="all, delete-orphan")
+
+class NotificationAudience(Base):
+    """Who can see a notification — one row per addressed user, role, course or 'all'. See app/audiences.py."""
+    __tablename__ = "notification_audiences"
+    id = Column(Integer, primary_key=True, index=True)
+    notification_id = Column(Integer, ForeignKey("notifications.id"), nullable=False, index=True)
+    kind = Column(String, nullable=False)   # 'user' | 'role' | 'course' | 'all'
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    role = Column(Enum(RoleEnum), nullable=True)
+    course_id = Column(Integer, ForeignKey("courses.id"), nullable=True)
+    __table_args__ = (
+        Index("ix_notification_audiences_user", "user_id", "notification_id"),
+        Index("ix_notification_audiences_role", "role", "notification_id"),
+        Index("ix_notification_audiences_course", "course_id", "notification_id"),
+        Index("ix_notification_audiences_kind", "kind", "notification_id"),
+    )
 
 class AuditLog(Base):
     __tablename__ = "audit_logs"
@@ -305,6 +373,9 @@ class AuditLog(Base):
     action_type = Column(String)
     description = Column(Text)
     created_at = Column(DateTime, default=datetime.utcnow)
+    __table_args__ = (
+        Index("ix_audit_logs_created_id", "created_at", "id"),
+    )
 
 class Report(Base):
     __tablename__ = "reports"
@@ -326,6 +397,10 @@ class Message(Base):
     attachment_name = Column(String, nullable=True)
     is_read = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.utcnow)
+    __table_args__ = (
+        Index("ix_messages_sender_receiver_created", "sender_id", "receiver_id", "created_at"),
+        Index("ix_messages_receiver_is_read", "receiver_id", "is_read"),
+    )
 
 class Review(Base):
     __tablename__ = "reviews"
@@ -353,6 +428,13 @@ class NotificationRead(Base):
     notification_id = Column(Integer, ForeignKey("notifications.id"), nullable=False)
     read_at = Column(DateTime, default=datetime.utcnow)
 
+class UserNotificationState(Base):
+    """Materialized unread counter — maintained on fan-out and mark-read, rebuilt lazily when missing."""
+    __tablename__ = "user_notification_state"
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    unread_count = Column(Integer, default=0, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
 class NotificationReaction(Base):
     __tablename__ = "notification_reactions"
     id = Column(Integer, primary_key=True, index=True)
@@ -510,3 +592,60 @@ class PulseStateFeedback(Base):
     comment             = Column(Text, nullable=True)
     created_at          = Column(DateTime, default=datetime.utcnow)
 
+
+class PulseExplanation(Base):
+    """Top contributing features behind a student's current PULSE state, per model version — written by app/pulse_explain.py."""
+    __tablename__ = "pulse_explanations"
+    user_id       = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    model_version = Column(String, nullable=False)
+    pulse_state   = Column(String, nullable=False)
+    factors       = Column(Text, nullable=False)   # JSON list of factor dicts
+    computed_at   = Column(DateTime, default=datetime.utcnow)
+
+
+class PulseJob(Base):
+    """One PULSE scoring run — queued by the admin endpoint or the scheduler, executed by app/pulse_worker.py."""
+    __tablename__ = "pulse_jobs"
+    id            = Column(Integer, primary_key=True, index=True)
+    kind          = Column(String, default="incremental")   # 'incremental' | 'full'
+    status        = Column(String, default="queued")        # 'queued' | 'running' | 'done' | 'failed'
+    requested_by  = Column(Integer, ForeignKey("users.id"), nullable=True)   # NULL = scheduler
+    total         = Column(Integer, default=0)
+    processed     = Column(Integer, default=0)
+    distribution  = Column(Text, nullable=True)   # JSON {state: count}
+    error         = Column(Text, nullable=True)
+    created_at    = Column(DateTime, default=datetime.utcnow)
+    started_at    = Column(DateTime, nullable=True)
+    finished_at   = Column(DateTime, nullable=True)
+
+
+class PulseStateHistory(Base):
+    """Append-only: one row per student per scoring run — written in bulk by app/pulse_history.py."""
+    __tablename__ = "pulse_state_history"
+    id             = Column(Integer, primary_key=True)
+    user_id        = Column(Integer, ForeignKey("users.id"), nullable=False)
+    job_id         = Column(Integer, ForeignKey("pulse_jobs.id"), nullable=True)
+    previous_state = Column(String, nullable=True)   # NULL = first score
+    pulse_state    = Column(String, nullable=False)
+    scored_at      = Column(DateTime, nullable=False)
+    __table_args__ = (
+        Index("ix_pulse_state_history_user_scored", "user_id", "scored_at"),
+        Index("ix_pulse_state_history_scored", "scored_at"),
+    )
+
+
+class PulseTransitionDaily(Base):
+    """Daily rollup of pulse_state_history: how many students moved from_state → to_state that day ('' = first score)."""
+    __tablename__ = "pulse_transitions_daily"
+    day        = Column(Date, primary_key=True)
+    from_state = Column(String, primary_key=True)
+    to_state   = Column(String, primary_key=True)
+    students   = Column(Integer, default=0, nullable=False)
+
+
+class PulseDistributionDaily(Base):
+    """Students per PULSE state as of the last scoring run of the day."""
+    __tablename__ = "pulse_distribution_daily"
+    day         = Column(Date, primary_key=True)
+    pulse_state = Column(String, primary_key=True)
+    students    = Column(Integer, default=0, nullable=False)
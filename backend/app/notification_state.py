@@ -0,0 +1,128 @@
+"""
+Materialized per-user unread notification counters (user_notification_state).
+
+The header badge reads one row by primary key instead of recomputing the
+user's audiences and counting Notification/NotificationRead on every render.
+
+  - fan-out (notify(), announcement sends) bumps every recipient's row with a
+    single set-based UPDATE
+  - mark-read decrements by the number of newly read notifications
+  - a missing row is rebuilt from scratch on the next read, so dropping rows
+    (reset_unread_counters, or refresh_unread after an enrollment / role
+    change) is always a safe way to reconcile
+
+What counts towards the badge mirrors the role's unread-count endpoint:
+students count notifications and announcements, instructors and admins count
+notifications only.
+"""
+from datetime import datetime
+from sqlalchemy import and_, func, exists, case
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.models import User, Notification, NotificationRead, UserNotificationState, RoleEnum
+from app.audiences import visible_to, audience_members
+
+
+def _counted_types(user: User) -> tuple[str, ...]:
+    role = user.role if isinstance(user.role, RoleEnum) else RoleEnum(user.role)
+    return ("notification", "announcement") if role == RoleEnum.student else ("notification",)
+
+
+def counted_filter(user: User):
+    """WHERE clause over Notification for everything that counts towards user's badge."""
+    return and_(Notification.id.in_(visible_to(user)), Notification.notif_type.in_(_counted_types(user)))
+
+
+def _clamped(delta: int):
+    new = UserNotificationState.unread_count + delta
+    return case((new < 0, 0), else_=new)
+
+
+def _adjust_users(db: Session, ids, delta: int, notification_id: int | None = None):
+    q = db.query(UserNotificationState).filter(UserNotificationState.user_id.in_(ids))
+    if notification_id is not None:
+        # Users who already read it never counted it
+        q = q.filter(~exists().where(
+            NotificationRead.user_id == UserNotificationState.user_id,
+            NotificationRead.notification_id == notification_id,
+        ))
+    q.update({
+        UserNotificationState.unread_count: _clamped(delta),
+        UserNotificationState.updated_at: datetime.utcnow(),
+    }, synchronize_session=False)
+
+
+def _members(n: Notification):
+    ids = audience_members(n.id)
+    if n.notif_type == "announcement":
+        # Only students count announcements
+        ids = ids.where(User.role == RoleEnum.student)
+    return ids
+
+
+def bump_unread(db: Session, n: Notification):
+    """Fan-out: +1 for every audience member that already has a counter row. Caller commits."""
+    db.flush()
+    _adjust_users(db, _members(n), 1, n.id)
+
+
+def bump_unread_users(db: Session, user_ids):
+    """+1 for each listed user (ids or a SELECT of ids), e.g. after notify_many(). Caller commits."""
+    _adjust_users(db, user_ids, 1)
+
+
+def retract_unread(db: Session, n: Notification):
+    """n is being deleted or retargeted: -1 for members who had not read it. Caller commits."""
+    db.flush()
+    _adjust_users(db, _members(n), -1, n.id)
+
+
+def count_unread(db: Session, user: User) -> int:
+    """From-scratch count — used to (re)build a missing counter row."""
+    return db.query(func.count(Notification.id)).filter(
+        counted_filter(user),
+        ~exists().where(NotificationRead.user_id == user.id, NotificationRead.notification_id == Notification.id),
+    ).scalar() or 0
+
+
+def unread_count(db: Session, user: User) -> int:
+    """Primary-key read of the user's counter, rebuilding it first if missing."""
+    state = db.get(UserNotificationState, user.id)
+    if state is not None:
+        return max(0, state.unread_count)
+    count = count_unread(db, user)
+    try:
+        db.add(UserNotificationState(user_id=user.id, unread_count=count))
+        db.commit()
+    except IntegrityError:
+        # A concurrent request built it first
+        db.rollback()
+    return count
+
+
+def mark_read(db: Session, user: User, notification_ids: list[int]):
+    """Record reads for the given ids and decrement the counter by the newly read ones. Caller commits."""
+    if not notification_ids:
+        return
+    existing = {nid for (nid,) in db.query(NotificationRead.notification_id).filter(
+        NotificationRead.user_id == user.id, NotificationRead.notification_id.in_(notification_ids))}
+    new_ids = [nid for nid in set(notification_ids) if nid not in existing]
+    if not new_ids:
+        return
+    db.add_all([NotificationRead(user_id=user.id, notification_id=nid) for nid in new_ids])
+    counted = db.query(func.count(Notification.id)).filter(Notification.id.in_(new_ids), counted_filter(user)).scalar()
+    if counted:
+        db.query(UserNotificationState).filter(UserNotificationState.user_id == user.id).update({
+            UserNotificationState.unread_count: _clamped(-counted),
+            UserNotificationState.updated_at: datetime.utcnow(),
+        }, synchronize_session=False)
+
+
+def refresh_unread(db: Session, user_id: int):
+    """The user's audiences changed (enrollment, role): drop the row so it is rebuilt on next read."""
+    db.query(UserNotificationState).filter(UserNotificationState.user_id == user_id).delete(synchronize_session=False)
+
+
+def reset_unread_counters(db: Session) -> int:
+    """Reconcile every counter: drop all rows; each is rebuilt from scratch on its next read. Caller commits."""
+    return db.query(UserNotificationState).delete(synchronize_session=False)
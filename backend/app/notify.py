@@ -1,5 +1,10 @@
-"""Shared helper — fire a system notification (notif_type='notification')."""
+"""Shared helpers — fire system notifications (notif_type='notification')."""
+from typing import Iterable
+from sqlalchemy import Select
 from app.models import Notification
+from app.realtime import push_after_commit
+from app.notification_state import bump_unread, bump_unread_users
+from app.audiences import add_users
 from sqlalchemy.orm import Session
 
 
@@ -21,4 +26,43 @@ def notify(db: Session, *, title: str, message: str, target: str, link: str | No
         notif_type="notification",
     )
     db.add(n)
+    bump_unread(db, n)
+    push_after_commit(db, target, "notification", n)
     # caller must db.commit() after
+
+
+def notify_many(db: Session, *, title: str, message: str, recipients: Select | Iterable[int],
+                link: str | None = None, course_id: int | None = None, push_target: str | None = None) -> int:
+    """
+    One notification addressed to many users: a single Notification row plus one
+    'user' audience row per recipient, instead of one Notification per user.
+    Returns the number of recipients.
+
+    recipients is either a single-column SELECT of user ids — written with one
+    INSERT ... SELECT, e.g. select(Enrollment.student_id).where(Enrollment.course_id == cid),
+    which should yield each id once — or a list of ids (deduplicated), written
+    with one executemany.
+
+    push_target is a realtime channel that reaches the same audience in one
+    publish (e.g. "course_<id>"). Without it, id lists are pushed per recipient
+    and SELECT audiences are not pushed (their ids are never loaded).
+    """
+    if not isinstance(recipients, Select):
+        recipients = list(dict.fromkeys(recipients))
+        if not recipients:
+            return 0
+    n = Notification(title=title, message=message, target="users", link=link,
+                     course_id=course_id, notif_type="notification")
+    db.add(n)
+    db.flush()
+    count = add_users(db, n.id, recipients)
+    n.recipients = count
+    bump_unread_users(db, recipients)
+
+    if push_target:
+        push_after_commit(db, push_target, "notification", n)
+    elif not isinstance(recipients, Select):
+        for uid in recipients:
+            push_after_commit(db, str(uid), "notification", n)
+    # caller must db.commit() after
+    return count
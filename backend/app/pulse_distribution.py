@@ -0,0 +1,76 @@
+"""
+Students per PULSE state for the admin, instructor and ethics pie charts.
+
+Each chart is one GROUP BY pulse_state query (joined through enrollments for
+an instructor's students) instead of one COUNT per state, cached per scope for
+PULSE_DIST_TTL seconds (default 30, 0 disables). Scoring runs and new PULSE
+feedback call invalidate() for the scopes they change.
+"""
+import enum, os, threading, time
+from typing import Callable
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.models import User, Enrollment, Course, PulseStateFeedback, PulseStateEnum
+
+TTL = float(os.getenv("PULSE_DIST_TTL", "30"))
+
+STATES = [s.value for s in PulseStateEnum]
+
+_lock = threading.Lock()
+_cache: dict[tuple, tuple[float, dict]] = {}
+
+
+def state_value(state) -> str | None:
+    """Enum(PulseStateEnum) columns load as enum members; charts and String columns want the plain value."""
+    return state.value if isinstance(state, enum.Enum) else state
+
+
+def _distribution(rows) -> dict[str, int]:
+    dist = dict.fromkeys(STATES, 0)
+    for state, n in rows:
+        if state is not None:
+            dist[state_value(state)] = n
+    return dist
+
+
+def _cached(key: tuple, compute: Callable[[], dict]) -> dict:
+    now = time.monotonic()
+    with _lock:
+        hit = _cache.get(key)
+    if hit is not None and now - hit[0] < TTL:
+        return dict(hit[1])
+    value = compute()
+    if TTL > 0:
+        with _lock:
+            _cache[key] = (now, value)
+    return dict(value)
+
+
+def invalidate(*scopes: str):
+    """Drop cached charts of the given scopes ("platform", "instructor", "feedback"); all if none given."""
+    with _lock:
+        for key in [k for k in _cache if not scopes or k[0] in scopes]:
+            del _cache[key]
+
+
+def platform_distribution(db: Session) -> dict[str, int]:
+    """{state: users} over every user."""
+    return _cached(("platform",), lambda: _distribution(
+        db.query(User.pulse_state, func.count(User.id)).group_by(User.pulse_state)))
+
+
+def instructor_distribution(db: Session, instructor_id: int) -> dict[str, int]:
+    """{state: distinct students} enrolled in any of the instructor's courses."""
+    return _cached(("instructor", instructor_id), lambda: _distribution(
+        db.query(User.pulse_state, func.count(func.distinct(User.id)))
+        .join(Enrollment, Enrollment.student_id == User.id)
+        .join(Course, Course.id == Enrollment.course_id)
+        .filter(Course.instructor_id == instructor_id)
+        .group_by(User.pulse_state)))
+
+
+def feedback_distribution(db: Session) -> dict[str, int]:
+    """{state: feedback submissions} by the state the learner disagreed with."""
+    return _cached(("feedback",), lambda: _distribution(
+        db.query(PulseStateFeedback.current_state, func.count(PulseStateFeedback.id))
+        .group_by(PulseStateFeedback.current_state)))
@@ -0,0 +1,70 @@
+"""
+Cached PULSE explanations — the features behind each student's state.
+
+Scoring jobs store() every chunk's explanations next to its states, so a whole
+cohort is explained in the same pass that scores it. explanation_for() serves
+the stored row while it was computed by the loaded model version after the
+student's features last changed; otherwise it recomputes that one student and
+stores the result.
+"""
+import json
+from datetime import datetime
+import numpy as np
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.models import User, PulseExplanation
+from app.pulse_predictor import predictor, STATE_MAP
+from app.pulse_features import student_features
+
+
+def _row_dicts(user_ids: np.ndarray, states: np.ndarray, top: np.ndarray, contribs: np.ndarray,
+               columns: dict[str, np.ndarray], computed_at: datetime) -> list[dict]:
+    version = predictor.model_version
+    return [
+        {
+            "user_id": uid, "model_version": version, "pulse_state": STATE_MAP[int(states[i])],
+            "factors": json.dumps(predictor.factor_dicts(top[i], contribs[i], lambda name: columns[name][i])),
+            "computed_at": computed_at,
+        }
+        for i, uid in enumerate(user_ids.tolist())
+    ]
+
+
+def store(db: Session, user_ids: np.ndarray, states: np.ndarray, top: np.ndarray, contribs: np.ndarray,
+          columns: dict[str, np.ndarray], computed_at: datetime):
+    """Replace the chunk's explanations: one DELETE and one executemany INSERT. Caller commits."""
+    rows = _row_dicts(user_ids, states, top, contribs, columns, computed_at)
+    db.query(PulseExplanation).filter(PulseExplanation.user_id.in_(user_ids.tolist())).delete(synchronize_session=False)
+    db.bulk_insert_mappings(PulseExplanation, rows)
+
+
+def explanation_dict(row: PulseExplanation) -> dict:
+    return {
+        "user_id": row.user_id, "pulse_state": row.pulse_state, "model_version": row.model_version,
+        "computed_at": row.computed_at, "factors": json.loads(row.factors),
+    }
+
+
+def explanation_for(db: Session, user: User) -> dict | None:
+    """The student's explanation, recomputed if stale. None if the user is not a student."""
+    if not predictor.can_explain:   # also loads the model, so model_version is set
+        raise RuntimeError("The PULSE export has no explanation data; re-run backend/export_pulse.py")
+    row = db.get(PulseExplanation, user.id)
+    if (row is not None and row.model_version == predictor.model_version
+            and (user.pulse_changed_at is None or row.computed_at >= user.pulse_changed_at)):
+        return explanation_dict(row)
+
+    read_at = datetime.utcnow()
+    ids, columns = student_features(db, [user.id])
+    if not len(ids):
+        return None
+    states, _, top, contribs = predictor.explain_matrix(columns)
+    fresh = _row_dicts(ids, states, top, contribs, columns, read_at)[0]
+    try:
+        row = db.merge(PulseExplanation(**fresh))
+        db.commit()
+    except IntegrityError:
+        # A scoring job wrote it concurrently
+        db.rollback()
+        row = PulseExplanation(**fresh)
+    return explanation_dict(row)
@@ -0,0 +1,71 @@
+"""
+PULSE state history and daily rollups.
+
+run_job calls record_chunk() for every scored chunk before it overwrites
+User.pulse_state: one SELECT of the chunk's current states, one executemany
+INSERT into pulse_state_history, and one UPDATE (or INSERT) per from → to
+pair into pulse_transitions_daily. After the run roll_up_distribution() stores
+the day's students per state. Trend charts read the rollups with a range scan
+on day instead of counting users.
+"""
+from collections import Counter
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.models import User, RoleEnum, PulseStateHistory, PulseTransitionDaily, PulseDistributionDaily
+from app.pulse_distribution import state_value
+
+
+def record_chunk(db: Session, job_id: int | None, ids: list[int], states: list[str], scored_at: datetime):
+    """Append the chunk's new states with their previous ones. Run before the UPDATE; caller commits."""
+    previous = {
+        uid: state_value(state) if last_scored is not None else None
+        for uid, state, last_scored in db.query(User.id, User.pulse_state, User.pulse_scored_at).filter(User.id.in_(ids))
+    }
+    db.bulk_insert_mappings(PulseStateHistory, [
+        {"user_id": uid, "job_id": job_id, "previous_state": previous.get(uid), "pulse_state": state, "scored_at": scored_at}
+        for uid, state in zip(ids, states)
+    ])
+    day = scored_at.date()
+    for (from_state, to_state), n in Counter((previous.get(uid) or "", state) for uid, state in zip(ids, states)).items():
+        updated = db.query(PulseTransitionDaily).filter(
+            PulseTransitionDaily.day == day,
+            PulseTransitionDaily.from_state == from_state,
+            PulseTransitionDaily.to_state == to_state,
+        ).update({PulseTransitionDaily.students: PulseTransitionDaily.students + n}, synchronize_session=False)
+        if not updated:
+            db.add(PulseTransitionDaily(day=day, from_state=from_state, to_state=to_state, students=n))
+
+
+def roll_up_distribution(db: Session, day=None):
+    """Replace the day's students-per-state row set with the current counts. Caller commits."""
+    day = day or datetime.utcnow().date()
+    counts = (db.query(User.pulse_state, func.count(User.id))
+              .filter(User.role == RoleEnum.student, User.pulse_state.isnot(None))
+              .group_by(User.pulse_state).all())
+    db.query(PulseDistributionDaily).filter(PulseDistributionDaily.day == day).delete(synchronize_session=False)
+    db.bulk_insert_mappings(PulseDistributionDaily, [
+        {"day": day, "pulse_state": state_value(state), "students": n} for state, n in counts
+    ])
+
+
+def trends(db: Session, days: int) -> list[dict]:
+    """Per day, oldest first: {day, distribution {state: n}, transitions [{from, to, students}]}."""
+    since = datetime.utcnow().date() - timedelta(days=days - 1)
+    by_day: dict = {}
+
+    def entry(day):
+        return by_day.setdefault(day, {"day": day, "distribution": {}, "transitions": []})
+
+    for row in db.query(PulseDistributionDaily).filter(PulseDistributionDaily.day >= since):
+        entry(row.day)["distribution"][row.pulse_state] = row.students
+    for row in db.query(PulseTransitionDaily).filter(PulseTransitionDaily.day >= since):
+        entry(row.day)["transitions"].append({"from": row.from_state or None, "to": row.to_state, "students": row.students})
+    return [by_day[d] for d in sorted(by_day)]
+
+
+def user_history(db: Session, user_id: int, limit: int) -> list[dict]:
+    rows = (db.query(PulseStateHistory).filter(PulseStateHistory.user_id == user_id)
+            .order_by(PulseStateHistory.scored_at.desc()).limit(limit))
+    return [{"pulse_state": r.pulse_state, "previous_state": r.previous_state, "scored_at": r.scored_at, "job_id": r.job_id}
+            for r in rows]
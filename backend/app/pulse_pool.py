@@ -0,0 +1,102 @@
+"""
+Multi-process PULSE scoring for large runs.
+
+predict_matrix is single-threaded NumPy, so one scoring job uses one core.
+PulsePool keeps a ProcessPoolExecutor whose workers load the model once (in
+the pool initializer) and score feature-column shards; score_chunks() keeps a
+bounded number of shards in flight and yields results as each one finishes,
+so the caller can write states back while the rest are still being scored.
+
+Workers are started with "spawn": the API process runs threads and holds DB
+connections, neither of which survive fork safely. Workers only import
+app.pulse_predictor — never the DB layer.
+
+PULSE_POOL_WORKERS   worker processes (default: CPU count; 0 or 1 disables)
+PULSE_POOL_MIN_ROWS  runs smaller than this are scored in-process (default 20000)
+"""
+import logging, multiprocessing, os, threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, Future
+from typing import Iterable, Iterator
+import numpy as np
+from app.pulse_predictor import predictor
+
+log = logging.getLogger(__name__)
+
+WORKERS  = int(os.getenv("PULSE_POOL_WORKERS", str(os.cpu_count() or 1)))
+MIN_ROWS = int(os.getenv("PULSE_POOL_MIN_ROWS", "20000"))
+
+
+def _init_worker():
+    predictor._load()
+
+
+def score_shard(columns: dict[str, np.ndarray], top_n: int = 0) -> tuple[np.ndarray, np.ndarray | None, np.ndarray | None]:
+    """(state_ids, top feature indices, their contributions) — the last two only when top_n > 0."""
+    if top_n:
+        states, _, top, contribs = predictor.explain_matrix(columns, top_n)
+        return states.astype(np.int8), top.astype(np.int16), contribs.astype(np.float32)
+    states, _ = predictor.predict_matrix(columns)
+    return states.astype(np.int8), None, None
+
+
+class PulsePool:
+    def __init__(self, workers: int = WORKERS, min_rows: int = MIN_ROWS):
+        self.workers  = workers
+        self.min_rows = min_rows
+        self._lock    = threading.Lock()
+        self._executor: ProcessPoolExecutor | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.workers > 1
+
+    def should_use(self, n_rows: int) -> bool:
+        return self.enabled and n_rows >= self.min_rows
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                )
+                log.info("PULSE scoring pool started with %d workers", self.workers)
+            return self._executor
+
+    def score_chunks(self, chunks: Iterable[tuple[object, dict[str, np.ndarray]]], top_n: int = 0) -> Iterator[tuple[object, tuple]]:
+        """
+        chunks: (key, feature columns) pairs — key is passed through untouched,
+        e.g. the user ids from iter_student_features().
+        Yields (key, score_shard(columns, top_n)) per chunk in submission order, with up to
+        2 × workers chunks in flight so the pool stays busy while the caller
+        reads the next chunk and writes back the previous one.
+        """
+        executor = self._get_executor()
+        pending: deque[tuple[object, Future]] = deque()
+        try:
+            for key, columns in chunks:
+                pending.append((key, executor.submit(score_shard, columns, top_n)))
+                if len(pending) >= 2 * self.workers:
+                    key, fut = pending.popleft()
+                    yield key, fut.result()
+            while pending:
+                key, fut = pending.popleft()
+                yield key, fut.result()
+        finally:
+            for _, fut in pending:
+                fut.cancel()
+
+    def reload(self):
+        """Retire the workers so the next run loads the current artifacts."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self):
+        self.reload()
+
+
+pulse_pool = PulsePool()
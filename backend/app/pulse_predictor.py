@@ -2,14 +2,39 @@
 PULSE inference helper.
 Loaded once at startup via module-level singleton.
 Used by POST /api/admin/pulse/predict  and  POST /api/admin/pulse/run
+
+Artifact layouts in PULSE/pulse_artifacts/, in order of preference:
+  numpy   — pulse_trees.npz (trees compiled to arrays, see app/pulse_trees.py)
+            + pulse_preproc.npz (scaler mean/scale, encoder vocabularies);
+            needs only NumPy — xgboost and scikit-learn are never imported
+  booster — pulse_booster.ubj (XGBoost native booster) + pulse_preproc.npz
+  pickled — pulse_model.pkl + pulse_scaler.pkl + label_encoders.pkl, as produced by training
+The first two are written by backend/export_pulse.py.
+
+predict_one / predict_batch go through an LRU cache keyed by a hash of the
+encoded (pre-scaling) feature row and the model version in pulse_metadata.json,
+so repeated what-if payloads skip scaling and the tree ensemble. reload()
+re-reads the artifacts and clears it. predict_matrix is never cached.
+
+explain_matrix / predict_batch(explain=True) also return each prediction's
+top contributing features for the predicted state: path attributions from
+pulse_trees.npz on the numpy layout, XGBoost pred_contribs (SHAP) otherwise.
+Both come from the same pass that produces the probabilities.
 """
-import pickle, json, warnings
+import pickle, json, logging, os, threading, time, warnings, hashlib
 import numpy as np
+from collections import OrderedDict
 from pathlib import Path
+from app.pulse_trees import TreeEnsemble
 
 warnings.filterwarnings("ignore")
+log = logging.getLogger(__name__)
 
 ARTIFACTS_DIR = Path(__file__).parent.parent.parent / "PULSE" / "pulse_artifacts"
+BOOSTER_FILE  = "pulse_booster.ubj"
+PREPROC_FILE  = "pulse_preproc.npz"
+TREES_FILE    = "pulse_trees.npz"
+CACHE_SIZE    = int(os.getenv("PULSE_CACHE_SIZE", "4096"))   # 0 disables
 
 STATE_MAP = {
     0: "thriving",
@@ -19,95 +44,389 @@ STATE_MAP = {
     4: "disengaged",
 }
 
+EXPLAIN_TOP_N = 5
+
+# From predict_pulse.py / notebook Section 8; other features fall back to a title-cased name
+FEATURE_HUMAN_LABELS = {
+    'decline_index'              : 'Decline risk index',
+    'engagement_score'           : 'Overall engagement',
+    'performance_score'          : 'Overall performance',
+    'consistency_score'          : 'Study consistency',
+    'days_to_first_submit'       : 'Days to first submission',
+    'num_of_prev_attempts'       : 'Previous attempts',
+}
+
+HIGH_IS_BAD = {
+    'session_dropout_rate', 'decline_index', 'days_since_last_activity',
+    'days_since_last_session', 'grammar_errors_per_session',
+    'pronunciation_errors', 'lesson_skip_rate', 'hint_usage_rate',
+    'days_to_first_submit', 'withdrew_early', 'num_of_prev_attempts',
+}
+
+
+def load_pickled_artifacts(artifacts_dir: Path = ARTIFACTS_DIR):
+    """(model, scaler, encoders) from the training pickles."""
+    with open(artifacts_dir / "pulse_model.pkl",    "rb") as f: model    = pickle.load(f)
+    with open(artifacts_dir / "pulse_scaler.pkl",   "rb") as f: scaler   = pickle.load(f)
+    with open(artifacts_dir / "label_encoders.pkl", "rb") as f: encoders = pickle.load(f)
+    return model, scaler, encoders
+
+
+class _PredictionCache:
+    """Thread-safe LRU of prediction dicts with hit/miss counters."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._lock   = threading.Lock()
+        self._items: OrderedDict[bytes, dict] = OrderedDict()
+        self.hits = self.misses = 0
+
+    def get(self, key: bytes) -> dict | None:
+        with self._lock:
+            value = self._items.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: bytes, value: dict):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.hits = self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size"    : len(self._items),
+                "maxsize" : self.maxsize,
+                "hits"    : self.hits,
+                "misses"  : self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            }
+
+
 class _PulsePredictor:
     def __init__(self):
-        self._model    = None
-        self._scaler   = None
-        self._encoders = None
+        self._loaded   = False
+        self._lock     = threading.Lock()
+        self._model    = None   # pickled XGBClassifier
+        self._booster  = None   # native xgboost.Booster (booster layout)
+        self._trees    = None   # TreeEnsemble (numpy layout)
         self._meta     = None
+        self._version  = b""    # model_info.version, part of every cache key
+        self.cache     = _PredictionCache(CACHE_SIZE)
+        self.status    = "not_loaded"   # not_loaded | loading | ready | missing | failed
+        self.load_seconds = None
+        self.error     = None
 
     def _load(self):
-        if self._model is not None:
+        if self._loaded:
             return
-        if not (ARTIFACTS_DIR / "pulse_model.pkl").exists():
+        with self._lock:
+            if self._loaded:
+                return
+            self.status = "loading" if self.is_ready else "missing"
+            try:
+                state = self._read()
+            except Exception as e:
+                if self.status == "loading":
+                    self.status, self.error = "failed", str(e)
+                raise
+            self._install(state)
+
+    def _read(self) -> dict:
+        """Every model attribute, read from the artifacts into a fresh dict — self is not touched."""
+        if not self.is_ready:
             raise FileNotFoundError(
                 "PULSE artifacts not found. "
                 "Run PULSE/colab_train_pulse.py on Colab, then unzip "
                 "pulse_artifacts.zip into PULSE/pulse_artifacts/."
             )
-        with open(ARTIFACTS_DIR / "pulse_model.pkl",    "rb") as f: self._model    = pickle.load(f)
-        with open(ARTIFACTS_DIR / "pulse_scaler.pkl",   "rb") as f: self._scaler   = pickle.load(f)
-        with open(ARTIFACTS_DIR / "label_encoders.pkl", "rb") as f: self._encoders = pickle.load(f)
-        with open(ARTIFACTS_DIR / "pulse_metadata.json","r")  as f: self._meta     = json.load(f)
+        started = time.perf_counter()
+        with open(ARTIFACTS_DIR / "pulse_metadata.json", "r") as f: meta = json.load(f)
+        state = {
+            "_meta": meta, "_columns": meta["feature_columns"],
+            "_version": str(meta.get("model_info", {}).get("version", "")).encode(),
+            "_model": None, "_booster": None, "_trees": None,
+        }
+        layout = self.layout
+        if layout == "pickled":
+            state.update(self._read_pickled())
+        else:
+            state.update(self._read_preproc())
+            if layout == "numpy":
+                state["_trees"] = TreeEnsemble.load(ARTIFACTS_DIR / TREES_FILE)
+            else:
+                state.update(self._read_booster())
+        state["load_seconds"] = round(time.perf_counter() - started, 4)
+        log.info("PULSE model loaded (%s) in %.3fs", layout, state["load_seconds"])
+        return state
+
+    def _install(self, state: dict):
+        """Swap in a model read by _read(). Caller holds _lock; predictions don't take it, so this is a single dict update."""
+        vars(self).update(state, _loaded=True, status="ready", error=None)
+
+    def _read_preproc(self) -> dict:
+        with np.load(ARTIFACTS_DIR / PREPROC_FILE, allow_pickle=False) as pre:
+            return {
+                "_mean":   pre["mean"]  if pre["mean"].size  else None,
+                "_scale":  pre["scale"] if pre["scale"].size else None,
+                "_lookup": {str(col): pre[f"vocab_{col}"] for col in pre["categoricals"]},
+            }
+
+    @staticmethod
+    def _iteration_range_of(booster) -> tuple[int, int]:
+        best = booster.attr("best_iteration")
+        return (0, int(best) + 1) if best is not None else (0, 0)
+
+    def _read_booster(self) -> dict:
+        import xgboost as xgb
+        booster = xgb.Booster()
+        booster.load_model(str(ARTIFACTS_DIR / BOOSTER_FILE))
+        return {"_booster": booster, "_iteration_range": self._iteration_range_of(booster)}
+
+    def _read_pickled(self) -> dict:
+        model, scaler, encoders = load_pickled_artifacts()
+        return {
+            "_model": model,
+            # LabelEncoder.classes_ is sorted, so a value's code is its searchsorted position
+            "_lookup": {col: np.asarray(enc.classes_).astype(str) for col, enc in encoders.items()},
+            "_mean":  np.asarray(scaler.mean_,  dtype=np.float64) if getattr(scaler, "with_mean", False) else None,
+            "_scale": np.asarray(scaler.scale_, dtype=np.float64) if getattr(scaler, "with_std", False) else None,
+        }
+
+    def reload(self):
+        """
+        Re-read the artifacts from disk (e.g. after export_pulse.py) and drop
+        cached predictions. The old model keeps serving while the new one is
+        read, then both are swapped under the lock — never a moment without one.
+        """
+        state = self._read()
+        with self._lock:
+            self._install(state)
+            self.cache.clear()
+
+    @property
+    def model_version(self) -> str | None:
+        return self._version.decode() if self._loaded else None
+
+    def load_async(self) -> threading.Thread | None:
+        """Warm the model in a background thread so no request pays the load cost."""
+        if self._loaded or not self.is_ready:
+            self.status = "ready" if self._loaded else "missing"
+            return None
+        self.status = "loading"
+
+        def _warm():
+            try:
+                self._load()
+            except Exception:
+                log.exception("PULSE model failed to load")
+
+        t = threading.Thread(target=_warm, name="pulse-load", daemon=True)
+        t.start()
+        return t
+
+    @property
+    def layout(self) -> str | None:
+        """Which artifact layout _load() will use (None if there are no artifacts)."""
+        if (ARTIFACTS_DIR / PREPROC_FILE).exists():
+            if (ARTIFACTS_DIR / TREES_FILE).exists():
+                return "numpy"
+            if (ARTIFACTS_DIR / BOOSTER_FILE).exists():
+                return "booster"
+        if (ARTIFACTS_DIR / "pulse_model.pkl").exists():
+            return "pickled"
+        return None
 
     @property
     def is_ready(self) -> bool:
-        return (ARTIFACTS_DIR / "pulse_model.pkl").exists()
+        return self.layout is not None
 
     @property
     def metadata(self) -> dict:
         self._load()
         return self._meta
 
-    def predict_one(self, features: dict) -> dict:
+    def _predict_proba(self, matrix: np.ndarray) -> np.ndarray:
+        if self._trees is not None:
+            return self._trees.predict_proba(matrix)
+        if self._booster is not None:
+            return np.asarray(self._booster.inplace_predict(matrix, iteration_range=self._iteration_range))
+        return np.asarray(self._model.predict_proba(matrix))
+
+    @property
+    def can_explain(self) -> bool:
+        """False only for a numpy-layout export that predates node_mean."""
+        self._load()
+        return self._trees is None or self._trees.can_explain
+
+    def _predict_contribs(self, matrix: np.ndarray) -> np.ndarray:
+        """(n, n_classes, n_features + 1) margin contributions, bias last."""
+        if self._trees is not None:
+            return self._trees.predict_contribs(matrix)
+        import xgboost as xgb
+        booster = self._booster if self._booster is not None else self._model.get_booster()
+        contribs = booster.predict(xgb.DMatrix(matrix), pred_contribs=True,
+                                   iteration_range=self._iteration_range_of(booster))
+        return np.asarray(contribs, dtype=np.float64)
+
+    def _encode(self, col: str, values) -> np.ndarray:
+        classes = self._lookup[col]
+        raw = np.asarray(values).astype(str)
+        pos = np.searchsorted(classes, raw)
+        pos[pos == len(classes)] = 0
+        # Unseen values encode as 0, like the per-row transform did
+        return np.where(classes[pos] == raw, pos, 0)
+
+    def _matrix(self, columns: dict, n_rows: int) -> np.ndarray:
+        matrix = np.zeros((n_rows, len(self._columns)), dtype=np.float64)
+        for j, col in enumerate(self._columns):
+            if col in self._lookup:
+                matrix[:, j] = self._encode(col, columns.get(col, "Unknown"))
+            elif col in columns:
+                matrix[:, j] = np.asarray(columns[col], dtype=np.float64)
+        return matrix
+
+    def predict_matrix(self, columns: dict[str, np.ndarray]) -> tuple[np.ndarray, np.ndarray]:
         """
-        features: dict with keys matching FEATURE_COLS from metadata.
-        Categorical fields (gender, highest_education, imd_band, age_band, disability)
-        should be passed as raw strings — encoding is handled here.
-        Returns: { state_id, state_label, confidence, probabilities }
+        Vectorized inference over feature columns.
+        columns: {feature name: 1-D array}; categoricals hold raw strings,
+        missing columns are 0 (categoricals "Unknown").
+        Returns (state_ids int64[n], probabilities float[n, n_classes]).
         """
         self._load()
-        feat_copy = dict(features)
+        n_rows = max((len(v) for v in columns.values() if np.ndim(v)), default=1)
+        return self._predict_encoded(self._matrix(columns, n_rows))
 
-        # Encode categoricals
-        for col, enc in self._encoders.items():
-            raw = str(feat_copy.get(col, "Unknown"))
-            feat_copy[col] = int(enc.transform([raw])[0]) if raw in enc.classes_ else 0
+    def explain_matrix(self, columns: dict[str, np.ndarray], top_n: int = EXPLAIN_TOP_N
+                       ) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        predict_matrix plus the top_n features driving each predicted state.
+        Returns (state_ids, probabilities, top feature indices int[n, top_n],
+        their margin contributions float[n, top_n]), ordered by |contribution|.
+        """
+        self._load()
+        n_rows = max((len(v) for v in columns.values() if np.ndim(v)), default=1)
+        return self._explain_encoded(self._matrix(columns, n_rows), top_n)
 
-        # Build ordered feature vector
-        vec = np.array(
-            [feat_copy.get(f, 0) for f in self._meta["feature_columns"]], dtype=float
-        ).reshape(1, -1)
+    def _scale_in_place(self, matrix: np.ndarray) -> np.ndarray:
+        # StandardScaler.transform
+        if self._mean is not None:
+            matrix -= self._mean
+        if self._scale is not None:
+            matrix /= self._scale
+        return matrix
 
-        scaled     = self._scaler.transform(vec)
-        state_id   = int(self._model.predict(scaled)[0])
-        proba      = self._model.predict_proba(scaled)[0]
-        confidence = float(proba[state_id])
+    def _predict_encoded(self, matrix: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        proba = self._predict_proba(self._scale_in_place(matrix))
+        return proba.argmax(axis=1), proba
 
-        return {
-            "state_id"    : state_id,
-            "state_label" : STATE_MAP[state_id],
-            "confidence"  : round(confidence, 4),
-            "probabilities": {STATE_MAP[i]: round(float(p), 4) for i, p in enumerate(proba)},
-        }
+    def _explain_encoded(self, matrix: np.ndarray, top_n: int):
+        contribs = self._predict_contribs(self._scale_in_place(matrix))
+        # Contributions sum to the margin, so the probabilities come from the same pass
+        margin = contribs.sum(axis=2)
+        margin -= margin.max(axis=1, keepdims=True)
+        proba = np.exp(margin)
+        proba /= proba.sum(axis=1, keepdims=True)
+        states = proba.argmax(axis=1)
+        own = contribs[np.arange(len(states)), states, :-1]
+        top = np.argsort(-np.abs(own), axis=1, kind="stable")[:, :top_n]
+        return states, proba, top, np.take_along_axis(own, top, axis=1)
 
-    def predict_batch(self, rows: list[dict]) -> list[dict]:
-        """rows: list of feature dicts. Returns list of prediction dicts."""
-        self._load()
-        results = []
-        for row in rows:
-            feat_copy = dict(row)
-            for col, enc in self._encoders.items():
-                raw = str(feat_copy.get(col, "Unknown"))
-                feat_copy[col] = int(enc.transform([raw])[0]) if raw in enc.classes_ else 0
-            vec    = np.array([feat_copy.get(f, 0) for f in self._meta["feature_columns"]], dtype=float)
-            results.append(vec)
-
-        matrix = np.array(results)
-        scaled  = self._scaler.transform(matrix)
-        states  = self._model.predict(scaled).tolist()
-        probas  = self._model.predict_proba(scaled).tolist()
+    def factor_dicts(self, top_idx: np.ndarray, contribs: np.ndarray, value_of) -> list[dict]:
+        """
+        One explanation's factors as JSON-ready dicts. value_of(feature name)
+        returns the learner's raw value. direction is '↑' when the feature
+        pushes towards the predicted state, '↓' when it pushes away.
+        """
+        factors = []
+        for j, c in zip(top_idx.tolist(), contribs.tolist()):
+            name = self._columns[j]
+            value = value_of(name)
+            factors.append({
+                "feature"     : name,
+                "label"       : FEATURE_HUMAN_LABELS.get(name, name.replace('_', ' ').title()),
+                "value"       : value if isinstance(value, str) else round(float(value), 3),
+                "contribution": round(c, 4),
+                "direction"   : '↑' if c > 0 else '↓',
+                "high_is_bad" : name in HIGH_IS_BAD,
+            })
+        return factors
 
+    @staticmethod
+    def to_dicts(state_ids: np.ndarray, proba: np.ndarray) -> list[dict]:
+        """Response shape of predict_one / predict_batch — only built for the HTTP layer."""
+        labels = [STATE_MAP[i] for i in range(proba.shape[1])]
+        proba = proba.astype(np.float64)   # XGBoost returns float32
+        confidence = np.round(proba[np.arange(len(state_ids)), state_ids], 4).tolist()
+        rounded = np.round(proba, 4).tolist()
         return [
             {
                 "state_id"    : int(s),
                 "state_label" : STATE_MAP[int(s)],
-                "confidence"  : round(float(probas[i][int(s)]), 4),
-                "probabilities": {STATE_MAP[j]: round(float(p), 4) for j, p in enumerate(probas[i])},
+                "confidence"  : confidence[i],
+                "probabilities": dict(zip(labels, rounded[i])),
             }
-            for i, s in enumerate(states)
+            for i, s in enumerate(state_ids.tolist())
         ]
 
+    def predict_one(self, features: dict, explain: bool = False) -> dict:
+        """
+        features: dict with keys matching FEATURE_COLS from metadata.
+        Categorical fields (gender, highest_education, imd_band, age_band, disability)
+        should be passed as raw strings — encoding is handled here.
+        Returns: { state_id, state_label, confidence, probabilities[, factors] }
+        """
+        return self.predict_batch([features], explain=explain)[0]
+
+    def predict_batch(self, rows: list[dict], explain: bool = False) -> list[dict]:
+        """rows: list of feature dicts. Returns list of prediction dicts; explain adds "factors"."""
+        if not rows:
+            return []
+        self._load()
+        columns = {
+            col: [row.get(col, "Unknown" if col in self._lookup else 0) for row in rows]
+            for col in self._columns
+        }
+        for col in self._lookup:
+            columns[col] = [str(v) for v in columns[col]]
+        matrix = self._matrix(columns, len(rows))
+
+        def compute(idx: list[int]) -> list[dict]:
+            if not explain:
+                return self.to_dicts(*self._predict_encoded(matrix[idx]))
+            states, proba, top, contribs = self._explain_encoded(matrix[idx], EXPLAIN_TOP_N)
+            preds = self.to_dicts(states, proba)
+            for pred, i, t, c in zip(preds, idx, top, contribs):
+                pred["factors"] = self.factor_dicts(t, c, lambda name: columns[name][i])
+            return preds
+
+        if self.cache.maxsize <= 0:
+            return compute(list(range(len(rows))))
+
+        prefix = self._version + (b"\0x\0" if explain else b"\0")
+        keys = [hashlib.blake2b(prefix + row.tobytes(), digest_size=16).digest() for row in matrix]
+        results = [self.cache.get(k) for k in keys]
+        missing = [i for i, r in enumerate(results) if r is None]
+        if missing:
+            for i, pred in zip(missing, compute(missing)):
+                self.cache.put(keys[i], pred)
+                results[i] = pred
+        return results
+
 
 # Singleton — imported by admin router
 predictor = _PulsePredictor()
@@ -0,0 +1,192 @@
+"""
+Pure-NumPy evaluator for the PULSE gradient-boosted trees.
+
+compile_booster() flattens the booster's JSON dump (Booster.save_raw("json"))
+into one set of node arrays shared by every tree; TreeEnsemble walks all trees
+for a block of rows at once, one tree level per step. Evaluation follows
+XGBoost exactly — features and thresholds compared as float32, x < threshold
+goes left, NaN takes the node's default direction, margins summed per class
+plus base_score, then softmax — so the API process can score without
+importing xgboost or scikit-learn.
+
+predict_contribs() attributes each margin to the features on the decision
+paths: every split adds the change in the node's cover-weighted mean leaf
+value (node_mean, precomputed at compile time) to the split feature. This is
+XGBoost's pred_contribs with approx_contribs=True; contributions plus the bias
+column sum to the margin.
+
+The arrays are written to PULSE/pulse_artifacts/pulse_trees.npz by
+backend/export_pulse.py, which also checks parity against the pickled model.
+"""
+import numpy as np
+
+ROW_BLOCK = 4096   # rows evaluated together; bounds the (rows × trees) working set
+
+_FIELDS = ("left", "right", "feature", "threshold", "default_left", "value", "roots", "tree_class", "base_score", "depth")
+_OPTIONAL = ("node_mean",)   # absent in exports that predate explanations
+
+
+def _base_score(raw: str, num_class: int) -> np.ndarray:
+    # "5E-1" (older models) or "[0E0,0E0,...]" (one per class)
+    values = [float(v) for v in raw.strip("[]").split(",")]
+    return np.broadcast_to(np.asarray(values, dtype=np.float64), (num_class,)).copy()
+
+
+def _tree_depth(left: np.ndarray, right: np.ndarray) -> int:
+    depth, frontier = 0, np.array([0])
+    while True:
+        frontier = np.concatenate([left[frontier], right[frontier]])
+        frontier = frontier[frontier >= 0]
+        if not frontier.size:
+            return depth
+        depth += 1
+
+
+def _node_means(left: np.ndarray, right: np.ndarray, cover: np.ndarray, value: np.ndarray) -> np.ndarray:
+    """Cover-weighted mean leaf value under each node (XGBoost's FillNodeMeanValues)."""
+    mean = np.zeros(len(left), dtype=np.float64)
+
+    def fill(i: int) -> float:
+        if left[i] < 0:
+            mean[i] = value[i]
+        else:
+            mean[i] = (fill(left[i]) * cover[left[i]] + fill(right[i]) * cover[right[i]]) / cover[i]
+        return mean[i]
+
+    fill(0)
+    return mean
+
+
+def compile_booster(model: dict) -> dict[str, np.ndarray]:
+    """Booster JSON dump -> flat arrays (the contents of pulse_trees.npz)."""
+    learner = model["learner"]
+    objective = learner["objective"]["name"]
+    if objective != "multi:softprob" and objective != "multi:softmax":
+        raise ValueError(f"unsupported objective {objective!r}")
+    num_class = int(learner["learner_model_param"]["num_class"])
+    booster = learner["gradient_booster"]
+    if booster.get("name", "gbtree") != "gbtree":
+        raise ValueError(f"unsupported booster {booster.get('name')!r}")
+    trees = booster["model"]["trees"]
+
+    best = learner.get("attributes", {}).get("best_iteration")
+    if best is not None:
+        indptr = booster["model"].get("iteration_indptr")
+        if indptr is not None:
+            n_trees = int(indptr[int(best) + 1])
+        else:
+            per_round = num_class * int(booster["model"]["gbtree_model_param"]["num_parallel_tree"])
+            n_trees = (int(best) + 1) * per_round
+        trees = trees[:n_trees]
+
+    left, right, feature, threshold, default_left, value, node_mean, roots, depth = [], [], [], [], [], [], [], [], 0
+    offset = 0
+    for tree in trees:
+        if int(tree["tree_param"].get("size_leaf_vector", "1")) > 1:
+            raise ValueError("multi-output trees are not supported")
+        if any(tree["split_type"]):
+            raise ValueError("categorical splits are not supported")
+        l = np.asarray(tree["left_children"], dtype=np.int64)
+        r = np.asarray(tree["right_children"], dtype=np.int64)
+        leaf = l < 0
+        own = np.arange(len(l), dtype=np.int64) + offset
+        # Leaves point at themselves, so extra steps past a shallow leaf are no-ops
+        left.append(np.where(leaf, own, l + offset))
+        right.append(np.where(leaf, own, r + offset))
+        feature.append(np.where(leaf, 0, tree["split_indices"]))
+        threshold.append(np.asarray(tree["split_conditions"], dtype=np.float32))
+        default_left.append(np.asarray(tree["default_left"], dtype=bool))
+        # For leaves XGBoost stores the leaf weight in split_conditions
+        value.append(np.where(leaf, np.asarray(tree["split_conditions"], dtype=np.float32), 0))
+        node_mean.append(_node_means(l, r, np.asarray(tree["sum_hessian"], dtype=np.float64), value[-1]))
+        roots.append(offset)
+        depth = max(depth, _tree_depth(l, r))
+        offset += len(l)
+
+    return {
+        "left"        : np.concatenate(left).astype(np.int32),
+        "right"       : np.concatenate(right).astype(np.int32),
+        "feature"     : np.concatenate(feature).astype(np.int32),
+        "threshold"   : np.concatenate(threshold).astype(np.float32),
+        "default_left": np.concatenate(default_left),
+        "value"       : np.concatenate(value).astype(np.float32),
+        "node_mean"   : np.concatenate(node_mean).astype(np.float32),
+        "roots"       : np.asarray(roots, dtype=np.int32),
+        "tree_class"  : np.asarray(booster["model"]["tree_info"][:len(trees)], dtype=np.int32),
+        "base_score"  : _base_score(learner["learner_model_param"]["base_score"], num_class),
+        "depth"       : np.asarray(depth, dtype=np.int32),
+    }
+
+
+class TreeEnsemble:
+    def __init__(self, arrays: dict[str, np.ndarray]):
+        for name in _FIELDS:
+            setattr(self, name, np.asarray(arrays[name]))
+        self.node_mean = np.asarray(arrays["node_mean"]) if "node_mean" in arrays else None
+        self.depth = int(self.depth)
+        self.num_class = len(self.base_score)
+        # (trees × classes) one-hot, so per-class margins are one matmul
+        self._class_matrix = np.zeros((len(self.roots), self.num_class), dtype=np.float64)
+        self._class_matrix[np.arange(len(self.roots)), self.tree_class] = 1.0
+
+    @classmethod
+    def load(cls, path) -> "TreeEnsemble":
+        with np.load(path, allow_pickle=False) as npz:
+            return cls({name: npz[name] for name in _FIELDS + _OPTIONAL if name in npz.files})
+
+    @property
+    def can_explain(self) -> bool:
+        return self.node_mean is not None
+
+    def _margin(self, X: np.ndarray) -> np.ndarray:
+        rows = np.arange(len(X))[:, None]
+        node = np.broadcast_to(self.roots, (len(X), len(self.roots))).copy()
+        for _ in range(self.depth):
+            x = X[rows, self.feature[node]]
+            go_left = np.where(np.isnan(x), self.default_left[node], x < self.threshold[node])
+            node = np.where(go_left, self.left[node], self.right[node])
+        return self.value[node].astype(np.float64) @ self._class_matrix + self.base_score
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """X: (n, num_feature) already scaled. Returns softmax probabilities (n, num_class)."""
+        X = np.asarray(X, dtype=np.float32)
+        margin = np.empty((len(X), self.num_class), dtype=np.float64)
+        for start in range(0, len(X), ROW_BLOCK):
+            margin[start:start + ROW_BLOCK] = self._margin(X[start:start + ROW_BLOCK])
+        margin -= margin.max(axis=1, keepdims=True)
+        np.exp(margin, out=margin)
+        margin /= margin.sum(axis=1, keepdims=True)
+        return margin
+
+    def _contribs(self, X: np.ndarray) -> np.ndarray:
+        n, n_feature = X.shape
+        rows = np.arange(n)[:, None]
+        node = np.broadcast_to(self.roots, (n, len(self.roots))).copy()
+        # Flat index of contribs[row, tree_class, 0]; the split feature is added per level
+        base = (rows * self.num_class + self.tree_class) * (n_feature + 1)
+        contribs = np.zeros(n * self.num_class * (n_feature + 1), dtype=np.float64)
+        for _ in range(self.depth):
+            feature = self.feature[node]
+            x = X[rows, feature]
+            go_left = np.where(np.isnan(x), self.default_left[node], x < self.threshold[node])
+            nxt = np.where(go_left, self.left[node], self.right[node])
+            # Zero once a row has reached its leaf (leaves point at themselves)
+            delta = self.node_mean[nxt].astype(np.float64) - self.node_mean[node]
+            contribs += np.bincount((base + feature).ravel(), weights=delta.ravel(), minlength=contribs.size)
+            node = nxt
+        contribs = contribs.reshape(n, self.num_class, n_feature + 1)
+        contribs[:, :, -1] = self.node_mean[self.roots].astype(np.float64) @ self._class_matrix + self.base_score
+        return contribs
+
+    def predict_contribs(self, X: np.ndarray) -> np.ndarray:
+        """
+        X: (n, num_feature) already scaled. Returns per-feature margin
+        contributions (n, num_class, num_feature + 1); the last column is the bias.
+        """
+        if not self.can_explain:
+            raise ValueError("pulse_trees.npz has no node_mean; re-run backend/export_pulse.py")
+        X = np.asarray(X, dtype=np.float32)
+        out = np.empty((len(X), self.num_class, X.shape[1] + 1), dtype=np.float64)
+        for start in range(0, len(X), ROW_BLOCK):
+            out[start:start + ROW_BLOCK] = self._contribs(X[start:start + ROW_BLOCK])
+        return out
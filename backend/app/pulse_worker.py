@@ -0,0 +1,194 @@
+"""
+Background PULSE scoring.
+
+POST /api/admin/pulse/run records a PulseJob and hands its id to a worker
+thread; the request returns immediately and progress is polled from the job
+row. Between requests the worker wakes every PULSE_SCORE_INTERVAL_MIN minutes
+(0 disables) and queues an incremental job on its own.
+
+Incremental jobs only rescore students whose features changed since their
+last score (User.pulse_changed_at > pulse_scored_at — set by enrollment,
+lesson completion and xp changes); full jobs rescore everyone. Each chunk
+stamps pulse_scored_at with the time its features were read, so a change
+that lands mid-run is picked up by the next one.
+
+Each chunk also stores its students' top contributing features
+(app/pulse_explain.py), computed in the same pass as the states, and appends
+the new states to pulse_state_history (app/pulse_history.py); the day's
+distribution rollup is refreshed when the run finishes.
+
+Runs of at least PULSE_POOL_MIN_ROWS students are sharded across the
+process pool in app/pulse_pool.py; smaller ones are scored in this thread.
+
+Jobs are queued in-process: with several API processes, leave the schedule
+on in one of them and set PULSE_SCORE_INTERVAL_MIN=0 in the others.
+"""
+import json, logging, os, queue, threading, time
+from datetime import datetime
+import numpy as np
+from sqlalchemy import case, cast
+from sqlalchemy.orm import Session
+from app.models import SessionLocal, User, RoleEnum, PulseJob
+from app.pulse_predictor import predictor, STATE_MAP
+from app.pulse_features import iter_student_features, changed_since_scored
+from app.pulse_pool import pulse_pool, score_shard
+from app.pulse_explain import store as store_explanations
+from app.pulse_history import record_chunk, roll_up_distribution
+from app.pulse_distribution import invalidate as invalidate_distribution
+from app.pulse_predictor import EXPLAIN_TOP_N
+
+log = logging.getLogger(__name__)
+
+INTERVAL_MIN = float(os.getenv("PULSE_SCORE_INTERVAL_MIN", "15"))
+
+
+def _rows_per_sec(job: PulseJob) -> float | None:
+    if not job.started_at or not job.processed:
+        return None
+    elapsed = ((job.finished_at or datetime.utcnow()) - job.started_at).total_seconds()
+    return round(job.processed / elapsed, 1) if elapsed > 0 else None
+
+
+def job_dict(job: PulseJob) -> dict:
+    return {
+        "id": job.id, "kind": job.kind, "status": job.status,
+        "total": job.total, "processed": job.processed,
+        "progress": round(job.processed / job.total, 4) if job.total else (1.0 if job.status == "done" else 0.0),
+        "distribution": json.loads(job.distribution) if job.distribution else {},
+        "rows_per_sec": _rows_per_sec(job),
+        "error": job.error, "requested_by": job.requested_by,
+        "created_at": job.created_at, "started_at": job.started_at, "finished_at": job.finished_at,
+    }
+
+
+def _stamped(chunks):
+    """((user_ids, read_at, columns), columns) — read_at is taken before the chunk's query runs."""
+    while True:
+        read_at = datetime.utcnow()
+        try:
+            ids, columns = next(chunks)
+        except StopIteration:
+            return
+        yield (ids, read_at, columns), columns
+
+
+def run_job(db: Session, job: PulseJob):
+    """Score the job's students chunk by chunk, committing state and progress after each chunk."""
+    only_changed = job.kind != "full"
+    q = db.query(User).filter(User.role == RoleEnum.student)
+    if only_changed:
+        q = q.filter(changed_since_scored())
+    job.status, job.started_at, job.total = "running", datetime.utcnow(), q.count()
+    db.commit()
+
+    # Chunks are scored ahead of the write-back when pooled, so each keeps its own read time
+    chunks = _stamped(iter_student_features(db, only_changed=only_changed))
+    top_n = EXPLAIN_TOP_N if predictor.can_explain else 0
+    if pulse_pool.should_use(job.total):
+        scored = pulse_pool.score_chunks(chunks, top_n)
+    else:
+        scored = ((key, score_shard(columns, top_n)) for key, columns in chunks)
+
+    counts = np.zeros(len(STATE_MAP), dtype=np.int64)
+    started = time.perf_counter()
+    for (user_ids, read_at, columns), (states, top, contribs) in scored:
+        ids = user_ids.tolist()
+        labels = [STATE_MAP[s] for s in states.tolist()]
+        record_chunk(db, job.id, ids, labels, read_at)
+        # One UPDATE ... SET pulse_state = CASE id WHEN ... END per chunk
+        db.query(User).filter(User.id.in_(ids)).update({
+            User.pulse_state: cast(case(dict(zip(ids, labels)), value=User.id), User.pulse_state.type),
+            User.pulse_scored_at: read_at,
+        }, synchronize_session=False)
+        if top_n:
+            store_explanations(db, user_ids, states, top, contribs, columns, read_at)
+        counts += np.bincount(states, minlength=len(STATE_MAP))
+        job.processed += len(ids)
+        job.distribution = json.dumps({STATE_MAP[i]: int(n) for i, n in enumerate(counts) if n})
+        db.commit()
+
+    roll_up_distribution(db)
+    job.status, job.finished_at = "done", datetime.utcnow()
+    db.commit()
+    invalidate_distribution("platform", "instructor")
+    elapsed = time.perf_counter() - started
+    log.info("PULSE job %s scored %d students in %.2fs (%.0f rows/s)",
+             job.id, job.processed, elapsed, job.processed / elapsed if elapsed else 0)
+
+
+def _create_job(db: Session, kind: str, requested_by: int | None) -> PulseJob:
+    job = PulseJob(kind=kind, requested_by=requested_by)
+    db.add(job)
+    db.commit()
+    return job
+
+
+class PulseWorker:
+    def __init__(self, interval_min: float = INTERVAL_MIN):
+        self.interval = interval_min * 60 if interval_min > 0 else None
+        self._queue: queue.Queue[int] = queue.Queue()
+        self._thread: threading.Thread | None = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._recover()
+        self._thread = threading.Thread(target=self._run, name="pulse-worker", daemon=True)
+        self._thread.start()
+
+    def enqueue(self, db: Session, kind: str = "incremental", requested_by: int | None = None) -> PulseJob:
+        job = _create_job(db, kind, requested_by)
+        self._queue.put(job.id)
+        return job
+
+    def _recover(self):
+        """Jobs a previous process left behind: re-queue the queued ones, fail the interrupted ones."""
+        db = SessionLocal()
+        try:
+            db.query(PulseJob).filter(PulseJob.status == "running").update(
+                {"status": "failed", "error": "interrupted by restart", "finished_at": datetime.utcnow()})
+            db.commit()
+            for (job_id,) in db.query(PulseJob.id).filter(PulseJob.status == "queued").order_by(PulseJob.id):
+                self._queue.put(job_id)
+        finally:
+            db.close()
+
+    def _schedule(self) -> int | None:
+        if not predictor.is_ready:
+            return None
+        db = SessionLocal()
+        try:
+            if db.query(PulseJob.id).filter(PulseJob.status.in_(["queued", "running"])).first():
+                return None
+            return _create_job(db, "incremental", None).id
+        finally:
+            db.close()
+
+    def _run(self):
+        while True:
+            try:
+                job_id = self._queue.get(timeout=self.interval)
+            except queue.Empty:
+                job_id = self._schedule()
+                if job_id is None:
+                    continue
+            self._execute(job_id)
+
+    def _execute(self, job_id: int):
+        db = SessionLocal()
+        try:
+            job = db.get(PulseJob, job_id)
+            if job is None or job.status != "queued":
+                return
+            try:
+                run_job(db, job)
+            except Exception as e:
+                log.exception("PULSE job %s failed", job_id)
+                db.rollback()
+                job.status, job.error, job.finished_at = "failed", str(e), datetime.utcnow()
+                db.commit()
+        finally:
+            db.close()
+
+
+pulse_worker = PulseWorker()
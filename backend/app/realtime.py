@@ -0,0 +1,136 @@
+"""
+Per-user real-time push over WebSocket.
+
+Routers queue events on the DB session with push_after_commit(); payloads are
+snapshotted at flush time (when ids exist) and published only once the
+transaction commits, so clients never see rows that were rolled back.
+
+Publishing goes through a Backplane. LocalBackplane fans out inside this
+process; running several uvicorn workers only needs another Backplane whose
+publish() forwards to a shared pub/sub (e.g. Redis) and whose listener calls
+hub.deliver() for every message received.
+"""
+import asyncio, json
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from fastapi import WebSocket
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from app.models import Notification, Message
+
+_PENDING = "realtime_pending"
+_READY = "realtime_ready"
+
+
+def _shape(kind: str, obj) -> dict:
+    if isinstance(obj, dict):
+        return {"type": kind, **obj}
+    if isinstance(obj, Notification):
+        return {"type": kind, "notification": {
+            "id": obj.id, "title": obj.title, "message": obj.message, "link": obj.link,
+            "notif_type": obj.notif_type, "course_id": obj.course_id,
+            "allow_replies": obj.allow_replies, "sent_at": obj.sent_at,
+        }}
+    if isinstance(obj, Message):
+        return {"type": kind, "message": {
+            "id": obj.id, "sender_id": obj.sender_id, "receiver_id": obj.receiver_id,
+            "content": obj.content, "attachment_url": obj.attachment_url,
+            "attachment_type": obj.attachment_type, "attachment_name": obj.attachment_name,
+            "is_read": obj.is_read, "created_at": obj.created_at,
+        }}
+    raise TypeError(f"Cannot push {type(obj).__name__}")
+
+
+def push_after_commit(db: Session, target: str, kind: str, obj):
+    """
+    Queue an event for delivery once `db` commits.
+    target uses the Notification.target vocabulary: str(user_id), "students",
+    "instructors", "admins", "all", "course_<id>".
+    obj is a Notification, a Message, or a plain dict payload.
+    """
+    if isinstance(obj, dict) or inspect(obj).persistent:
+        db.info.setdefault(_READY, []).append((target, _shape(kind, obj)))
+    else:
+        db.info.setdefault(_PENDING, []).append((target, kind, obj))
+
+
+@event.listens_for(Session, "after_flush_postexec")
+def _snapshot(session, flush_context):
+    pending = session.info.pop(_PENDING, None)
+    if pending:
+        session.info.setdefault(_READY, []).extend((t, _shape(k, o)) for t, k, o in pending)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish(session):
+    session.info.pop(_PENDING, None)
+    for target, payload in session.info.pop(_READY, None) or []:
+        hub.backplane.publish(target, payload)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard(session, previous_transaction):
+    session.info.pop(_PENDING, None)
+    session.info.pop(_READY, None)
+
+
+class Backplane(ABC):
+    """Transport between publishers and the sockets held by this worker."""
+    @abstractmethod
+    def start(self, loop: asyncio.AbstractEventLoop, deliver):
+        """deliver(channel, payload) is a coroutine function run on `loop`."""
+
+    @abstractmethod
+    def publish(self, channel: str, payload: dict):
+        """Must be safe to call from any thread (sync routes run in a threadpool)."""
+
+
+class LocalBackplane(Backplane):
+    def __init__(self):
+        self._loop = None
+        self._deliver = None
+
+    def start(self, loop, deliver):
+        self._loop, self._deliver = loop, deliver
+
+    def publish(self, channel, payload):
+        if self._loop is None or self._loop.is_closed():
+            return
+        asyncio.run_coroutine_threadsafe(self._deliver(channel, payload), self._loop)
+
+
+class PushHub:
+    def __init__(self, backplane: Backplane):
+        self.backplane = backplane
+        # channel -> sockets subscribed to it, and each socket's channels
+        self.channels: dict[str, set[WebSocket]] = defaultdict(set)
+        self.subscriptions: dict[WebSocket, list[str]] = {}
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        self.backplane.start(loop, self.deliver)
+
+    async def connect(self, ws: WebSocket, channels: list[str]):
+        await ws.accept()
+        self.subscriptions[ws] = channels
+        for c in channels:
+            self.channels[c].add(ws)
+
+    def disconnect(self, ws: WebSocket):
+        """Drop the socket from every channel it joined; safe to call more than once."""
+        for c in self.subscriptions.pop(ws, ()):
+            subscribers = self.channels.get(c)
+            if subscribers is not None:
+                subscribers.discard(ws)
+                if not subscribers:
+                    del self.channels[c]
+
+    async def deliver(self, channel: str, payload: dict):
+        text = json.dumps(payload, default=str)
+        for ws in list(self.channels.get(channel, ())):
+            try:
+                await ws.send_text(text)
+            except Exception:
+                self.disconnect(ws)
+
+
+hub = PushHub(LocalBackplane())
@@ -1,11 +1,28 @@
-from fastapi import APIRouter, Depends, Query, HTTPException
+from fastapi import APIRouter, Depends, Query, HTTPException, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import func
-from app.models import get_db, User, Course, Module, Enrollment, Payment, Payout, LiveSession, MonthlyRevenue, RoleEnum, StatusEnum, CourseStatusEnum, Lesson, Quiz, Notification, NotificationRead, ModuleQuiz, QuizQuestion
+from app.models import get_db, User, Course, CourseStats, Enrollment, Payment, Payout, LiveSession, MonthlyRevenue, RoleEnum, StatusEnum, CourseStatusEnum, Quiz, Notification, NotificationRead, PulseJob
 from app.auth import require_role, hash_password
 from app.pulse_predictor import predictor as pulse_predictor
+from app.pulse_worker import pulse_worker, job_dict
+from app.pulse_pool import pulse_pool
+from app.pulse_explain import explanation_for
+from app.pulse_distribution import platform_distribution
+from app.dashboard import dashboard_snapshot
+from app.aggregates import course_aggregates, ensure_course_stats, refresh_course_stats, rebuild_course_stats
+from app.curriculum import load_curriculum, quiz_dict, question_dict
+from app.catalog import bump_catalog
+from app.search import search_index, refresh_instructor_documents
+from app.pulse_history import trends as pulse_trends, user_history as pulse_user_history
 from app.notify import notify
+from app.realtime import push_after_commit
+from app.audiences import visible_to
+from app.notification_state import unread_count, mark_read, bump_unread, retract_unread, refresh_unread, reset_unread_counters
+from app.export import ENTITIES as EXPORT_ENTITIES, FORMATS as EXPORT_FORMATS, export_stream
+from app.pagination import Page, paginate, set_page_headers, encode_cursor, decode_cursor, DEFAULT_LIMIT, MAX_LIMIT
 from typing import Optional
+from datetime import datetime
 
 router = APIRouter(prefix="/api/admin", tags=["admin"])
 guard = require_role(RoleEnum.admin, RoleEnum.super_admin)
@@ -13,41 +30,27 @@ super_guard = require_role(RoleEnum.super_admin)
 
 @router.get("/dashboard")
 def dashboard(db: Session = Depends(get_db), _=Depends(guard)):
-    total_users = db.query(User).count()
-    total_students = db.query(User).filter(User.role == RoleEnum.student).count()
-    total_instructors = db.query(User).filter(User.role == RoleEnum.instructor).count()
-    total_revenue = db.query(func.sum(Payment.amount)).filter(Payment.status == "completed").scalar() or 0
-    active_courses = db.query(Course).filter(Course.status == "published").count()
-    pending_courses = db.query(Course).filter(Course.status == "pending").count()
-    total_enrollments = db.query(Enrollment).count()
-    pending_payouts = db.query(Payout).filter(Payout.status == "pending").count()
-    from app.models import Report
-    open_reports = db.query(Report).filter(Report.status == "open").count()
-    pulse_dist = {}
-    for state in ["thriving","coasting","struggling","burning_out","disengaged"]:
-        pulse_dist[state] = db.query(User).filter(User.pulse_state == state).count()
-    monthly = db.query(MonthlyRevenue).filter(MonthlyRevenue.instructor_id == None).order_by(MonthlyRevenue.year, MonthlyRevenue.month).all()
-    return {
-        "total_users": total_users,
-        "total_students": total_students,
-        "total_instructors": total_instructors,
-        "total_revenue": round(total_revenue, 2),
-        "active_courses": active_courses,
-        "pending_courses": pending_courses,
-        "total_enrollments": total_enrollments,
-        "pending_payouts": pending_payouts,
-        "open_reports": open_reports,
-        "pulse_distribution": pulse_dist,
-        "monthly_revenue": [{"month": r.month, "year": r.year, "gross": r.gross, "net": r.net} for r in monthly]
-    }
+    return dashboard_snapshot.get(db)
 
 @router.get("/users")
-def list_users(role: Optional[str] = None, status: Optional[str] = None, search: Optional[str] = None, db: Session = Depends(get_db), _=Depends(guard)):
+def list_users(response: Response, role: Optional[str] = None, status: Optional[str] = None, search: Optional[str] = None,
+               sort: Optional[str] = None, cursor: Optional[str] = None, limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+               db: Session = Depends(get_db), _=Depends(guard)):
     q = db.query(User)
     if role: q = q.filter(User.role == role)
     if status: q = q.filter(User.status == status)
-    if search: q = q.filter((User.name.ilike(f"%{search}%")) | (User.email.ilike(f"%{search}%")))
-    users = q.order_by(User.created_at.desc()).limit(100).all()
+    if search:
+        # Ranked by relevance, so the cursor is an offset into the ranking
+        offset = decode_cursor(cursor).get("o", 0) if cursor else 0
+        if not isinstance(offset, int) or offset < 0:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        users = search_index.users(db, q, search, limit=limit + 1, offset=offset)
+        page = Page(users[:limit], encode_cursor({"o": offset + limit}) if len(users) > limit else None, None)
+    else:
+        page = paginate(db, q, sorts={"created_at": User.created_at, "name": User.name}, id_col=User.id,
+                        table="users", filtered=bool(role or status), limit=limit, sort=sort, cursor=cursor)
+    set_page_headers(response, page)
+    users = page.rows
     return [{"id": u.id, "name": u.name, "email": u.email, "role": u.role, "status": u.status, "avatar_initials": u.avatar_initials, "created_at": u.created_at, "last_active": u.last_active, "is_verified": u.is_verified} for u in users]
 
 @router.patch("/users/{user_id}/status")
@@ -71,21 +74,34 @@ def update_user_status(user_id: int, body: dict, db: Session = Depends(get_db),
 def update_user(user_id: int, body: dict, db: Session = Depends(get_db), _=Depends(guard)):
     user = db.query(User).filter(User.id == user_id).first()
     if not user: return {"error": "not found"}
-    if "name" in body: user.name = body["name"]
+    if "name" in body:
+        user.name = body["name"]
+        refresh_instructor_documents(db, user.id)
+        bump_catalog(db)
     if "email" in body: user.email = body["email"]
-    if "role" in body and body["role"] in ("student", "instructor", "admin"): user.role = body["role"]
+    if "role" in body and body["role"] in ("student", "instructor", "admin"):
+        user.role = body["role"]
+        refresh_unread(db, user.id)
     db.commit()
     return {"ok": True}
 
 @router.get("/instructors")
 def list_instructors(db: Session = Depends(get_db), _=Depends(guard)):
     instructors = db.query(User).filter(User.role == RoleEnum.instructor).all()
+    ensure_course_stats(db)
+    totals = {
+        iid: (courses, students, revenue)
+        for iid, courses, students, revenue in db.query(
+            Course.instructor_id, func.count(Course.id),
+            func.coalesce(func.sum(CourseStats.students), 0), func.coalesce(func.sum(CourseStats.revenue), 0),
+        ).outerjoin(CourseStats, CourseStats.course_id == Course.id
+        ).filter(Course.instructor_id.in_([ins.id for ins in instructors])
+        ).group_by(Course.instructor_id)
+    } if instructors else {}
     result = []
     for ins in instructors:
-        courses = db.query(Course).filter(Course.instructor_id == ins.id).count()
-        students = db.query(Enrollment).join(Course).filter(Course.instructor_id == ins.id).count()
-        revenue = db.query(func.sum(Payment.amount)).join(Course, Payment.course_id == Course.id).filter(Course.instructor_id == ins.id, Payment.status == "completed").scalar() or 0
-        result.append({"id": ins.id, "name": ins.name, "email": ins.email, "status": ins.status, "is_verified": ins.is_verified, "avatar_initials": ins.avatar_initials, "courses": courses, "students": students, "revenue_mtd": round(revenue * 0.7, 2)})
+        courses, students, revenue = totals.get(ins.id, (0, 0, 0))
+        result.append({"id": ins.id, "name": ins.name, "email": ins.email, "status": ins.status, "is_verified": ins.is_verified, "avatar_initials": ins.avatar_initials, "courses": courses, "students": students, "revenue_mtd": round(float(revenue) * 0.7, 2)})
     return result
 
 @router.patch("/instructors/{user_id}/verify")
@@ -101,16 +117,22 @@ def verify_instructor(user_id: int, db: Session = Depends(get_db), _=Depends(gua
     return {"ok": True}
 
 @router.get("/courses")
-def list_courses(status: Optional[str] = None, db: Session = Depends(get_db), _=Depends(guard)):
-    q = db.query(Course)
+def list_courses(response: Response, status: Optional[str] = None, instructor_id: Optional[int] = None, language: Optional[str] = None,
+                 sort: Optional[str] = None, cursor: Optional[str] = None, limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+                 db: Session = Depends(get_db), _=Depends(guard)):
+    ensure_course_stats(db)
+    q = db.query(Course, User.name, CourseStats.students, CourseStats.revenue
+        ).outerjoin(User, User.id == Course.instructor_id
+        ).outerjoin(CourseStats, CourseStats.course_id == Course.id)
     if status: q = q.filter(Course.status == status)
-    courses = q.order_by(Course.created_at.desc()).all()
+    if instructor_id: q = q.filter(Course.instructor_id == instructor_id)
+    if language: q = q.filter(Course.language == language)
+    page = paginate(db, q, sorts={"created_at": Course.created_at, "title": Course.title}, id_col=Course.id,
+                    table="courses", filtered=bool(status or instructor_id or language), limit=limit, sort=sort, cursor=cursor)
+    set_page_headers(response, page)
     result = []
-    for c in courses:
-        students = db.query(Enrollment).filter(Enrollment.course_id == c.id).count()
-        revenue = db.query(func.sum(Payment.amount)).filter(Payment.course_id == c.id, Payment.status == "completed").scalar() or 0
-        ins = db.query(User).filter(User.id == c.instructor_id).first()
-        result.append({"id": c.id, "title": c.title, "description": c.description, "language": c.language, "level": c.level, "flag_emoji": c.flag_emoji, "thumbnail_url": c.thumbnail_url, "status": c.status, "price": c.price, "instructor": ins.name if ins else "", "instructor_id": c.instructor_id, "students": students, "revenue": round(revenue, 2), "created_at": c.created_at})
+    for c, instructor_name, students, revenue in page.rows:
+        result.append({"id": c.id, "title": c.title, "description": c.description, "language": c.language, "level": c.level, "flag_emoji": c.flag_emoji, "thumbnail_url": c.thumbnail_url, "status": c.status, "price": c.price, "instructor": instructor_name or "", "instructor_id": c.instructor_id, "students": students or 0, "revenue": round(revenue or 0, 2), "created_at": c.created_at})
     return result
 
 @router.get("/courses/{course_id}")
@@ -118,34 +140,19 @@ def get_course(course_id: int, db: Session = Depends(get_db), _=Depends(guard)):
     c = db.query(Course).filter(Course.id == course_id).first()
     if not c: return {"error": "not found"}
     ins = db.query(User).filter(User.id == c.instructor_id).first()
-    modules = db.query(Module).filter(Module.course_id == c.id).order_by(Module.order).all()
-    module_data = []
-    for m in modules:
-        lessons = db.query(Lesson).filter(Lesson.module_id == m.id).order_by(Lesson.order).all()
-        quizzes = db.query(ModuleQuiz).filter(ModuleQuiz.module_id == m.id).order_by(ModuleQuiz.order).all()
-        quiz_data = []
-        for q in quizzes:
-            questions = db.query(QuizQuestion).filter(QuizQuestion.quiz_id == q.id).order_by(QuizQuestion.order).all()
-            quiz_data.append({
-                "id": q.id, "title": q.title, "position": q.position, "passing_score": q.passing_score,
-                "time_limit_min": q.time_limit_min, "is_required": q.is_required, "order": q.order,
-                "questions": [{
-                    "id": qu.id, "question_text": qu.question_text, "question_type": qu.question_type,
-                    "options": qu.options, "correct_answer": qu.correct_answer, "explanation": qu.explanation,
-                    "points": qu.points, "order": qu.order
-                } for qu in questions]
-            })
-        module_data.append({
-            "id": m.id, "title": m.title, "description": m.description, "order": m.order,
-            "lessons": [{"id": l.id, "title": l.title, "lesson_type": l.lesson_type,
-                         "duration_min": l.duration_min, "description": l.description,
-                         "video_url": l.video_url, "is_preview": l.is_preview} for l in lessons],
-            "quizzes": quiz_data
-        })
-    loose = db.query(Lesson).filter(Lesson.course_id == c.id, Lesson.module_id == None).order_by(Lesson.order).all()
+    cur = load_curriculum(db, c.id)
+    module_data = [{
+        "id": m.id, "title": m.title, "description": m.description, "order": m.order,
+        "lessons": [{"id": l.id, "title": l.title, "lesson_type": l.lesson_type,
+                     "duration_min": l.duration_min, "description": l.description,
+                     "video_url": l.video_url, "is_preview": l.is_preview} for l in cur.lessons.get(m.id, [])],
+        "quizzes": [{**quiz_dict(q), "questions": [question_dict(qu) for qu in cur.questions.get(q.id, [])]}
+                    for q in cur.quizzes.get(m.id, [])],
+    } for m in cur.modules]
+    loose = cur.loose_lessons
     quizzes = db.query(Quiz).filter(Quiz.course_id == c.id).all()
-    students = db.query(Enrollment).filter(Enrollment.course_id == c.id).count()
-    total_lessons = db.query(Lesson).filter(Lesson.course_id == c.id).count()
+    stats = course_aggregates(db, [c.id])[c.id]
+    students, total_lessons = stats["students"], stats["lesson_count"]
     return {
         "id": c.id, "title": c.title, "subtitle": c.subtitle, "description": c.description,
         "category": c.category, "language": c.language, "level": c.level, "flag_emoji": c.flag_emoji,
@@ -176,7 +183,7 @@ def create_course(body: dict, db: Session = Depends(get_db), current_user: User
         price=body.get("price", 49.99),
         status="published",
     )
-    db.add(course); db.commit(); db.refresh(course)
+    db.add(course); bump_catalog(db); db.commit(); db.refresh(course)
     return {"id": course.id, "title": course.title}
 
 @router.patch("/courses/{course_id}/status")
@@ -193,6 +200,8 @@ def update_course_status(course_id: int, body: dict, db: Session = Depends(get_d
     except ValueError:
         raise HTTPException(status_code=400, detail=f"Invalid status: {new_status}")
     if admin_notes: course.admin_notes = admin_notes
+    # Publishing or unpublishing changes the catalog
+    bump_catalog(db)
 
     instructor = db.query(User).filter(User.id == course.instructor_id).first()
 
@@ -232,15 +241,17 @@ def revenue_report(db: Session = Depends(get_db), _=Depends(guard)):
     }
 
 @router.get("/payouts")
-def list_payouts(status: Optional[str] = None, db: Session = Depends(get_db), _=Depends(guard)):
-    q = db.query(Payout)
+def list_payouts(response: Response, status: Optional[str] = None, instructor_id: Optional[int] = None,
+                 sort: Optional[str] = None, cursor: Optional[str] = None, limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+                 db: Session = Depends(get_db), _=Depends(guard)):
+    q = db.query(Payout, User.name, User.avatar_initials).outerjoin(User, User.id == Payout.instructor_id)
     if status: q = q.filter(Payout.status == status)
-    payouts = q.order_by(Payout.requested_at.desc()).all()
-    result = []
-    for p in payouts:
-        ins = db.query(User).filter(User.id == p.instructor_id).first()
-        result.append({"id": p.id, "reference": p.reference, "instructor": ins.name if ins else "", "avatar_initials": ins.avatar_initials if ins else "", "amount": p.amount, "status": p.status, "requested_at": p.requested_at, "paid_at": p.paid_at})
-    return result
+    if instructor_id: q = q.filter(Payout.instructor_id == instructor_id)
+    page = paginate(db, q, sorts={"requested_at": Payout.requested_at, "amount": Payout.amount}, id_col=Payout.id,
+                    table="payouts", filtered=bool(status or instructor_id), limit=limit, sort=sort, cursor=cursor)
+    set_page_headers(response, page)
+    return [{"id": p.id, "reference": p.reference, "instructor": name or "", "avatar_initials": initials or "", "amount": p.amount, "status": p.status, "requested_at": p.requested_at, "paid_at": p.paid_at}
+            for p, name, initials in page.rows]
 
 @router.patch("/payouts/{payout_id}/status")
 def update_payout(payout_id: int, body: dict, db: Session = Depends(get_db), _=Depends(guard)):
@@ -263,9 +274,7 @@ def update_payout(payout_id: int, body: dict, db: Session = Depends(get_db), _=D
 
 @router.get("/pulse")
 def pulse_engine(db: Session = Depends(get_db), _=Depends(guard)):
-    dist = {}
-    for state in ["thriving","coasting","struggling","burning_out","disengaged"]:
-        dist[state] = db.query(User).filter(User.pulse_state == state).count()
+    dist = platform_distribution(db)
     at_risk = db.query(User).filter(User.pulse_state.in_(["burning_out","disengaged"])).order_by(User.last_active).limit(10).all()
     return {
         "distribution": dist,
@@ -276,7 +285,7 @@ def pulse_engine(db: Session = Depends(get_db), _=Depends(guard)):
 
 
 @router.post("/pulse/predict")
-def pulse_predict(body: dict, _=Depends(guard)):
+def pulse_predict(body: dict, explain: bool = False, _=Depends(guard)):
     """
     Predict PULSE state for a single learner.
     Pass raw feature values — categoricals as strings, numerics as numbers.
@@ -287,6 +296,7 @@ def pulse_predict(body: dict, _=Depends(guard)):
       engagement_score, performance_score, decline_index, consistency_score
     Optional categorical fields (defaults to 'Unknown' if omitted):
       gender, highest_education, imd_band, age_band, disability
+    explain=true adds the top contributing features as "factors".
     """
     if not pulse_predictor.is_ready:
         raise HTTPException(
@@ -294,16 +304,63 @@ def pulse_predict(body: dict, _=Depends(guard)):
             detail="PULSE model not trained yet. Run PULSE/colab_train_pulse.py on Colab, "
                    "then unzip pulse_artifacts.zip into PULSE/pulse_artifacts/."
         )
-    return pulse_predictor.predict_one(body)
+    return pulse_predictor.predict_one(body, explain=explain)
+
+
+@router.get("/pulse/explain/{user_id}")
+def pulse_explain(user_id: int, db: Session = Depends(get_db), _=Depends(guard)):
+    """Top features behind a student's PULSE state, from the last scoring run when still current."""
+    if not pulse_predictor.is_ready:
+        raise HTTPException(
+            status_code=503,
+            detail="PULSE model not trained yet. Run PULSE/colab_train_pulse.py on Colab, "
+                   "then unzip pulse_artifacts.zip into PULSE/pulse_artifacts/."
+        )
+    user = db.get(User, user_id)
+    explanation = explanation_for(db, user) if user else None
+    if explanation is None: raise HTTPException(status_code=404, detail="Student not found")
+    return explanation
+
+
+@router.get("/pulse/trends")
+def pulse_trend_chart(days: int = Query(30, ge=1, le=365), db: Session = Depends(get_db), _=Depends(guard)):
+    """Daily state distribution and state transitions from the rollup tables."""
+    return pulse_trends(db, days)
+
+@router.get("/pulse/history/{user_id}")
+def pulse_history(user_id: int, limit: int = Query(50, ge=1, le=500), db: Session = Depends(get_db), _=Depends(guard)):
+    """A student's PULSE states, newest first."""
+    return pulse_user_history(db, user_id, limit)
 
 
-@router.post("/pulse/run")
-def pulse_run(db: Session = Depends(get_db), _=Depends(guard)):
+@router.get("/pulse/cache")
+def pulse_cache(_=Depends(guard)):
+    """Hit/miss counters of the /pulse/predict cache."""
+    return {**pulse_predictor.cache.stats(), "model_version": pulse_predictor.model_version}
+
+
+@router.post("/pulse/reload")
+def pulse_reload(_=Depends(guard)):
+    """Re-read the PULSE artifacts from disk; cached predictions are dropped."""
+    if not pulse_predictor.is_ready:
+        raise HTTPException(
+            status_code=503,
+            detail="PULSE model not trained yet. Run PULSE/colab_train_pulse.py on Colab, "
+                   "then unzip pulse_artifacts.zip into PULSE/pulse_artifacts/."
+        )
+    pulse_predictor.reload()
+    pulse_pool.reload()
+    return {"ok": True, "layout": pulse_predictor.layout, "model_version": pulse_predictor.model_version,
+            "load_seconds": pulse_predictor.load_seconds}
+
+
+@router.post("/pulse/run", status_code=202)
+def pulse_run(full: bool = False, db: Session = Depends(get_db), current_user: User = Depends(guard)):
     """
-    Re-score ALL students in the DB using the trained PULSE model.
-    Builds each student's feature vector from live DB data, runs batch
-    inference, and updates user.pulse_state in-place.
-    Returns a summary of how many students moved to each state.
+    Queue a PULSE scoring job and return its id immediately; poll
+    GET /pulse/jobs/{id} for progress. By default only students whose
+    features changed since their last score are rescored; full=true
+    rescores everyone.
     """
     if not pulse_predictor.is_ready:
         raise HTTPException(
@@ -311,58 +368,26 @@ def pulse_run(db: Session = Depends(get_db), _=Depends(guard)):
             detail="PULSE model not trained yet. Run PULSE/colab_train_pulse.py on Colab, "
                    "then unzip pulse_artifacts.zip into PULSE/pulse_artifacts/."
         )
+    job = pulse_worker.enqueue(db, kind="full" if full else "incremental", requested_by=current_user.id)
+    return {"job_id": job.id, "status": job.status}
 
-    students = db.query(User).filter(User.role == RoleEnum.student).all()
-    if not students:
-        return {"updated": 0, "distribution": {}}
-
-    rows, user_ids = [], []
-    for u in students:
-        enrollments  = db.query(Enrollment).filter(Enrollment.student_id == u.id).all()
-        num_courses  = len(enrollments)
-        avg_comp     = sum(e.completion_pct for e in enrollments) / num_courses if num_courses else 0
-        # Map DB fields → PULSE feature names
-        rows.append({
-            "num_of_prev_attempts"        : num_courses,
-            "studied_credits"             : num_courses * 60,
-            "total_clicks"                : (u.xp or 0) * 10,
-            "active_days"                 : min((u.xp or 0), 200),
-            "avg_clicks_per_day"          : ((u.xp or 0) * 10) / max(min((u.xp or 0), 200), 1),
-            "avg_score"                   : avg_comp,
-            "num_assessments"             : num_courses * 2,
-            "days_to_first_submit"        : 7 if num_courses > 0 else 999,
-            "days_registered_before_start": 0,
-            "withdrew_early"              : 0,
-            "engagement_score"            : min((u.xp or 0) / 1000, 1.0),
-            "performance_score"           : avg_comp / 100,
-            "decline_index"               : max(0, 1 - min((u.xp or 0) / 500, 1.0)) * 0.5,
-            "consistency_score"           : min((u.xp or 0) / 500, 1.0),
-            "gender"                      : "Unknown",
-            "highest_education"           : "Unknown",
-            "imd_band"                    : "Unknown",
-            "age_band"                    : "Unknown",
-            "disability"                  : "Unknown",
-        })
-        user_ids.append(u.id)
-
-    predictions = pulse_predictor.predict_batch(rows)
-
-    distribution = {}
-    for user_id, pred in zip(user_ids, predictions):
-        new_state = pred["state_label"]
-        distribution[new_state] = distribution.get(new_state, 0) + 1
-        db.query(User).filter(User.id == user_id).update({"pulse_state": new_state})
+@router.get("/pulse/jobs")
+def pulse_jobs(limit: int = Query(20, ge=1, le=100), db: Session = Depends(get_db), _=Depends(guard)):
+    return [job_dict(j) for j in db.query(PulseJob).order_by(PulseJob.id.desc()).limit(limit)]
 
-    db.commit()
-    return {"updated": len(user_ids), "distribution": distribution}
+@router.get("/pulse/jobs/{job_id}")
+def pulse_job(job_id: int, db: Session = Depends(get_db), _=Depends(guard)):
+    job = db.get(PulseJob, job_id)
+    if not job: raise HTTPException(status_code=404, detail="Job not found")
+    return job_dict(job)
 
-def _notifs_for_user(db: Session, user_id: int, role: str):
-    """Return notifications targeted at this specific user, their role, or 'all'."""
+def _notifs_for_user(db: Session, user: User):
+    """Return notifications addressed to this specific user, their role, or 'all'."""
     return (
         db.query(Notification)
         .filter(
             Notification.notif_type == "notification",
-            Notification.target.in_([str(user_id), role, "admins", "all"])
+            Notification.id.in_(visible_to(user))
         )
         .order_by(Notification.sent_at.desc())
         .limit(100)
@@ -372,30 +397,38 @@ def _notifs_for_user(db: Session, user_id: int, role: str):
 # Notifications = system-generated event alerts (notif_type='notification')
 @router.get("/notifications")
 def list_notifications(db: Session = Depends(get_db), current_user: User = Depends(guard)):
-    notifs = _notifs_for_user(db, current_user.id, str(current_user.role.value if hasattr(current_user.role, 'value') else current_user.role))
+    notifs = _notifs_for_user(db, current_user)
     read_ids = {r.notification_id for r in db.query(NotificationRead).filter(NotificationRead.user_id == current_user.id).all()}
     return [{"id": n.id, "title": n.title, "message": n.message, "link": n.link, "sent_at": n.sent_at, "is_read": n.id in read_ids} for n in notifs]
 
 @router.get("/notifications/unread-count")
 def notifications_unread_count(db: Session = Depends(get_db), current_user: User = Depends(guard)):
-    notifs = _notifs_for_user(db, current_user.id, str(current_user.role.value if hasattr(current_user.role, 'value') else current_user.role))
-    notif_ids = [n.id for n in notifs]
-    read = db.query(NotificationRead).filter(
-        NotificationRead.user_id == current_user.id,
-        NotificationRead.notification_id.in_(notif_ids)
-    ).count()
-    return {"count": max(0, len(notif_ids) - read)}
+    return {"count": unread_count(db, current_user)}
 
 @router.post("/notifications/mark-read")
 def mark_notifications_read(db: Session = Depends(get_db), current_user: User = Depends(guard)):
-    notifs = _notifs_for_user(db, current_user.id, str(current_user.role.value if hasattr(current_user.role, 'value') else current_user.role))
-    existing = {r.notification_id for r in db.query(NotificationRead).filter(NotificationRead.user_id == current_user.id).all()}
-    for n in notifs:
-        if n.id not in existing:
-            db.add(NotificationRead(user_id=current_user.id, notification_id=n.id))
+    # Everything visible, not just the latest 100, so the counter reaches zero
+    notif_ids = [nid for (nid,) in db.query(Notification.id).filter(
+        Notification.notif_type == "notification", Notification.id.in_(visible_to(current_user)))]
+    mark_read(db, current_user, notif_ids)
     db.commit()
     return {"ok": True}
 
+@router.post("/course-stats/rebuild")
+def rebuild_course_statistics(db: Session = Depends(get_db), _=Depends(guard)):
+    """Recompute every course_stats row from enrollments, payments, reviews, lessons and modules."""
+    courses = rebuild_course_stats(db)
+    bump_catalog(db)
+    db.commit()
+    return {"ok": True, "courses": courses}
+
+@router.post("/notifications/reconcile-counters")
+def reconcile_unread_counters(db: Session = Depends(get_db), _=Depends(guard)):
+    """Drop every materialized unread counter; each is rebuilt from scratch on the user's next read."""
+    reset = reset_unread_counters(db)
+    db.commit()
+    return {"ok": True, "reset": reset}
+
 # Announcements = human-composed broadcasts (notif_type='announcement')
 @router.get("/announcements")
 def list_announcements(db: Session = Depends(get_db), current_user: User = Depends(guard)):
@@ -412,7 +445,10 @@ def send_announcement(body: dict, db: Session = Depends(get_db), current_user: U
     n = Notification(title=body["title"], message=body["message"], target=target, recipients=recipients,
                      sender_id=current_user.id, allow_replies=body.get("allow_replies", False),
                      notif_type="announcement")
-    db.add(n); db.commit(); db.refresh(n)
+    db.add(n)
+    bump_unread(db, n)
+    push_after_commit(db, target, "announcement", n)
+    db.commit(); db.refresh(n)
     return {"ok": True, "id": n.id}
 
 @router.post("/notifications")
@@ -427,7 +463,10 @@ def update_notification(notif_id: int, body: dict, db: Session = Depends(get_db)
     if not n: raise HTTPException(status_code=404, detail="Not found")
     if "title" in body: n.title = body["title"]
     if "message" in body: n.message = body["message"]
-    if "target" in body: n.target = body["target"]
+    if "target" in body and body["target"] != n.target:
+        retract_unread(db, n)
+        n.target = body["target"]
+        bump_unread(db, n)
     db.commit()
     return {"ok": True}
 
@@ -435,7 +474,9 @@ def update_notification(notif_id: int, body: dict, db: Session = Depends(get_db)
 def delete_notification(notif_id: int, db: Session = Depends(get_db), _=Depends(guard)):
     from app.models import Notification
     n = db.query(Notification).filter(Notification.id == notif_id).first()
-    if n: db.delete(n); db.commit()
+    if n:
+        retract_unread(db, n)
+        db.delete(n); db.commit()
     return {"ok": True}
 
 @router.get("/activity")
@@ -488,14 +529,43 @@ def platform_activity(limit: int = 50, db: Session = Depends(get_db), _=Depends(
     return events[:limit]
 
 @router.get("/audit-log")
-def audit_log(db: Session = Depends(get_db), _=Depends(guard)):
+def audit_log(response: Response, action_type: Optional[str] = None, admin_id: Optional[int] = None,
+              since: Optional[datetime] = None, until: Optional[datetime] = None,
+              sort: Optional[str] = None, cursor: Optional[str] = None, limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+              db: Session = Depends(get_db), _=Depends(guard)):
     from app.models import AuditLog
-    logs = db.query(AuditLog).order_by(AuditLog.created_at.desc()).limit(100).all()
-    result = []
-    for l in logs:
-        admin = db.query(User).filter(User.id == l.admin_id).first()
-        result.append({"id": l.id, "admin": admin.name if admin else "System", "action_type": l.action_type, "description": l.description, "created_at": l.created_at})
-    return result
+    q = db.query(AuditLog, User.name).outerjoin(User, User.id == AuditLog.admin_id)
+    if action_type: q = q.filter(AuditLog.action_type == action_type)
+    if admin_id: q = q.filter(AuditLog.admin_id == admin_id)
+    if since: q = q.filter(AuditLog.created_at >= since)
+    if until: q = q.filter(AuditLog.created_at < until)
+    page = paginate(db, q, sorts={"created_at": AuditLog.created_at}, id_col=AuditLog.id,
+                    table="audit_logs", filtered=bool(action_type or admin_id or since or until), limit=limit, sort=sort, cursor=cursor)
+    set_page_headers(response, page)
+    return [{"id": l.id, "admin": admin_name or "System", "action_type": l.action_type, "description": l.description, "created_at": l.created_at}
+            for l, admin_name in page.rows]
+
+@router.get("/export/{entity}")
+def export_table(entity: str, fmt: str = Query("csv", alias="format"), columns: Optional[str] = None, gzip: bool = False,
+                 since: Optional[datetime] = None, until: Optional[datetime] = None,
+                 db: Session = Depends(get_db), current_user: User = Depends(guard)):
+    """Stream a whole table as CSV or NDJSON. columns: comma-separated subset, in output order."""
+    spec = EXPORT_ENTITIES.get(entity)
+    if not spec:
+        raise HTTPException(status_code=404, detail=f"Unknown export: {entity} (one of {', '.join(EXPORT_ENTITIES)})")
+    if fmt not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format: {fmt} (one of {', '.join(EXPORT_FORMATS)})")
+    names = [c.strip() for c in columns.split(",") if c.strip()] if columns else list(spec.columns)
+    unknown = [n for n in names if n not in spec.columns]
+    if unknown or not names:
+        raise HTTPException(status_code=400, detail=f"Unknown columns: {', '.join(unknown) or '(none given)'} (available: {', '.join(spec.columns)})")
+    from app.models import AuditLog
+    db.add(AuditLog(admin_id=current_user.id, action_type="EXPORT", description=f"Exported {entity} as {fmt}: {', '.join(names)}"))
+    db.commit()
+    filename = f"{entity}-{datetime.utcnow():%Y%m%d-%H%M%S}.{fmt}" + (".gz" if gzip else "")
+    return StreamingResponse(export_stream(spec, names, fmt, gzip, since, until),
+                             media_type="application/gzip" if gzip else EXPORT_FORMATS[fmt],
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
 
 @router.get("/reports")
 def list_reports(status: Optional[str] = None, db: Session = Depends(get_db), _=Depends(guard)):
@@ -573,16 +643,26 @@ def geo_data(db: Session = Depends(get_db), _=Depends(guard)):
     return {"countries": countries, "languages": languages}
 
 @router.get("/payments")
-def list_payments(status: Optional[str] = None, search: Optional[str] = None, db: Session = Depends(get_db), _=Depends(guard)):
-    q = db.query(Payment)
+def list_payments(response: Response, status: Optional[str] = None, search: Optional[str] = None, method: Optional[str] = None,
+                  user_id: Optional[int] = None, course_id: Optional[int] = None,
+                  since: Optional[datetime] = None, until: Optional[datetime] = None,
+                  sort: Optional[str] = None, cursor: Optional[str] = None, limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+                  db: Session = Depends(get_db), _=Depends(guard)):
+    q = (db.query(Payment, User.name, Course.title)
+         .outerjoin(User, User.id == Payment.user_id)
+         .outerjoin(Course, Course.id == Payment.course_id))
     if status: q = q.filter(Payment.status == status)
-    payments = q.order_by(Payment.created_at.desc()).limit(100).all()
-    result = []
-    for p in payments:
-        user = db.query(User).filter(User.id == p.user_id).first()
-        course = db.query(Course).filter(Course.id == p.course_id).first()
-        result.append({"id": p.id, "user": user.name if user else "", "course": course.title if course else "", "amount": p.amount, "method": p.method, "status": p.status, "created_at": p.created_at})
-    return result
+    if method: q = q.filter(Payment.method == method)
+    if user_id: q = q.filter(Payment.user_id == user_id)
+    if course_id: q = q.filter(Payment.course_id == course_id)
+    if since: q = q.filter(Payment.created_at >= since)
+    if until: q = q.filter(Payment.created_at < until)
+    if search: q = q.filter((User.name.ilike(f"%{search}%")) | (Course.title.ilike(f"%{search}%")))
+    page = paginate(db, q, sorts={"created_at": Payment.created_at, "amount": Payment.amount}, id_col=Payment.id, table="payments",
+                    filtered=bool(status or method or user_id or course_id or since or until or search), limit=limit, sort=sort, cursor=cursor)
+    set_page_headers(response, page)
+    return [{"id": p.id, "user": user_name or "", "course": course_title or "", "amount": p.amount, "method": p.method, "status": p.status, "created_at": p.created_at}
+            for p, user_name, course_title in page.rows]
 
 @router.get("/admins")
 def list_admins(db: Session = Depends(get_db), _=Depends(guard)):
@@ -623,8 +703,9 @@ def delete_admin(user_id: int, db: Session = Depends(get_db), current_user: User
     if not user:
         from fastapi import HTTPException
         raise HTTPException(status_code=404, detail="Admin not found")
+    from app.models import AuditLog, PulseJob
+    db.query(PulseJob).filter(PulseJob.requested_by == user_id).update({"requested_by": None})
     db.delete(user); db.commit()
-    from app.models import AuditLog
     db.add(AuditLog(admin_id=current_user.id, action_type="USER", description=f"Super admin removed admin account: {user.email}"))
     db.commit()
     return {"ok": True}
@@ -633,9 +714,9 @@ def delete_admin(user_id: int, db: Session = Depends(get_db), current_user: User
 def delete_user(user_id: int, db: Session = Depends(get_db), current_user: User = Depends(guard)):
     from app.models import (
         Payment, Payout, Enrollment, AuditLog, Report, Message, Review,
-        MonthlyRevenue, NotificationRead, NotificationReaction, NotificationReply,
+        MonthlyRevenue, NotificationRead, NotificationReaction, NotificationReply, NotificationAudience,
         ConsentRecord, DataSubjectRequest, PulseStateFeedback, MeetingInvite,
-        QuizAttempt, ContentVersion, CourseDraft, EthicsChangeLog,
+        QuizAttempt, ContentVersion, CourseDraft, EthicsChangeLog, PulseStateHistory, PulseExplanation, PulseJob,
     )
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
@@ -651,10 +732,16 @@ def delete_user(user_id: int, db: Session = Depends(get_db), current_user: User
         ).delete(synchronize_session=False)
         db.query(PulseStateFeedback).filter(PulseStateFeedback.user_id == user_id).delete()
         db.query(EthicsChangeLog).filter(EthicsChangeLog.created_by == user_id).update({"created_by": None})
+        # PULSE
+        db.query(PulseStateHistory).filter(PulseStateHistory.user_id == user_id).delete()
+        db.query(PulseExplanation).filter(PulseExplanation.user_id == user_id).delete()
+        db.query(PulseJob).filter(PulseJob.requested_by == user_id).update({"requested_by": None})
         # Notifications
         db.query(NotificationRead).filter(NotificationRead.user_id == user_id).delete()
+        refresh_unread(db, user_id)
         db.query(NotificationReaction).filter(NotificationReaction.user_id == user_id).delete()
         db.query(NotificationReply).filter(NotificationReply.user_id == user_id).delete()
+        db.query(NotificationAudience).filter(NotificationAudience.user_id == user_id).delete()
         db.query(Notification).filter(Notification.sender_id == user_id).update({"sender_id": None})
         # Meetings
         db.query(MeetingInvite).filter(MeetingInvite.user_id == user_id).delete()
@@ -664,6 +751,9 @@ def delete_user(user_id: int, db: Session = Depends(get_db), current_user: User
         db.query(ContentVersion).filter(ContentVersion.created_by == user_id).update({"created_by": None})
         db.query(CourseDraft).filter(CourseDraft.instructor_id == user_id).delete()
         # Core relations
+        refresh_course_stats(db, {cid for (cid,) in db.query(Enrollment.course_id).filter(Enrollment.student_id == user_id)}
+                                 | {cid for (cid,) in db.query(Payment.course_id).filter(Payment.user_id == user_id)}
+                                 | {cid for (cid,) in db.query(Review.course_id).filter(Review.student_id == user_id)})
         db.query(Enrollment).filter(Enrollment.student_id == user_id).delete()
         db.query(Payment).filter(Payment.user_id == user_id).delete()
         db.query(Payout).filter(Payout.instructor_id == user_id).delete()
@@ -675,7 +765,9 @@ def delete_user(user_id: int, db: Session = Depends(get_db), current_user: User
         db.query(MonthlyRevenue).filter(MonthlyRevenue.instructor_id == user_id).delete()
         db.query(AuditLog).filter(AuditLog.admin_id == user_id).delete()
         # Nullify instructor_id on courses rather than deleting them
+        refresh_instructor_documents(db, user_id)
         db.query(Course).filter(Course.instructor_id == user_id).update({"instructor_id": None})
+        bump_catalog(db)
         db.delete(user)
         db.commit()
         db.add(AuditLog(admin_id=current_user.id, action_type="USER", description=f"Admin deleted user: {email}"))
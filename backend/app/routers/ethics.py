@@ -10,6 +10,7 @@ from app.models import (
     ProcessingActivityLog, EthicsChangeLog, PulseStateFeedback, PulseStateEnum,
 )
 from app.auth import get_current_user, require_role
+from app.pulse_distribution import feedback_distribution, invalidate as invalidate_pulse_distribution
 from pydantic import BaseModel
 from typing import Optional
 import os
@@ -446,6 +447,7 @@ def submit_pulse_feedback(body: PulseFeedbackIn, db: Session = Depends(get_db),
     )
     db.add(fb)
     db.commit()
+    invalidate_pulse_distribution("feedback")
     return {"ok": True, "id": fb.id}
 
 @router.get("/pulse-feedback/me")
@@ -458,11 +460,8 @@ def my_pulse_feedback(db: Session = Depends(get_db), current_user: User = Depend
 
 @router.get("/pulse-feedback")
 def all_pulse_feedback(db: Session = Depends(get_db), current_user: User = Depends(guard_admin)):
-    total = db.query(PulseStateFeedback).count()
-    by_state = {}
-    for state in PulseStateEnum:
-        by_state[state.value] = db.query(PulseStateFeedback).filter(
-            PulseStateFeedback.current_state == state).count()
+    by_state = feedback_distribution(db)
+    total = sum(by_state.values())
     recent = db.query(PulseStateFeedback).order_by(PulseStateFeedback.created_at.desc()).limit(50).all()
     return {
         "total": total,
@@ -1,11 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, select
 from datetime import datetime
 import os, uuid
-from app.models import get_db, User, Course, Module, Enrollment, Payment, Payout, LiveSession, Quiz, Lesson, Message, Review, MonthlyRevenue, Notification, NotificationRead, RoleEnum, CourseStatusEnum, ModuleQuiz, QuizQuestion, QuizAttempt, QuizPositionEnum, ContentVersion, CourseDraft
+from app.models import get_db, User, Course, Module, Enrollment, Payment, Payout, LiveSession, Quiz, Lesson, Message, Review, MonthlyRevenue, Notification, NotificationRead, NotificationAudience, RoleEnum, CourseStatusEnum, ModuleQuiz, QuizQuestion, QuizAttempt, QuizPositionEnum, ContentVersion, CourseDraft
 from app.auth import require_role, get_current_user
-from app.notify import notify
+from app.notify import notify, notify_many
+from app.realtime import push_after_commit
+from app.messaging import list_threads, conversation_page, mark_delivered_read
+from app.aggregates import course_aggregates, aggregate_totals, bump_course_stats
+from app.curriculum import load_curriculum, editor_modules, editor_lesson_dict
+from app.catalog import bump_catalog
+from app.search import refresh_course_documents, refresh_instructor_documents
+from app.notification_state import unread_count, mark_read, bump_unread
+from app.audiences import visible_to
+from app.pulse_predictor import predictor as pulse_predictor
+from app.pulse_explain import explanation_for
+from app.pulse_distribution import instructor_distribution
 from typing import Optional
 import json
 from datetime import timedelta
@@ -17,26 +28,19 @@ guard = require_role(RoleEnum.instructor)
 def dashboard(db: Session = Depends(get_db), current_user: User = Depends(guard)):
     courses = db.query(Course).filter(Course.instructor_id == current_user.id).all()
     course_ids = [c.id for c in courses]
-    total_students = db.query(Enrollment).filter(Enrollment.course_id.in_(course_ids)).count() if course_ids else 0
-    revenue_gross = db.query(func.sum(Payment.amount)).filter(Payment.course_id.in_(course_ids), Payment.status == "completed").scalar() or 0
-    avg_rating = db.query(func.avg(Review.rating)).filter(Review.course_id.in_(course_ids)).scalar() or 0
-    avg_completion = db.query(func.avg(Enrollment.completion_pct)).filter(Enrollment.course_id.in_(course_ids)).scalar() or 0
+    stats = course_aggregates(db, course_ids)
+    totals = aggregate_totals(stats)
     monthly = db.query(MonthlyRevenue).filter(MonthlyRevenue.instructor_id == current_user.id).order_by(MonthlyRevenue.year, MonthlyRevenue.month).all()
-    sessions = db.query(LiveSession).filter(LiveSession.course_id.in_(course_ids)).order_by(LiveSession.scheduled_at.desc()).limit(5).all()
+    sessions = db.query(LiveSession).filter(LiveSession.course_id.in_(course_ids)).order_by(LiveSession.scheduled_at.desc()).limit(5).all() if course_ids else []
     course_data = []
     for c in courses:
-        students = db.query(Enrollment).filter(Enrollment.course_id == c.id).count()
-        rev = db.query(func.sum(Payment.amount)).filter(Payment.course_id == c.id, Payment.status == "completed").scalar() or 0
-        avg_comp = db.query(func.avg(Enrollment.completion_pct)).filter(Enrollment.course_id == c.id).scalar() or 0
-        avg_rat = db.query(func.avg(Review.rating)).filter(Review.course_id == c.id).scalar() or 0
-        lesson_count = db.query(Lesson).filter(Lesson.course_id == c.id).count()
-        module_count = db.query(Module).filter(Module.course_id == c.id).count()
-        course_data.append({"id": c.id, "title": c.title, "language": c.language, "level": c.level, "flag_emoji": c.flag_emoji, "status": c.status, "students": students, "revenue": round(rev * 0.7, 2), "completion": round(avg_comp, 1), "rating": round(avg_rat, 1), "lesson_count": lesson_count, "module_count": module_count})
+        st = stats[c.id]
+        course_data.append({"id": c.id, "title": c.title, "language": c.language, "level": c.level, "flag_emoji": c.flag_emoji, "status": c.status, "students": st["students"], "revenue": round(st["revenue"] * 0.7, 2), "completion": round(st["avg_completion"], 1), "rating": round(st["avg_rating"], 1), "lesson_count": st["lesson_count"], "module_count": st["module_count"]})
     return {
-        "total_students": total_students,
-        "revenue_mtd": round(revenue_gross * 0.7, 2),
-        "avg_rating": round(avg_rating, 1),
-        "avg_completion": round(avg_completion, 1),
+        "total_students": totals["students"],
+        "revenue_mtd": round(totals["revenue"] * 0.7, 2),
+        "avg_rating": round(totals["avg_rating"], 1),
+        "avg_completion": round(totals["avg_completion"], 1),
         "monthly_revenue": [{"month": r.month, "year": r.year, "gross": r.gross, "net": r.net} for r in monthly],
         "courses": course_data,
         "sessions": [{"id": s.id, "title": s.title, "scheduled_at": s.scheduled_at, "attendees": s.attendees, "status": s.status} for s in sessions]
@@ -45,12 +49,10 @@ def dashboard(db: Session = Depends(get_db), current_user: User = Depends(guard)
 @router.get("/courses")
 def my_courses(db: Session = Depends(get_db), current_user: User = Depends(guard)):
     courses = db.query(Course).filter(Course.instructor_id == current_user.id).order_by(Course.updated_at.desc()).all()
+    stats = course_aggregates(db, [c.id for c in courses])
     result = []
     for c in courses:
-        students = db.query(Enrollment).filter(Enrollment.course_id == c.id).count()
-        rev = db.query(func.sum(Payment.amount)).filter(Payment.course_id == c.id, Payment.status == "completed").scalar() or 0
-        lesson_count = db.query(Lesson).filter(Lesson.course_id == c.id).count()
-        module_count = db.query(Module).filter(Module.course_id == c.id).count()
+        st = stats[c.id]
         result.append({
             "id": c.id, "title": c.title, "subtitle": c.subtitle, "description": c.description,
             "category": c.category, "language": c.language, "level": c.level, "flag_emoji": c.flag_emoji,
@@ -58,7 +60,7 @@ def my_courses(db: Session = Depends(get_db), current_user: User = Depends(guard
             "status": c.status, "price": c.price, "is_free": c.is_free,
             "what_you_learn": c.what_you_learn, "requirements": c.requirements, "target_audience": c.target_audience,
             "rejection_feedback": c.rejection_feedback, "admin_notes": c.admin_notes,
-            "students": students, "revenue": round(rev * 0.7, 2), "lesson_count": lesson_count, "module_count": module_count,
+            "students": st["students"], "revenue": round(st["revenue"] * 0.7, 2), "lesson_count": st["lesson_count"], "module_count": st["module_count"],
             "submitted_at": c.submitted_at, "approved_at": c.approved_at, "published_at": c.published_at,
             "created_at": c.created_at, "updated_at": c.updated_at,
         })
@@ -68,32 +70,7 @@ def my_courses(db: Session = Depends(get_db), current_user: User = Depends(guard
 def get_course(course_id: int, db: Session = Depends(get_db), current_user: User = Depends(guard)):
     c = db.query(Course).filter(Course.id == course_id, Course.instructor_id == current_user.id).first()
     if not c: raise HTTPException(status_code=404, detail="Not found")
-    modules = db.query(Module).filter(Module.course_id == c.id).order_by(Module.order).all()
-    module_data = []
-    for m in modules:
-        lessons = db.query(Lesson).filter(Lesson.module_id == m.id).order_by(Lesson.order).all()
-        quizzes = db.query(ModuleQuiz).filter(ModuleQuiz.module_id == m.id).order_by(ModuleQuiz.order).all()
-        quiz_data = []
-        for q in quizzes:
-            questions = db.query(QuizQuestion).filter(QuizQuestion.quiz_id == q.id).order_by(QuizQuestion.order).all()
-            quiz_data.append({
-                "id": q.id, "title": q.title, "position": q.position, "passing_score": q.passing_score,
-                "time_limit_min": q.time_limit_min, "is_required": q.is_required, "order": q.order,
-                "questions": [{
-                    "id": qu.id, "question_text": qu.question_text, "question_type": qu.question_type,
-                    "options": qu.options, "correct_answer": qu.correct_answer, "explanation": qu.explanation,
-                    "points": qu.points, "order": qu.order
-                } for qu in questions]
-            })
-        module_data.append({
-            "id": m.id, "title": m.title, "description": m.description, "order": m.order,
-            "lessons": [{"id": l.id, "title": l.title, "lesson_type": l.lesson_type, "duration_min": l.duration_min,
-                         "video_url": l.video_url, "content": l.content, "resource_url": l.resource_url,
-                         "description": l.description, "order": l.order, "is_preview": l.is_preview} for l in lessons],
-            "quizzes": quiz_data
-        })
-    # Lessons not in any module
-    loose = db.query(Lesson).filter(Lesson.course_id == c.id, Lesson.module_id == None).order_by(Lesson.order).all()
+    cur = load_curriculum(db, c.id)
     return {
         "id": c.id, "title": c.title, "subtitle": c.subtitle, "description": c.description,
         "category": c.category, "language": c.language, "level": c.level, "flag_emoji": c.flag_emoji,
@@ -101,10 +78,9 @@ def get_course(course_id: int, db: Session = Depends(get_db), current_user: User
         "status": c.status, "price": c.price, "is_free": c.is_free,
         "what_you_learn": c.what_you_learn, "requirements": c.requirements, "target_audience": c.target_audience,
         "rejection_feedback": c.rejection_feedback, "admin_notes": c.admin_notes,
-        "modules": module_data,
-        "loose_lessons": [{"id": l.id, "title": l.title, "lesson_type": l.lesson_type, "duration_min": l.duration_min,
-                           "video_url": l.video_url, "content": l.content, "resource_url": l.resource_url,
-                           "description": l.description, "order": l.order, "is_preview": l.is_preview} for l in loose],
+        "modules": editor_modules(cur),
+        # Lessons not in any module
+        "loose_lessons": [editor_lesson_dict(l) for l in cur.loose_lessons],
         "submitted_at": c.submitted_at, "approved_at": c.approved_at, "published_at": c.published_at,
         "created_at": c.created_at, "updated_at": c.updated_at,
     }
@@ -140,6 +116,8 @@ def update_course(course_id: int, body: dict, db: Session = Depends(get_db), cur
     for k in allowed:
         if k in body: setattr(course, k, body[k])
     course.updated_at = datetime.utcnow()
+    refresh_course_documents(db, [course.id])
+    bump_catalog(db)
     db.commit()
     return {"ok": True}
 
@@ -149,7 +127,8 @@ def delete_course(course_id: int, db: Session = Depends(get_db), current_user: U
     if not course: raise HTTPException(status_code=404, detail="Not found")
     if course.status in (CourseStatusEnum.published, CourseStatusEnum.pending):
         raise HTTPException(status_code=403, detail="Cannot delete a published or pending course")
-    db.delete(course); db.commit()
+    db.query(NotificationAudience).filter(NotificationAudience.course_id == course_id).delete()
+    db.delete(course); bump_catalog(db); db.commit()
     return {"ok": True}
 
 # ── Modules ──────────────────────────────────────────────────────────────
@@ -158,31 +137,7 @@ def delete_course(course_id: int, db: Session = Depends(get_db), current_user: U
 def get_modules(course_id: int, db: Session = Depends(get_db), current_user: User = Depends(guard)):
     course = db.query(Course).filter(Course.id == course_id, Course.instructor_id == current_user.id).first()
     if not course: raise HTTPException(status_code=404, detail="Not found")
-    modules = db.query(Module).filter(Module.course_id == course_id).order_by(Module.order).all()
-    result = []
-    for m in modules:
-        lessons = db.query(Lesson).filter(Lesson.module_id == m.id).order_by(Lesson.order).all()
-        quizzes = db.query(ModuleQuiz).filter(ModuleQuiz.module_id == m.id).order_by(ModuleQuiz.order).all()
-        quiz_data = []
-        for q in quizzes:
-            questions = db.query(QuizQuestion).filter(QuizQuestion.quiz_id == q.id).order_by(QuizQuestion.order).all()
-            quiz_data.append({
-                "id": q.id, "title": q.title, "position": q.position, "passing_score": q.passing_score,
-                "time_limit_min": q.time_limit_min, "is_required": q.is_required, "order": q.order,
-                "questions": [{
-                    "id": qu.id, "question_text": qu.question_text, "question_type": qu.question_type,
-                    "options": qu.options, "correct_answer": qu.correct_answer, "explanation": qu.explanation,
-                    "points": qu.points, "order": qu.order
-                } for qu in questions]
-            })
-        result.append({
-            "id": m.id, "title": m.title, "description": m.description, "order": m.order,
-            "lessons": [{"id": l.id, "title": l.title, "lesson_type": l.lesson_type, "duration_min": l.duration_min,
-                         "video_url": l.video_url, "content": l.content, "resource_url": l.resource_url,
-                         "description": l.description, "order": l.order, "is_preview": l.is_preview} for l in lessons],
-            "quizzes": quiz_data
-        })
-    return result
+    return editor_modules(load_curriculum(db, course_id))
 
 @router.post("/courses/{course_id}/modules")
 def create_module(course_id: int, body: dict, db: Session = Depends(get_db), current_user: User = Depends(guard)):
@@ -190,7 +145,9 @@ def create_module(course_id: int, body: dict, db: Session = Depends(get_db), cur
     if not course: raise HTTPException(status_code=404, detail="Not found")
     max_order = db.query(func.max(Module.order)).filter(Module.course_id == course_id).scalar() or 0
     m = Module(course_id=course_id, title=body["title"], description=body.get("description", ""), order=max_order + 1)
-    db.add(m); db.commit(); db.refresh(m)
+    db.add(m)
+    bump_course_stats(db, course_id, module_count=1)
+    db.commit(); db.refresh(m)
     return {"id": m.id, "title": m.title, "description": m.description, "order": m.order, "lessons": [], "quizzes": []}
 
 @router.patch("/courses/{course_id}/modules/{module_id}")
@@ -206,7 +163,11 @@ def update_module(course_id: int, module_id: int, body: dict, db: Session = Depe
 @router.delete("/courses/{course_id}/modules/{module_id}")
 def delete_module(course_id: int, module_id: int, db: Session = Depends(get_db), current_user: User = Depends(guard)):
     m = db.query(Module).filter(Module.id == module_id, Module.course_id == course_id).first()
-    if m: db.delete(m); db.commit()
+    if m:
+        # Its lessons go with it (delete-orphan cascade)
+        bump_course_stats(db, course_id, module_count=-1, lesson_count=-len(m.lessons))
+        bump_catalog(db)
+        db.delete(m); db.commit()
     return {"ok": True}
 
 # ── Lessons ───────────────────────────────────────────────────────────────
@@ -234,7 +195,10 @@ def create_lesson(course_id: int, body: dict, db: Session = Depends(get_db), cur
         transcript=body.get("transcript"),
         is_downloadable=body.get("is_downloadable", False),
     )
-    db.add(lesson); db.commit(); db.refresh(lesson)
+    db.add(lesson)
+    bump_course_stats(db, course_id, lesson_count=1)
+    bump_catalog(db)
+    db.commit(); db.refresh(lesson)
     return {"id": lesson.id, "title": lesson.title, "lesson_type": lesson.lesson_type,
             "duration_min": lesson.duration_min, "order": lesson.order, "module_id": lesson.module_id}
 
@@ -250,7 +214,10 @@ def update_lesson(course_id: int, lesson_id: int, body: dict, db: Session = Depe
 @router.delete("/courses/{course_id}/lessons/{lesson_id}")
 def delete_lesson(course_id: int, lesson_id: int, db: Session = Depends(get_db), current_user: User = Depends(guard)):
     lesson = db.query(Lesson).filter(Lesson.id == lesson_id, Lesson.course_id == course_id).first()
-    if lesson: db.delete(lesson); db.commit()
+    if lesson:
+        bump_course_stats(db, course_id, lesson_count=-1)
+        bump_catalog(db)
+        db.delete(lesson); db.commit()
     return {"ok": True}
 
 # ── Module Quizzes ─────────────────────────────────────────────────────────
@@ -498,15 +465,15 @@ def publish_course(course_id: int, db: Session = Depends(get_db), current_user:
         raise HTTPException(status_code=403, detail="Course must be approved before publishing")
     course.status = CourseStatusEnum.published
     course.published_at = datetime.utcnow()
+    bump_catalog(db)
     db.commit()
     # Notify all enrolled students
-    enrolled = db.query(Enrollment).filter(Enrollment.course_id == course_id).all()
-    for e in enrolled:
-        notify(db, title="🚀 Course Now Live!",
-               message=f"'{course.title}' is now published and ready for you.",
-               target=str(e.student_id), link="/dashboard/courses", course_id=course_id)
+    notified = notify_many(db, title="🚀 Course Now Live!",
+                           message=f"'{course.title}' is now published and ready for you.",
+                           recipients=select(Enrollment.student_id).where(Enrollment.course_id == course_id),
+                           link="/dashboard/courses", course_id=course_id, push_target=f"course_{course_id}")
     db.commit()
-    return {"ok": True}
+    return {"ok": True, "notified": notified}
 
 @router.get("/live-sessions")
 def live_sessions(db: Session = Depends(get_db), current_user: User = Depends(guard)):
@@ -525,15 +492,13 @@ def create_session(body: dict, db: Session = Depends(get_db), current_user: User
     db.add(s)
     db.commit()
     # Notify enrolled students
-    course = db.query(Course).filter(Course.id == body["course_id"]).first()
-    enrolled = db.query(Enrollment).filter(Enrollment.course_id == body["course_id"]).all()
     scheduled_str = datetime.fromisoformat(body["scheduled_at"]).strftime("%b %d at %H:%M")
-    for e in enrolled:
-        notify(db, title="🎤 Live Session Scheduled",
-               message=f"{current_user.name} scheduled '{body['title']}' for {scheduled_str}.",
-               target=str(e.student_id), link="/dashboard/live-sessions", course_id=body["course_id"])
+    notified = notify_many(db, title="🎤 Live Session Scheduled",
+                           message=f"{current_user.name} scheduled '{body['title']}' for {scheduled_str}.",
+                           recipients=select(Enrollment.student_id).where(Enrollment.course_id == body["course_id"]),
+                           link="/dashboard/live-sessions", course_id=body["course_id"], push_target=f"course_{body['course_id']}")
     db.commit()
-    return {"ok": True}
+    return {"ok": True, "notified": notified}
 
 @router.get("/quizzes")
 def quizzes(db: Session = Depends(get_db), current_user: User = Depends(guard)):
@@ -559,39 +524,40 @@ def student_roster(db: Session = Depends(get_db), current_user: User = Depends(g
 
 @router.get("/pulse")
 def pulse_insights(db: Session = Depends(get_db), current_user: User = Depends(guard)):
-    course_ids = [c.id for c in db.query(Course).filter(Course.instructor_id == current_user.id).all()]
-    student_ids = [e.student_id for e in db.query(Enrollment).filter(Enrollment.course_id.in_(course_ids)).all()] if course_ids else []
-    dist = {}
-    for state in ["thriving","coasting","struggling","burning_out","disengaged"]:
-        dist[state] = db.query(User).filter(User.id.in_(student_ids), User.pulse_state == state).count() if student_ids else 0
-    return {"distribution": dist, "total": len(set(student_ids))}
+    dist = instructor_distribution(db, current_user.id)
+    return {"distribution": dist, "total": sum(dist.values())}
+
+@router.get("/pulse/explain/{student_id}")
+def pulse_explain(student_id: int, db: Session = Depends(get_db), current_user: User = Depends(guard)):
+    """Top features behind the PULSE state of a student enrolled in one of this instructor's courses."""
+    enrolled = (db.query(Enrollment.id).join(Course, Course.id == Enrollment.course_id)
+                .filter(Enrollment.student_id == student_id, Course.instructor_id == current_user.id).first())
+    student = db.get(User, student_id) if enrolled else None
+    if not student: raise HTTPException(status_code=404, detail="Student not found")
+    if not pulse_predictor.is_ready: raise HTTPException(status_code=503, detail="PULSE model not available")
+    explanation = explanation_for(db, student)
+    if explanation is None: raise HTTPException(status_code=404, detail="Student not found")
+    return explanation
 
 @router.get("/messages")
 def messages(db: Session = Depends(get_db), current_user: User = Depends(guard)):
-    conversations = db.query(Message.sender_id).filter(Message.receiver_id == current_user.id).distinct().all()
-    result = []
-    for (sid,) in conversations:
-        sender = db.query(User).filter(User.id == sid).first()
-        last_msg = db.query(Message).filter(Message.sender_id == sid, Message.receiver_id == current_user.id).order_by(Message.created_at.desc()).first()
-        unread = db.query(Message).filter(Message.sender_id == sid, Message.receiver_id == current_user.id, Message.is_read == False).count()
-        if sender:
-            result.append({"id": sender.id, "name": sender.name, "avatar_initials": sender.avatar_initials, "last_message": last_msg.content if last_msg else "", "unread": unread, "last_at": last_msg.created_at if last_msg else None})
-    return result
+    return [{"id": sender.id, "name": sender.name, "avatar_initials": sender.avatar_initials, "last_message": last.content or "", "unread": unread, "last_at": last.created_at}
+            for sender, last, unread in list_threads(db, current_user.id, inbound_only=True)]
 
 @router.get("/messages/{student_id}")
-def get_conversation(student_id: int, db: Session = Depends(get_db), current_user: User = Depends(guard)):
-    msgs = db.query(Message).filter(
-        ((Message.sender_id == current_user.id) & (Message.receiver_id == student_id)) |
-        ((Message.sender_id == student_id) & (Message.receiver_id == current_user.id))
-    ).order_by(Message.created_at).all()
-    db.query(Message).filter(Message.sender_id == student_id, Message.receiver_id == current_user.id).update({"is_read": True})
+def get_conversation(student_id: int, before_id: Optional[int] = None, after_id: Optional[int] = None, limit: int = Query(50, ge=1, le=200),
+                     db: Session = Depends(get_db), current_user: User = Depends(guard)):
+    msgs = conversation_page(db, current_user.id, student_id, before_id=before_id, after_id=after_id, limit=limit)
+    mark_delivered_read(db, current_user.id, msgs)
+    result = [{"id": m.id, "sender_id": m.sender_id, "content": m.content, "created_at": m.created_at, "is_read": m.is_read} for m in msgs]
     db.commit()
-    return [{"id": m.id, "sender_id": m.sender_id, "content": m.content, "created_at": m.created_at, "is_read": m.is_read} for m in msgs]
+    return result
 
 @router.post("/messages/{student_id}")
 def send_message(student_id: int, body: dict, db: Session = Depends(get_db), current_user: User = Depends(guard)):
     msg = Message(sender_id=current_user.id, receiver_id=student_id, content=body["content"])
     db.add(msg)
+    push_after_commit(db, str(student_id), "message", msg)
     notify(db, title="💬 New Message",
            message=f"{current_user.name} sent you a message.",
            target=str(student_id), link="/dashboard/messages")
@@ -619,14 +585,14 @@ def reply_review(review_id: int, body: dict, db: Session = Depends(get_db), curr
 
 @router.get("/revenue")
 def revenue(db: Session = Depends(get_db), current_user: User = Depends(guard)):
-    course_ids = [c.id for c in db.query(Course).filter(Course.instructor_id == current_user.id).all()]
-    total_gross = db.query(func.sum(Payment.amount)).filter(Payment.course_id.in_(course_ids), Payment.status == "completed").scalar() or 0 if course_ids else 0
+    courses = db.query(Course).filter(Course.instructor_id == current_user.id).all()
+    stats = course_aggregates(db, [c.id for c in courses])
+    total_gross = aggregate_totals(stats)["revenue"]
     monthly = db.query(MonthlyRevenue).filter(MonthlyRevenue.instructor_id == current_user.id).order_by(MonthlyRevenue.year, MonthlyRevenue.month).all()
     by_course = []
-    for c in db.query(Course).filter(Course.instructor_id == current_user.id).all():
-        gross = db.query(func.sum(Payment.amount)).filter(Payment.course_id == c.id, Payment.status == "completed").scalar() or 0
-        students = db.query(Enrollment).filter(Enrollment.course_id == c.id).count()
-        by_course.append({"course": c.title, "students": students, "gross": round(gross, 2), "fee": round(gross * 0.3, 2), "net": round(gross * 0.7, 2)})
+    for c in courses:
+        gross = stats[c.id]["revenue"]
+        by_course.append({"course": c.title, "students": stats[c.id]["students"], "gross": round(gross, 2), "fee": round(gross * 0.3, 2), "net": round(gross * 0.7, 2)})
     return {
         "total_gross": round(total_gross, 2),
         "total_net": round(total_gross * 0.7, 2),
@@ -661,9 +627,8 @@ def request_payout(body: dict, db: Session = Depends(get_db), current_user: User
 
 @router.get("/notifications")
 def notifications(db: Session = Depends(get_db), current_user: User = Depends(guard)):
-    targets = ["all", "instructors", str(current_user.id)]
     notifs = db.query(Notification).filter(
-        Notification.target.in_(targets),
+        Notification.id.in_(visible_to(current_user)),
         Notification.notif_type == "notification"
     ).order_by(Notification.sent_at.desc()).limit(50).all()
     read_ids = {r.notification_id for r in db.query(NotificationRead).filter(NotificationRead.user_id == current_user.id).all()}
@@ -671,24 +636,12 @@ def notifications(db: Session = Depends(get_db), current_user: User = Depends(gu
 
 @router.get("/notifications/unread-count")
 def notifications_unread_count(db: Session = Depends(get_db), current_user: User = Depends(guard)):
-    targets = ["all", "instructors", str(current_user.id)]
-    total = db.query(Notification).filter(Notification.target.in_(targets), Notification.notif_type == "notification").count()
-    read = db.query(NotificationRead).filter(
-        NotificationRead.user_id == current_user.id,
-        NotificationRead.notification_id.in_(
-            db.query(Notification.id).filter(Notification.target.in_(targets), Notification.notif_type == "notification")
-        )
-    ).count()
-    return {"count": max(0, total - read)}
+    return {"count": unread_count(db, current_user)}
 
 @router.post("/notifications/mark-read")
 def mark_notifications_read(db: Session = Depends(get_db), current_user: User = Depends(guard)):
-    targets = ["all", "instructors", str(current_user.id)]
-    notif_ids = [n.id for n in db.query(Notification.id).filter(Notification.target.in_(targets), Notification.notif_type == "notification").all()]
-    existing = {r.notification_id for r in db.query(NotificationRead).filter(NotificationRead.user_id == current_user.id).all()}
-    for nid in notif_ids:
-        if nid not in existing:
-            db.add(NotificationRead(user_id=current_user.id, notification_id=nid))
+    notif_ids = [n.id for n in db.query(Notification.id).filter(Notification.id.in_(visible_to(current_user)), Notification.notif_type == "notification").all()]
+    mark_read(db, current_user, notif_ids)
     db.commit()
     return {"ok": True}
 
@@ -716,7 +669,11 @@ def send_announcement(body: dict, db: Session = Depends(get_db), current_user: U
         course_id=course_id, allow_replies=body.get("allow_replies", False),
         notif_type="announcement"
     )
-    db.add(n); db.commit()
+    db.add(n)
+    bump_unread(db, n)
+    # all_students is addressed to the student role, which sockets join as "students"
+    push_after_commit(db, "students" if target == "all_students" else target, "announcement", n)
+    db.commit()
     return {"ok": True}
 
 @router.post("/notifications")
@@ -726,24 +683,19 @@ def send_notification(body: dict, db: Session = Depends(get_db), current_user: U
 
 @router.get("/analytics")
 def analytics(db: Session = Depends(get_db), current_user: User = Depends(guard)):
-    course_ids = [c.id for c in db.query(Course).filter(Course.instructor_id == current_user.id).all()]
-    total_students = db.query(Enrollment).filter(Enrollment.course_id.in_(course_ids)).count() if course_ids else 0
-    total_revenue = db.query(func.sum(Payment.amount)).filter(Payment.course_id.in_(course_ids), Payment.status == "completed").scalar() or 0 if course_ids else 0
-    avg_rating = db.query(func.avg(Review.rating)).filter(Review.course_id.in_(course_ids)).scalar() or 0 if course_ids else 0
-    avg_completion = db.query(func.avg(Enrollment.completion_pct)).filter(Enrollment.course_id.in_(course_ids)).scalar() or 0 if course_ids else 0
+    courses = db.query(Course).filter(Course.instructor_id == current_user.id).all()
+    stats = course_aggregates(db, [c.id for c in courses])
+    totals = aggregate_totals(stats)
     monthly = db.query(MonthlyRevenue).filter(MonthlyRevenue.instructor_id == current_user.id).order_by(MonthlyRevenue.year, MonthlyRevenue.month).all()
     course_perf = []
-    for c in db.query(Course).filter(Course.instructor_id == current_user.id).all():
-        students = db.query(Enrollment).filter(Enrollment.course_id == c.id).count()
-        rev = db.query(func.sum(Payment.amount)).filter(Payment.course_id == c.id, Payment.status == "completed").scalar() or 0
-        comp = db.query(func.avg(Enrollment.completion_pct)).filter(Enrollment.course_id == c.id).scalar() or 0
-        rat = db.query(func.avg(Review.rating)).filter(Review.course_id == c.id).scalar() or 0
-        course_perf.append({"title": c.title, "students": students, "revenue": round(rev * 0.7, 2), "completion": round(comp, 1), "rating": round(rat, 1)})
+    for c in courses:
+        st = stats[c.id]
+        course_perf.append({"title": c.title, "students": st["students"], "revenue": round(st["revenue"] * 0.7, 2), "completion": round(st["avg_completion"], 1), "rating": round(st["avg_rating"], 1)})
     return {
-        "total_students": total_students,
-        "total_revenue": round(total_revenue * 0.7, 2),
-        "avg_rating": round(avg_rating, 1),
-        "avg_completion": round(avg_completion, 1),
+        "total_students": totals["students"],
+        "total_revenue": round(totals["revenue"] * 0.7, 2),
+        "avg_rating": round(totals["avg_rating"], 1),
+        "avg_completion": round(totals["avg_completion"], 1),
         "monthly": [{"month": r.month, "year": r.year, "gross": r.gross, "net": r.net} for r in monthly],
         "course_performance": course_perf
     }
@@ -756,6 +708,10 @@ def get_profile(db: Session = Depends(get_db), current_user: User = Depends(guar
 def update_profile(body: dict, db: Session = Depends(get_db), current_user: User = Depends(guard)):
     for k, v in body.items():
         if hasattr(current_user, k): setattr(current_user, k, v)
+    if "name" in body or "avatar_initials" in body:
+        # Shown on the catalog cards of their courses, and searched with them
+        refresh_instructor_documents(db, current_user.id)
+        bump_catalog(db)
     db.commit()
     return {"ok": True}
 
@@ -1,13 +1,15 @@
 """Meetings router — schedule, invite, WebSocket signaling for WebRTC"""
 from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect
 from sqlalchemy.orm import Session
-from sqlalchemy import or_
+from sqlalchemy import insert
 from app.models import (
-    get_db, User, Meeting, MeetingInvite, Notification,
+    get_db, User, Meeting, MeetingInvite,
     MeetingStatusEnum, MeetingAudienceEnum, RoleEnum, CourseStatusEnum
 )
 from app.auth import get_current_user
 from app.email_utils import send_meeting_invite_email
+from app.notify import notify_many
+from app.search import search_index
 from pydantic import BaseModel
 from datetime import datetime
 from typing import Optional, List
@@ -138,36 +140,28 @@ def schedule_meeting(body: ScheduleRequest, db: Session = Depends(get_db), curre
     join_url = f"{FRONTEND_URL}/meeting/{room_id}"
     scheduled_str = scheduled_at.strftime("%B %d, %Y at %H:%M UTC")
 
-    for user in invitees:
-        if user.id == current_user.id:
-            continue
-        invite = MeetingInvite(meeting_id=meeting.id, user_id=user.id)
-        db.add(invite)
-        # Platform notification
-        notif = Notification(
-            title=f"📅 Session Invite: {body.title}",
-            message=f"{current_user.name} invited you to a session on {scheduled_str}",
-            target=str(user.id),
-            sent_at=datetime.utcnow(),
-            recipients=1,
-            notif_type="notification",
-            link=f"/meeting/{room_id}",
-        )
-        db.add(notif)
-
+    # Snapshot before commit expires the rows
+    mail_to = [(u.email, u.name) for u in invitees if u.id != current_user.id]
+    host_name = current_user.name
+    invitee_ids = [u.id for u in invitees if u.id != current_user.id]
+    if invitee_ids:
+        db.execute(insert(MeetingInvite), [{"meeting_id": meeting.id, "user_id": uid} for uid in invitee_ids])
+        # Platform notifications
+        notify_many(db, title=f"📅 Session Invite: {body.title}",
+                    message=f"{current_user.name} invited you to a session on {scheduled_str}",
+                    recipients=invitee_ids, link=f"/meeting/{room_id}")
     db.commit()
 
     # Send emails async-style (fire and forget)
-    for user in invitees:
-        if user.id != current_user.id:
-            send_meeting_invite_email(
-                to=user.email,
-                name=user.name,
-                host_name=current_user.name,
-                title=body.title,
-                scheduled_at=scheduled_str,
-                join_url=join_url,
-            )
+    for email, name in mail_to:
+        send_meeting_invite_email(
+            to=email,
+            name=name,
+            host_name=host_name,
+            title=body.title,
+            scheduled_at=scheduled_str,
+            join_url=join_url,
+        )
 
     return _meeting_dict(meeting, db)
 
@@ -199,9 +193,7 @@ def list_meetings(db: Session = Depends(get_db), current_user: User = Depends(ge
 @router.get("/contacts/search")
 def search_contacts(q: str = "", db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
     query = db.query(User).filter(User.id != current_user.id, User.is_verified == True)
-    if q:
-        query = query.filter(or_(User.name.ilike(f"%{q}%"), User.email.ilike(f"%{q}%")))
-    users = query.limit(20).all()
+    users = search_index.users(db, query, q, limit=20) if q else query.limit(20).all()
     return [{"id": u.id, "name": u.name, "email": u.email, "role": u.role, "avatar_initials": u.avatar_initials} for u in users]
 
 
@@ -1,10 +1,12 @@
 import os, uuid, shutil
-from fastapi import APIRouter, Depends, UploadFile, File, Form
+from fastapi import APIRouter, Depends, UploadFile, File, Form, Query
 from fastapi.staticfiles import StaticFiles
 from sqlalchemy.orm import Session
-from sqlalchemy import or_
 from app.models import get_db, User, Course, Enrollment, Message, RoleEnum
 from app.auth import get_current_user
+from app.realtime import push_after_commit
+from app.messaging import list_threads, conversation_page, mark_delivered_read
+from app.search import search_index
 from typing import Optional
 
 router = APIRouter(prefix="/api/messages", tags=["messages"])
@@ -89,9 +91,8 @@ def get_contacts(
     if course_id:
         enrolled_ids = [e.student_id for e in db.query(Enrollment).filter(Enrollment.course_id == course_id).all()]
         q = q.filter(User.id.in_(enrolled_ids))
-    if search:
-        q = q.filter(or_(User.name.ilike(f"%{search}%"), User.email.ilike(f"%{search}%")))
-    return [_user_shape(u) for u in q.order_by(User.name).limit(100).all()]
+    users = search_index.users(db, q, search, limit=100) if search else q.order_by(User.name).limit(100).all()
+    return [_user_shape(u) for u in users]
 
 
 @router.get("/courses-list")
@@ -113,55 +114,32 @@ def get_threads(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
-    sent_to   = db.query(Message.receiver_id).filter(Message.sender_id == current_user.id).distinct().all()
-    recv_from = db.query(Message.sender_id).filter(Message.receiver_id == current_user.id).distinct().all()
-    peer_ids  = set([r for (r,) in sent_to] + [s for (s,) in recv_from])
     result = []
-    for pid in peer_ids:
-        peer = db.query(User).filter(User.id == pid).first()
-        if not peer:
-            continue
-        last = db.query(Message).filter(
-            or_(
-                (Message.sender_id == current_user.id) & (Message.receiver_id == pid),
-                (Message.sender_id == pid) & (Message.receiver_id == current_user.id),
-            )
-        ).order_by(Message.created_at.desc()).first()
-        unread = db.query(Message).filter(
-            Message.sender_id == pid,
-            Message.receiver_id == current_user.id,
-            Message.is_read == False,
-        ).count()
-        preview = last.content[:60] if last and last.content else (f"📎 {last.attachment_name or 'Attachment'}" if last else "")
+    for peer, last, unread in list_threads(db, current_user.id):
+        preview = last.content[:60] if last.content else f"📎 {last.attachment_name or 'Attachment'}"
         result.append({
             **_user_shape(peer),
             "last_message": preview,
-            "last_at": last.created_at if last else None,
+            "last_at": last.created_at,
             "unread": unread,
         })
-    result.sort(key=lambda x: x["last_at"] or "", reverse=True)
     return result
 
 
 @router.get("/thread/{peer_id}")
 def get_thread(
     peer_id: int,
+    before_id: Optional[int] = None,
+    after_id: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=200),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
-    msgs = db.query(Message).filter(
-        or_(
-            (Message.sender_id == current_user.id) & (Message.receiver_id == peer_id),
-            (Message.sender_id == peer_id) & (Message.receiver_id == current_user.id),
-        )
-    ).order_by(Message.created_at).all()
-    db.query(Message).filter(
-        Message.sender_id == peer_id,
-        Message.receiver_id == current_user.id,
-        Message.is_read == False,
-    ).update({"is_read": True})
+    msgs = conversation_page(db, current_user.id, peer_id, before_id=before_id, after_id=after_id, limit=limit)
+    mark_delivered_read(db, current_user.id, msgs)
+    result = [_msg_shape(m) for m in msgs]
     db.commit()
-    return [_msg_shape(m) for m in msgs]
+    return result
 
 
 # ── send ──────────────────────────────────────────────────────────────────────
@@ -185,13 +163,15 @@ def send_message(
         return {"ok": False, "error": "content or attachment and recipient_ids required"}
 
     for rid in recipient_ids:
-        db.add(Message(
+        msg = Message(
             sender_id=current_user.id,
             receiver_id=rid,
             content=content,
             attachment_url=attachment_url,
             attachment_type=attachment_type,
             attachment_name=attachment_name,
-        ))
+        )
+        db.add(msg)
+        push_after_commit(db, str(rid), "message", msg)
     db.commit()
     return {"ok": True, "sent_to": len(recipient_ids)}
@@ -1,7 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
+from sqlalchemy import func
 from app.models import get_db, User, Notification, NotificationReaction, NotificationReply, NotificationRead
 from app.auth import get_current_user
+from app.realtime import push_after_commit
+from app.hydrate import user_summaries, UNKNOWN_USER
+from typing import Optional
 
 router = APIRouter(prefix="/api/notifications", tags=["notifications"])
 
@@ -11,58 +15,79 @@ def _get_notif(notif_id: int, db: Session) -> Notification:
         raise HTTPException(status_code=404, detail="Notification not found")
     return n
 
-@router.get("/{notif_id}")
-def get_notification(notif_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    n = _get_notif(notif_id, db)
-    sender = db.query(User).filter(User.id == n.sender_id).first() if n.sender_id else None
-
-    # Reactions grouped by emoji with reactor names
-    reactions_raw = db.query(NotificationReaction).filter(NotificationReaction.notification_id == notif_id).all()
-    reaction_map: dict = {}
-    for r in reactions_raw:
-        u = db.query(User).filter(User.id == r.user_id).first()
-        if r.emoji not in reaction_map:
-            reaction_map[r.emoji] = {"emoji": r.emoji, "count": 0, "users": [], "reacted": False}
-        reaction_map[r.emoji]["count"] += 1
-        reaction_map[r.emoji]["users"].append(u.name if u else "Unknown")
-        if r.user_id == current_user.id:
-            reaction_map[r.emoji]["reacted"] = True
+REACTOR_SAMPLE = 8
 
-    # Replies
-    replies = db.query(NotificationReply).filter(NotificationReply.notification_id == notif_id).order_by(NotificationReply.created_at).all()
-    reply_list = []
+def _reply_page(db: Session, notif_id: int, before_id: Optional[int], limit: int) -> list[dict]:
+    """The `limit` replies immediately older than before_id (latest if None), oldest first."""
+    q = db.query(NotificationReply).filter(NotificationReply.notification_id == notif_id)
+    if before_id is not None:
+        q = q.filter(NotificationReply.id < before_id)
+    replies = list(reversed(q.order_by(NotificationReply.id.desc()).limit(limit).all()))
+    users = user_summaries(db, (r.user_id for r in replies))
+    result = []
     for rep in replies:
-        u = db.query(User).filter(User.id == rep.user_id).first()
-        reply_list.append({
+        u = users.get(rep.user_id, UNKNOWN_USER)
+        result.append({
             "id": rep.id, "user_id": rep.user_id,
-            "user_name": u.name if u else "Unknown",
-            "user_initials": u.avatar_initials if u else "?",
-            "user_avatar_url": u.avatar_url if u else None,
+            "user_name": u["name"],
+            "user_initials": u["initials"],
+            "user_avatar_url": u["avatar_url"],
             "content": rep.content,
             "created_at": rep.created_at,
         })
+    return result
 
-    # My reaction
-    my_reaction = db.query(NotificationReaction).filter(
+@router.get("/{notif_id}")
+def get_notification(notif_id: int, replies_limit: int = Query(50, ge=1, le=200), db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    n = _get_notif(notif_id, db)
+
+    # Reactions grouped by emoji in SQL, with a sample of reactor names per emoji
+    counts = db.query(NotificationReaction.emoji, func.count(NotificationReaction.id)).filter(
+        NotificationReaction.notification_id == notif_id
+    ).group_by(NotificationReaction.emoji).order_by(func.min(NotificationReaction.id)).all()
+    ranked = db.query(
+        NotificationReaction.emoji.label("emoji"),
+        NotificationReaction.user_id.label("user_id"),
+        func.row_number().over(partition_by=NotificationReaction.emoji, order_by=NotificationReaction.id).label("rn"),
+    ).filter(NotificationReaction.notification_id == notif_id).subquery()
+    sample = db.query(ranked.c.emoji, ranked.c.user_id).filter(ranked.c.rn <= REACTOR_SAMPLE).order_by(ranked.c.rn).all()
+    my_reaction = db.query(NotificationReaction.emoji).filter(
         NotificationReaction.notification_id == notif_id,
         NotificationReaction.user_id == current_user.id
-    ).first()
+    ).scalar()
+
+    replies = _reply_page(db, notif_id, None, replies_limit)
+    reply_count = db.query(func.count(NotificationReply.id)).filter(NotificationReply.notification_id == notif_id).scalar()
+
+    users = user_summaries(db, [n.sender_id] + [uid for _, uid in sample])
+    sender = users.get(n.sender_id)
+    reaction_map = {emoji: {"emoji": emoji, "count": count, "users": [], "reacted": emoji == my_reaction} for emoji, count in counts}
+    for emoji, uid in sample:
+        reaction_map[emoji]["users"].append(users.get(uid, UNKNOWN_USER)["name"])
 
     return {
         "id": n.id, "title": n.title, "message": n.message,
         "target": n.target or "", "sent_at": n.sent_at,
         "allow_replies": n.allow_replies or False,
-        "sender_name": sender.name if sender else "FluentFusion",
-        "sender_initials": sender.avatar_initials if sender else "FF",
-        "sender_avatar_url": sender.avatar_url if sender else None,
+        "sender_name": sender["name"] if sender else "FluentFusion",
+        "sender_initials": sender["initials"] if sender else "FF",
+        "sender_avatar_url": sender["avatar_url"] if sender else None,
         "reactions": list(reaction_map.values()),
-        "my_reaction": my_reaction.emoji if my_reaction else None,
-        "replies": reply_list,
+        "my_reaction": my_reaction,
+        "replies": replies,
+        "reply_count": reply_count,
     }
 
+@router.get("/{notif_id}/replies")
+def get_replies(notif_id: int, before_id: Optional[int] = None, limit: int = Query(50, ge=1, le=200),
+                db: Session = Depends(get_db), _=Depends(get_current_user)):
+    """Older replies — pass the id of the oldest reply already shown as before_id."""
+    _get_notif(notif_id, db)
+    return _reply_page(db, notif_id, before_id, limit)
+
 @router.post("/{notif_id}/react")
 def react(notif_id: int, body: dict, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    _get_notif(notif_id, db)
+    n = _get_notif(notif_id, db)
     emoji = body.get("emoji", "").strip()
     if not emoji:
         raise HTTPException(status_code=400, detail="emoji required")
@@ -76,16 +101,20 @@ def react(notif_id: int, body: dict, db: Session = Depends(get_db), current_user
         if existing.emoji == emoji:
             # Toggle off
             db.delete(existing)
-            db.commit()
-            return {"ok": True, "action": "removed"}
+            action = "removed"
         else:
             existing.emoji = emoji
-            db.commit()
-            return {"ok": True, "action": "changed"}
+            action = "changed"
     else:
         db.add(NotificationReaction(notification_id=notif_id, user_id=current_user.id, emoji=emoji))
-        db.commit()
-        return {"ok": True, "action": "added"}
+        action = "added"
+    if n.sender_id and n.sender_id != current_user.id:
+        push_after_commit(db, str(n.sender_id), "reaction", {
+            "notification_id": notif_id, "user_id": current_user.id,
+            "user_name": current_user.name, "emoji": emoji, "action": action,
+        })
+    db.commit()
+    return {"ok": True, "action": action}
 
 @router.post("/{notif_id}/reply")
 def reply(notif_id: int, body: dict, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
@@ -96,6 +125,11 @@ def reply(notif_id: int, body: dict, db: Session = Depends(get_db), current_user
     if not content:
         raise HTTPException(status_code=400, detail="content required")
     db.add(NotificationReply(notification_id=notif_id, user_id=current_user.id, content=content))
+    if n.sender_id and n.sender_id != current_user.id:
+        push_after_commit(db, str(n.sender_id), "reply", {
+            "notification_id": notif_id, "user_id": current_user.id,
+            "user_name": current_user.name, "content": content,
+        })
     db.commit()
     return {"ok": True}
 
@@ -104,8 +138,9 @@ def get_reactions(notif_id: int, db: Session = Depends(get_db), _=Depends(get_cu
     """Returns full list of who reacted with what — for sender's view."""
     _get_notif(notif_id, db)
     rows = db.query(NotificationReaction).filter(NotificationReaction.notification_id == notif_id).all()
+    users = user_summaries(db, (r.user_id for r in rows))
     result = []
     for r in rows:
-        u = db.query(User).filter(User.id == r.user_id).first()
-        result.append({"user_name": u.name if u else "Unknown", "user_initials": u.avatar_initials if u else "?", "emoji": r.emoji, "created_at": r.created_at})
+        u = users.get(r.user_id, UNKNOWN_USER)
+        result.append({"user_name": u["name"], "user_initials": u["initials"], "emoji": r.emoji, "created_at": r.created_at})
     return result
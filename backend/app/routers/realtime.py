@@ -0,0 +1,62 @@
+"""Realtime router — per-user WebSocket that pushes notifications, messages and reactions"""
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, HTTPException
+from app.models import SessionLocal, User, Enrollment, RoleEnum
+from app.auth import get_current_user
+from app.realtime import hub
+
+router = APIRouter(prefix="/api/realtime", tags=["realtime"])
+
+_ROLE_CHANNEL = {
+    RoleEnum.student: "students",
+    RoleEnum.instructor: "instructors",
+    RoleEnum.admin: "admins",
+    RoleEnum.super_admin: "admins",
+}
+
+
+def _channels_for(user: User, db) -> list[str]:
+    """Same audiences the notification read endpoints match on for this user."""
+    channels = [str(user.id), "all", _ROLE_CHANNEL[user.role]]
+    if user.role in (RoleEnum.admin, RoleEnum.super_admin):
+        channels.append(user.role.value)
+    if user.role == RoleEnum.student:
+        channels += [f"course_{cid}" for (cid,) in db.query(Enrollment.course_id).filter(Enrollment.student_id == user.id)]
+    return channels
+
+
+@router.websocket("/ws")
+async def push_ws(ws: WebSocket, token: str = ""):
+    """
+    Connect with ?token=<access token>. The server pushes JSON events:
+      {"type": "notification" | "announcement", "notification": {...}}
+      {"type": "message", "message": {...}}
+      {"type": "reaction" | "reply", "notification_id": ..., ...}
+    Send "ping" to receive {"type": "pong"}.
+    """
+    # Resolve subscriptions up front so the socket doesn't hold a DB connection
+    db = SessionLocal()
+    try:
+        user = get_current_user(token, db)
+        channels = _channels_for(user, db)
+    except HTTPException:
+        await ws.close(code=4001)
+        return
+    finally:
+        db.close()
+
+    await hub.connect(ws, channels)
+    try:
+        while True:
+            message = await ws.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if message.get("text") is None:
+                # Only text frames are part of the protocol
+                await ws.close(code=1003)
+                break
+            if message["text"] == "ping":
+                await ws.send_text('{"type": "pong"}')
+    except WebSocketDisconnect:
+        pass
+    finally:
+        hub.disconnect(ws)
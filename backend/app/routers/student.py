@@ -1,9 +1,18 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query, Request, Response
 from sqlalchemy.orm import Session
 from sqlalchemy import func
-from app.models import get_db, User, Course, Module, Enrollment, Payment, LiveSession, Quiz, Lesson, Message, Review, Notification, NotificationRead, RoleEnum, ModuleQuiz, QuizQuestion
+from app.models import get_db, User, Course, Module, Enrollment, Payment, LiveSession, Quiz, Lesson, Message, Review, Notification, NotificationRead, RoleEnum
 from app.auth import require_role
 from app.notify import notify
+from app.realtime import push_after_commit
+from app.messaging import list_threads, conversation_page, mark_delivered_read
+from app.notification_state import unread_count, mark_read, refresh_unread
+from app.audiences import visible_to
+from app.aggregates import bump_course_stats, course_aggregates
+from app.curriculum import load_curriculum, quiz_dict
+from app.catalog import catalog_version, bump_catalog, enrolled_course_ids, catalog_etag, etag_matches, catalog_page
+from typing import Optional
+from datetime import datetime
 
 router = APIRouter(prefix="/api/student", tags=["student"])
 guard = require_role(RoleEnum.student)
@@ -33,32 +42,18 @@ def dashboard(db: Session = Depends(get_db), current_user: User = Depends(guard)
     }
 
 @router.get("/catalog")
-def course_catalog(search: str = "", language: str = "", level: str = "", db: Session = Depends(get_db), current_user: User = Depends(guard)):
-    q = db.query(
-        Course,
-        User.name.label("instructor_name"),
-        User.avatar_initials.label("instructor_initials"),
-        func.count(func.distinct(Lesson.id)).label("lesson_count"),
-        func.count(func.distinct(Enrollment.id)).label("student_count"),
-        func.coalesce(func.avg(Review.rating), 0).label("avg_rating"),
-    ).outerjoin(User, User.id == Course.instructor_id
-    ).outerjoin(Lesson, Lesson.course_id == Course.id
-    ).outerjoin(Enrollment, Enrollment.course_id == Course.id
-    ).outerjoin(Review, Review.course_id == Course.id
-    ).filter(Course.status == "published"
-    ).group_by(Course.id, User.name, User.avatar_initials)
-    if search: q = q.filter(Course.title.ilike(f"%{search}%"))
-    if language: q = q.filter(Course.language.ilike(f"%{language}%"))
-    if level: q = q.filter(Course.level == level)
-    rows = q.order_by(Course.created_at.desc()).all()
-    enrolled_ids = {e.course_id for e in db.query(Enrollment.course_id).filter(Enrollment.student_id == current_user.id).all()}
-    return [{
-        "id": c.id, "title": c.title, "description": c.description, "language": c.language,
-        "level": c.level, "flag_emoji": c.flag_emoji, "thumbnail_url": c.thumbnail_url,
-        "price": c.price, "instructor": instructor_name or "", "instructor_initials": instructor_initials or "",
-        "lesson_count": lesson_count, "student_count": student_count,
-        "rating": round(float(avg_rating), 1), "enrolled": c.id in enrolled_ids,
-    } for c, instructor_name, instructor_initials, lesson_count, student_count, avg_rating in rows]
+def course_catalog(request: Request, search: str = "", language: str = "", level: str = "",
+                   limit: Optional[int] = Query(None, ge=1, le=200), offset: int = Query(0, ge=0),
+                   db: Session = Depends(get_db), current_user: User = Depends(guard)):
+    version = catalog_version(db)
+    enrolled = enrolled_course_ids(db, current_user.id)
+    etag = catalog_etag(version, enrolled, search, language, level, limit, offset)
+    # private: the enrolled flags are per student; no-cache: revalidate with If-None-Match every time
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    body, total = catalog_page(db, version, enrolled, search.strip(), language, level, limit, offset)
+    return Response(body, media_type="application/json", headers={**headers, "X-Total-Count": str(total)})
 
 @router.post("/courses/{course_id}/enroll")
 def enroll(course_id: int, db: Session = Depends(get_db), current_user: User = Depends(guard)):
@@ -67,6 +62,11 @@ def enroll(course_id: int, db: Session = Depends(get_db), current_user: User = D
     course = db.query(Course).filter(Course.id == course_id, Course.status == "published").first()
     if not course: return {"error": "Course not found"}
     db.add(Enrollment(student_id=current_user.id, course_id=course_id))
+    bump_course_stats(db, course_id, students=1)
+    bump_catalog(db)
+    current_user.pulse_changed_at = datetime.utcnow()
+    # course_<id> notifications now count towards the badge
+    refresh_unread(db, current_user.id)
     db.commit()
     # Notify instructor
     notify(db, title="🎓 New Enrollment",
@@ -106,33 +106,19 @@ def course_detail(course_id: int, db: Session = Depends(get_db), current_user: U
         from fastapi import HTTPException
         raise HTTPException(status_code=404, detail="Course not found")
     instructor = db.query(User).filter(User.id == c.instructor_id).first()
-    lesson_count = db.query(Lesson).filter(Lesson.course_id == c.id).count()
-    student_count = db.query(Enrollment).filter(Enrollment.course_id == c.id).count()
-    avg_rat = db.query(func.avg(Review.rating)).filter(Review.course_id == c.id).scalar() or 0
+    stats = course_aggregates(db, [c.id])[c.id]
+    lesson_count, student_count, avg_rat = stats["lesson_count"], stats["students"], stats["avg_rating"]
     enrolled = db.query(Enrollment).filter(Enrollment.student_id == current_user.id, Enrollment.course_id == c.id).first() is not None
-    modules = db.query(Module).filter(Module.course_id == c.id).order_by(Module.order).all()
-    curriculum = []
-    for m in modules:
-        lessons = db.query(Lesson).filter(Lesson.module_id == m.id).order_by(Lesson.order).all()
-        quizzes = db.query(ModuleQuiz).filter(ModuleQuiz.module_id == m.id).order_by(ModuleQuiz.order).all()
-        quiz_data = []
-        for q in quizzes:
-            questions = db.query(QuizQuestion).filter(QuizQuestion.quiz_id == q.id).order_by(QuizQuestion.order).all()
-            quiz_data.append({
-                "id": q.id, "title": q.title, "position": q.position, "passing_score": q.passing_score,
-                "time_limit_min": q.time_limit_min, "is_required": q.is_required, "order": q.order,
-                "question_count": len(questions)
-            })
-        curriculum.append({
-            "title": m.title, 
-            "description": m.description,
-            "lessons": [{"id": l.id, "title": l.title, "lesson_type": l.lesson_type, "duration_min": l.duration_min, "is_preview": l.is_preview} for l in lessons],
-            "quizzes": quiz_data
-        })
-    if not curriculum:
-        all_lessons = db.query(Lesson).filter(Lesson.course_id == c.id).order_by(Lesson.order).all()
-        if all_lessons:
-            curriculum = [{"title": "Course Content", "lessons": [{"id": l.id, "title": l.title, "lesson_type": l.lesson_type, "duration_min": l.duration_min, "is_preview": l.is_preview} for l in all_lessons]}]
+    cur = load_curriculum(db, c.id, with_questions=False)
+    curriculum = [{
+        "title": m.title,
+        "description": m.description,
+        "lessons": [{"id": l.id, "title": l.title, "lesson_type": l.lesson_type, "duration_min": l.duration_min, "is_preview": l.is_preview} for l in cur.lessons.get(m.id, [])],
+        "quizzes": [{**quiz_dict(q), "question_count": cur.question_counts.get(q.id, 0)} for q in cur.quizzes.get(m.id, [])],
+    } for m in cur.modules]
+    if not curriculum and cur.loose_lessons:
+        # No modules: every lesson of the course is loose
+        curriculum = [{"title": "Course Content", "lessons": [{"id": l.id, "title": l.title, "lesson_type": l.lesson_type, "duration_min": l.duration_min, "is_preview": l.is_preview} for l in cur.loose_lessons]}]
     return {
         "id": c.id, "title": c.title, "subtitle": c.subtitle, "description": c.description,
         "language": c.language, "level": c.level, "flag_emoji": c.flag_emoji,
@@ -172,8 +158,11 @@ def complete_lesson(course_id: int, lesson_id: int, db: Session = Depends(get_db
         raise HTTPException(status_code=404, detail="Not enrolled")
     total = db.query(Lesson).filter(Lesson.course_id == course_id).count()
     if total > 0:
-        enrollment.completion_pct = min(100.0, enrollment.completion_pct + round(100.0 / total, 1))
+        before = enrollment.completion_pct or 0.0
+        enrollment.completion_pct = min(100.0, before + round(100.0 / total, 1))
+        bump_course_stats(db, course_id, completion_sum=enrollment.completion_pct - before)
     current_user.xp = (current_user.xp or 0) + 10
+    current_user.pulse_changed_at = datetime.utcnow()
     db.commit()
     return {"ok": True, "completion": round(enrollment.completion_pct, 1), "xp": current_user.xp}
 
@@ -199,35 +188,23 @@ def quizzes(db: Session = Depends(get_db), current_user: User = Depends(guard)):
 
 @router.get("/messages")
 def messages(db: Session = Depends(get_db), current_user: User = Depends(guard)):
-    sent_to = db.query(Message.receiver_id).filter(Message.sender_id == current_user.id).distinct().all()
-    received_from = db.query(Message.sender_id).filter(Message.receiver_id == current_user.id).distinct().all()
-    peer_ids = set([r for (r,) in sent_to] + [s for (s,) in received_from])
-    result = []
-    for pid in peer_ids:
-        peer = db.query(User).filter(User.id == pid).first()
-        last_msg = db.query(Message).filter(
-            ((Message.sender_id == current_user.id) & (Message.receiver_id == pid)) |
-            ((Message.sender_id == pid) & (Message.receiver_id == current_user.id))
-        ).order_by(Message.created_at.desc()).first()
-        unread = db.query(Message).filter(Message.sender_id == pid, Message.receiver_id == current_user.id, Message.is_read == False).count()
-        if peer:
-            result.append({"id": peer.id, "name": peer.name, "role": peer.role, "avatar_initials": peer.avatar_initials, "last_message": last_msg.content if last_msg else "", "unread": unread, "last_at": last_msg.created_at if last_msg else None})
-    return result
+    return [{"id": peer.id, "name": peer.name, "role": peer.role, "avatar_initials": peer.avatar_initials, "last_message": last.content or "", "unread": unread, "last_at": last.created_at}
+            for peer, last, unread in list_threads(db, current_user.id)]
 
 @router.get("/messages/{peer_id}")
-def get_conversation(peer_id: int, db: Session = Depends(get_db), current_user: User = Depends(guard)):
-    msgs = db.query(Message).filter(
-        ((Message.sender_id == current_user.id) & (Message.receiver_id == peer_id)) |
-        ((Message.sender_id == peer_id) & (Message.receiver_id == current_user.id))
-    ).order_by(Message.created_at).all()
-    db.query(Message).filter(Message.sender_id == peer_id, Message.receiver_id == current_user.id).update({"is_read": True})
+def get_conversation(peer_id: int, before_id: Optional[int] = None, after_id: Optional[int] = None, limit: int = Query(50, ge=1, le=200),
+                     db: Session = Depends(get_db), current_user: User = Depends(guard)):
+    msgs = conversation_page(db, current_user.id, peer_id, before_id=before_id, after_id=after_id, limit=limit)
+    mark_delivered_read(db, current_user.id, msgs)
+    result = [{"id": m.id, "sender_id": m.sender_id, "content": m.content, "created_at": m.created_at} for m in msgs]
     db.commit()
-    return [{"id": m.id, "sender_id": m.sender_id, "content": m.content, "created_at": m.created_at} for m in msgs]
+    return result
 
 @router.post("/messages/{peer_id}")
 def send_message(peer_id: int, body: dict, db: Session = Depends(get_db), current_user: User = Depends(guard)):
     msg = Message(sender_id=current_user.id, receiver_id=peer_id, content=body["content"])
     db.add(msg)
+    push_after_commit(db, str(peer_id), "message", msg)
     # Notify recipient
     notify(db, title="💬 New Message",
            message=f"{current_user.name} sent you a message.",
@@ -237,11 +214,8 @@ def send_message(peer_id: int, body: dict, db: Session = Depends(get_db), curren
 
 @router.get("/notifications")
 def notifications(db: Session = Depends(get_db), current_user: User = Depends(guard)):
-    enrolled_course_ids = [e.course_id for e in db.query(Enrollment).filter(Enrollment.student_id == current_user.id).all()]
-    course_targets = [f"course_{cid}" for cid in enrolled_course_ids]
-    targets = ["all", "students", str(current_user.id)] + course_targets
     notifs = db.query(Notification).filter(
-        Notification.target.in_(targets),
+        Notification.id.in_(visible_to(current_user)),
         Notification.notif_type == "notification"
     ).order_by(Notification.sent_at.desc()).limit(50).all()
     read_ids = {r.notification_id for r in db.query(NotificationRead).filter(NotificationRead.user_id == current_user.id).all()}
@@ -249,35 +223,13 @@ def notifications(db: Session = Depends(get_db), current_user: User = Depends(gu
 
 @router.get("/notifications/unread-count")
 def notifications_unread_count(db: Session = Depends(get_db), current_user: User = Depends(guard)):
-    enrolled_course_ids = [e.course_id for e in db.query(Enrollment).filter(Enrollment.student_id == current_user.id).all()]
-    course_targets = [f"course_{cid}" for cid in enrolled_course_ids]
-    notif_targets = ["all", "students", str(current_user.id)] + course_targets
-    annc_targets  = ["all", "students"] + course_targets
-
-    # unread system notifications
-    notif_ids = [n.id for n in db.query(Notification.id).filter(
-        Notification.target.in_(notif_targets), Notification.notif_type == "notification").all()]
-    # unread announcements
-    annc_ids = [n.id for n in db.query(Notification.id).filter(
-        Notification.target.in_(annc_targets), Notification.notif_type == "announcement").all()]
-
-    all_ids = list(set(notif_ids + annc_ids))
-    read = db.query(NotificationRead).filter(
-        NotificationRead.user_id == current_user.id,
-        NotificationRead.notification_id.in_(all_ids)
-    ).count() if all_ids else 0
-    return {"count": max(0, len(all_ids) - read)}
+    # unread system notifications + announcements, from the materialized counter
+    return {"count": unread_count(db, current_user)}
 
 @router.post("/notifications/mark-read")
 def mark_notifications_read(db: Session = Depends(get_db), current_user: User = Depends(guard)):
-    enrolled_course_ids = [e.course_id for e in db.query(Enrollment).filter(Enrollment.student_id == current_user.id).all()]
-    course_targets = [f"course_{cid}" for cid in enrolled_course_ids]
-    targets = ["all", "students", str(current_user.id)] + course_targets
-    notif_ids = [n.id for n in db.query(Notification.id).filter(Notification.target.in_(targets), Notification.notif_type == "notification").all()]
-    existing = {r.notification_id for r in db.query(NotificationRead).filter(NotificationRead.user_id == current_user.id).all()}
-    for nid in notif_ids:
-        if nid not in existing:
-            db.add(NotificationRead(user_id=current_user.id, notification_id=nid))
+    notif_ids = [n.id for n in db.query(Notification.id).filter(Notification.id.in_(visible_to(current_user)), Notification.notif_type == "notification").all()]
+    mark_read(db, current_user, notif_ids)
     db.commit()
     return {"ok": True}
 
@@ -289,6 +241,8 @@ def get_profile(db: Session = Depends(get_db), current_user: User = Depends(guar
 def update_profile(body: dict, db: Session = Depends(get_db), current_user: User = Depends(guard)):
     for k, v in body.items():
         if hasattr(current_user, k): setattr(current_user, k, v)
+    if "xp" in body:
+        current_user.pulse_changed_at = datetime.utcnow()
     db.commit()
     return {"ok": True}
 
@@ -312,11 +266,8 @@ def leaderboard(db: Session = Depends(get_db), current_user: User = Depends(guar
 
 @router.get("/announcements")
 def get_announcements(db: Session = Depends(get_db), current_user: User = Depends(guard)):
-    enrolled_course_ids = [e.course_id for e in db.query(Enrollment).filter(Enrollment.student_id == current_user.id).all()]
-    course_targets = [f"course_{cid}" for cid in enrolled_course_ids]
-    targets = ["all", "students", str(current_user.id)] + course_targets
     notifs = db.query(Notification).filter(
-        Notification.target.in_(targets),
+        Notification.id.in_(visible_to(current_user)),
         Notification.notif_type == "announcement"
     ).order_by(Notification.sent_at.desc()).limit(50).all()
     read_ids = {r.notification_id for r in db.query(NotificationRead).filter(NotificationRead.user_id == current_user.id).all()}
@@ -324,14 +275,8 @@ def get_announcements(db: Session = Depends(get_db), current_user: User = Depend
 
 @router.post("/announcements/mark-read")
 def mark_announcements_read(db: Session = Depends(get_db), current_user: User = Depends(guard)):
-    enrolled_course_ids = [e.course_id for e in db.query(Enrollment).filter(Enrollment.student_id == current_user.id).all()]
-    course_targets = [f"course_{cid}" for cid in enrolled_course_ids]
-    targets = ["all", "students", str(current_user.id)] + course_targets
-    annc_ids = [n.id for n in db.query(Notification.id).filter(Notification.target.in_(targets), Notification.notif_type == "announcement").all()]
-    existing = {r.notification_id for r in db.query(NotificationRead).filter(NotificationRead.user_id == current_user.id).all()}
-    for nid in annc_ids:
-        if nid not in existing:
-            db.add(NotificationRead(user_id=current_user.id, notification_id=nid))
+    annc_ids = [n.id for n in db.query(Notification.id).filter(Notification.id.in_(visible_to(current_user)), Notification.notif_type == "announcement").all()]
+    mark_read(db, current_user, annc_ids)
     db.commit()
     return {"ok": True}
 
@@ -0,0 +1,264 @@
+"""
+Full-text search for the course catalog and the contact pickers.
+
+Courses are searched through course_search_documents: one row per course with
+its title + subtitle, language + instructor name, and description, weighted
+A/B/C. Rows are rebuilt on first search when missing; write paths that change
+the indexed text call refresh_course_documents() / refresh_instructor_documents()
+to drop the stale ones. Users are searched on name and email directly.
+
+On PostgreSQL (PostgresSearch) both are matched with to_tsquery prefix queries
+against GIN-indexed tsvector expressions and ranked with ts_rank_cd. When that
+finds nothing — substrings, typos — a trigram pass (pg_trgm, GIN gin_trgm_ops)
+matches ILIKE substrings and word_similarity() above SEARCH_WORD_SIMILARITY
+(default 0.5), ranked by similarity. Without pg_trgm the fallback is a plain
+ILIKE. install_indexes() creates the extension and indexes at startup.
+
+Elsewhere (SQLite test runs) MemorySearch stands in: same documents, filters
+and ordering rules, matched and ranked in Python.
+"""
+import os, re
+from datetime import datetime
+from sqlalchemy import func, or_, select, text, literal_column, bindparam
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, Query
+from app.models import engine, Course, CourseSearchDocument, User
+
+WORD_SIMILARITY = float(os.getenv("SEARCH_WORD_SIMILARITY", "0.5"))
+
+# ts_rank's default weights for A, B, C
+_WEIGHTS = (1.0, 0.4, 0.2)
+
+
+def _course_doc(t: str = "") -> str:
+    return (f"(setweight(to_tsvector('simple'::regconfig, {t}title), 'A') || "
+            f"setweight(to_tsvector('simple'::regconfig, {t}keywords), 'B') || "
+            f"setweight(to_tsvector('simple'::regconfig, {t}description), 'C'))")
+
+
+def _course_text(t: str = "") -> str:
+    return f"({t}title || ' ' || {t}keywords)"
+
+
+def _user_doc(t: str = "") -> str:
+    return f"to_tsvector('simple'::regconfig, coalesce({t}name, '') || ' ' || coalesce({t}email, ''))"
+
+
+def _tokens(s: str) -> list[str]:
+    return re.findall(r"[^\W_]+", s.lower())
+
+
+def _tsquery(tokens: list[str]):
+    """Every token, each as a prefix: 'span gram' → span:* & gram:*"""
+    return func.to_tsquery("simple", " & ".join(f"{t}:*" for t in tokens))
+
+
+def _page(q: Query, limit: int | None, offset: int) -> Query:
+    q = q.offset(offset)
+    return q.limit(limit) if limit else q
+
+
+# ── Documents ─────────────────────────────────────────────────────────────
+
+def _documents(db: Session, course_ids: list[int]) -> list[dict]:
+    rows = (db.query(Course.id, Course.title, Course.subtitle, Course.language, Course.description, User.name)
+            .outerjoin(User, User.id == Course.instructor_id)
+            .filter(Course.id.in_(course_ids)))
+    return [{
+        "course_id": cid,
+        "title": " ".join(filter(None, (title, subtitle))),
+        "keywords": " ".join(filter(None, (language, instructor))),
+        "description": description or "",
+    } for cid, title, subtitle, language, description, instructor in rows]
+
+
+def ensure_course_documents(db: Session):
+    """Build the missing course_search_documents rows. Commits if it wrote any."""
+    missing = [cid for (cid,) in db.query(Course.id)
+               .outerjoin(CourseSearchDocument, CourseSearchDocument.course_id == Course.id)
+               .filter(CourseSearchDocument.course_id.is_(None))]
+    if not missing:
+        return
+    db.bulk_insert_mappings(CourseSearchDocument, _documents(db, missing))
+    try:
+        db.commit()
+    except IntegrityError:
+        # Another request built some of them first
+        db.rollback()
+
+
+def refresh_course_documents(db: Session, course_ids):
+    """Drop the rows so they are rebuilt on the next search. Caller commits."""
+    course_ids = list(course_ids)
+    if course_ids:
+        db.query(CourseSearchDocument).filter(CourseSearchDocument.course_id.in_(course_ids)).delete(synchronize_session=False)
+
+
+def refresh_instructor_documents(db: Session, instructor_id: int):
+    """The instructor's name is part of their courses' documents. Caller commits."""
+    refresh_course_documents(db, [cid for (cid,) in db.query(Course.id).filter(Course.instructor_id == instructor_id)])
+
+
+def _published(db: Session, columns, language: str, level: str) -> Query:
+    q = (db.query(*columns).join(Course, Course.id == CourseSearchDocument.course_id)
+         .filter(Course.status == "published"))
+    if language: q = q.filter(Course.language.ilike(f"%{language}%"))
+    if level: q = q.filter(Course.level == level)
+    return q
+
+
+# ── PostgreSQL ────────────────────────────────────────────────────────────
+
+class PostgresSearch:
+    def __init__(self):
+        self.trigram = False   # set by install_indexes() once pg_trgm is available
+
+    def _similar(self, db: Session):
+        db.execute(select(func.set_config("pg_trgm.word_similarity_threshold", str(WORD_SIMILARITY), True)))
+
+    def courses(self, db: Session, term: str, language: str = "", level: str = "",
+                limit: int | None = None, offset: int = 0) -> tuple[list[int], int]:
+        """Published course ids matching term, best first, and the total number of matches."""
+        ensure_course_documents(db)
+        base = _published(db, (CourseSearchDocument.course_id,), language, level)
+        tokens = _tokens(term)
+        if tokens:
+            doc, tsq = literal_column(_course_doc("course_search_documents.")), _tsquery(tokens)
+            q = base.filter(doc.op("@@")(tsq))
+            total = q.count()
+            if total:
+                q = q.order_by(func.ts_rank_cd(doc, tsq).desc(), Course.created_at.desc())
+                return [cid for (cid,) in _page(q, limit, offset)], total
+
+        # Explicit bind names: the ones derived from a literal_column would be its SQL text
+        body = literal_column(_course_text("course_search_documents."))
+        match, order = body.ilike(bindparam("pattern", f"%{term}%")), [Course.created_at.desc()]
+        if self.trigram:
+            self._similar(db)
+            match = or_(match, body.op("%>")(bindparam("term", term)))
+            order.insert(0, func.word_similarity(bindparam("similar_to", term), body).desc())
+        q = base.filter(match)
+        total = q.count()
+        return [cid for (cid,) in _page(q.order_by(*order), limit, offset)], total
+
+    def users(self, db: Session, q: Query, term: str, limit: int, offset: int = 0) -> list[User]:
+        """Narrow q (a User query) to users whose name or email matches term, best first."""
+        tokens = _tokens(term)
+        if tokens:
+            doc, tsq = literal_column(_user_doc("users.")), _tsquery(tokens)
+            fts = q.filter(doc.op("@@")(tsq))
+            found = fts.order_by(func.ts_rank_cd(doc, tsq).desc(), User.name).offset(offset).limit(limit).all()
+            if found or (offset and fts.first() is not None):
+                return found
+
+        match, order = or_(User.name.ilike(f"%{term}%"), User.email.ilike(f"%{term}%")), [User.name]
+        if self.trigram:
+            self._similar(db)
+            match = or_(match, User.name.op("%>")(term))
+            order.insert(0, func.word_similarity(term, User.name).desc())
+        return q.filter(match).order_by(*order).offset(offset).limit(limit).all()
+
+
+# ── In-memory stand-in ────────────────────────────────────────────────────
+
+def _rank(tokens: list[str], fields: tuple) -> float:
+    """Like ts_rank_cd over weighted fields: 0 unless every token prefixes some word; else the weights of the fields each token hits, summed."""
+    words = [_tokens(f or "") for f in fields]
+    score = 0.0
+    for t in tokens:
+        hit = sum(w for w, ws in zip(_WEIGHTS, words) if any(x.startswith(t) for x in ws))
+        if not hit:
+            return 0.0
+        score += hit
+    return score
+
+
+def _trigrams(s: str) -> set[str]:
+    grams = set()
+    for w in _tokens(s):
+        w = f"  {w} "
+        grams.update(w[i:i + 3] for i in range(len(w) - 2))
+    return grams
+
+
+def _word_similarity(term: str, s: str) -> float:
+    """pg_trgm's word_similarity, approximated by the best similarity to a single word of s."""
+    t = _trigrams(term)
+    if not t:
+        return 0.0
+    best = 0.0
+    for w in _tokens(s):
+        g = _trigrams(w)
+        best = max(best, len(t & g) / len(t | g))
+    return best
+
+
+def _similar(term: str, s: str) -> float:
+    """Fallback score: substring matches rank first, then trigram similarity; 0 if neither."""
+    if term.lower() in s.lower():
+        return 1.0 + _word_similarity(term, s)
+    sim = _word_similarity(term, s)
+    return sim if sim >= WORD_SIMILARITY else 0.0
+
+
+class MemorySearch:
+    trigram = True
+
+    def courses(self, db: Session, term: str, language: str = "", level: str = "",
+                limit: int | None = None, offset: int = 0) -> tuple[list[int], int]:
+        ensure_course_documents(db)
+        rows = _published(db, (CourseSearchDocument, Course.created_at), language, level).all()
+        tokens = _tokens(term)
+        scored = [(_rank(tokens, (d.title, d.keywords, d.description)), created, d.course_id)
+                  for d, created in rows] if tokens else []
+        scored = [s for s in scored if s[0]]
+        if not scored:
+            scored = [(_similar(term, f"{d.title} {d.keywords}"), created, d.course_id) for d, created in rows]
+            scored = [s for s in scored if s[0]]
+        scored.sort(key=lambda s: (s[0], s[1] or datetime.min), reverse=True)
+        ids = [cid for _, _, cid in scored]
+        return ids[offset:offset + limit if limit else None], len(ids)
+
+    def users(self, db: Session, q: Query, term: str, limit: int, offset: int = 0) -> list[User]:
+        candidates = q.all()
+        tokens = _tokens(term)
+        scored = [(_rank(tokens, (f"{u.name or ''} {u.email or ''}",)), u) for u in candidates] if tokens else []
+        scored = [s for s in scored if s[0]]
+        if not scored:
+            scored = [(max(_similar(term, u.name or ""), _similar(term, u.email or "")), u) for u in candidates]
+            scored = [s for s in scored if s[0]]
+        scored.sort(key=lambda s: (-s[0], s[1].name or ""))
+        return [u for _, u in scored[offset:offset + limit]]
+
+
+search_index = PostgresSearch() if engine.dialect.name == "postgresql" else MemorySearch()
+
+
+def install_indexes(engine):
+    """Create pg_trgm and the search indexes (PostgreSQL only; every statement is idempotent)."""
+    if engine.dialect.name != "postgresql":
+        return
+    indexes = [
+        ("ix_course_search_documents_fts", "course_search_documents", f"USING GIN ({_course_doc()})"),
+        ("ix_users_search_fts",            "users",                   f"USING GIN (({_user_doc()}))"),
+    ]
+    trigram_indexes = [
+        ("ix_course_search_documents_trgm", "course_search_documents", f"USING GIN ({_course_text()} gin_trgm_ops)"),
+        ("ix_users_name_trgm",              "users",                   "USING GIN (name gin_trgm_ops)"),
+        ("ix_users_email_trgm",             "users",                   "USING GIN (email gin_trgm_ops)"),
+    ]
+    with engine.connect() as conn:
+        try:
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            conn.commit()
+        except Exception:
+            # Needs a role allowed to create extensions; search falls back to ILIKE without it
+            conn.rollback()
+        trigram = conn.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")).first() is not None
+        for name, table, using in indexes + (trigram_indexes if trigram else []):
+            try:
+                conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} {using}"))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+    search_index.trigram = trigram
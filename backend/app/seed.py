@@ -382,6 +382,11 @@ def seed():
         db.add(Report(reporter_id=stu.id, report_type=rtype, content=content,
                       status=status, created_at=datetime.utcnow() - timedelta(days=days_ago)))
     db.commit()
+    from app.aggregates import rebuild_course_stats
+    from app.catalog import bump_catalog
+    rebuild_course_stats(db)
+    bump_catalog(db)
+    db.commit()
 
     print("✅ Seed complete!")
     print(f"  Admins:      {db.query(User).filter(User.role==RoleEnum.admin).count()}")
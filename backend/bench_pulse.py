@@ -0,0 +1,96 @@
+"""
+Benchmark PULSE batch inference paths on synthetic rows.
+
+  legacy   — the original per-row predict_batch (dict copy + LabelEncoder.transform per categorical per row)
+  batch    — predict_batch(rows): dicts in, dicts out, built on predict_matrix
+  matrix   — predict_matrix(columns): arrays in, arrays out
+  pool     — the same columns sharded across app/pulse_pool.py's worker processes
+
+Needs the trained artifacts in PULSE/pulse_artifacts/.
+Run: python3 bench_pulse.py [--sizes 1000 10000 100000]
+"""
+import sys, os, time, argparse
+sys.path.insert(0, os.path.dirname(__file__))
+
+import numpy as np
+from app.pulse_predictor import predictor, load_pickled_artifacts, STATE_MAP
+from app.pulse_pool import pulse_pool
+
+MODEL, SCALER, ENCODERS = load_pickled_artifacts()
+
+
+def legacy_predict_batch(rows: list[dict]) -> list[dict]:
+    results = []
+    for row in rows:
+        feat_copy = dict(row)
+        for col, enc in ENCODERS.items():
+            raw = str(feat_copy.get(col, "Unknown"))
+            feat_copy[col] = int(enc.transform([raw])[0]) if raw in enc.classes_ else 0
+        results.append(np.array([feat_copy.get(f, 0) for f in predictor.metadata["feature_columns"]], dtype=float))
+    scaled = SCALER.transform(np.array(results))
+    states = MODEL.predict(scaled).tolist()
+    probas = MODEL.predict_proba(scaled).tolist()
+    return [
+        {
+            "state_id": int(s),
+            "state_label": STATE_MAP[int(s)],
+            "confidence": round(float(probas[i][int(s)]), 4),
+            "probabilities": {STATE_MAP[j]: round(float(pr), 4) for j, pr in enumerate(probas[i])},
+        }
+        for i, s in enumerate(states)
+    ]
+
+
+def synthetic_columns(n: int, rng: np.random.Generator) -> dict[str, np.ndarray]:
+    meta = predictor.metadata
+    columns = {}
+    for col in meta["feature_columns"]:
+        if col in meta["categorical_features"]:
+            classes = list(ENCODERS[col].classes_) + ["Unknown"]
+            columns[col] = rng.choice(np.array(classes, dtype=object), size=n)
+        else:
+            columns[col] = rng.gamma(2.0, 20.0, size=n)
+    return columns
+
+
+def pool_states(columns: dict[str, np.ndarray], shard: int = 5000) -> np.ndarray:
+    n = len(next(iter(columns.values())))
+    shards = ((i, {k: v[i:i + shard] for k, v in columns.items()}) for i in range(0, n, shard))
+    return np.concatenate([states for _, (states, _, _) in pulse_pool.score_chunks(shards)])
+
+
+def timed(fn, *args):
+    t = time.perf_counter()
+    out = fn(*args)
+    return out, time.perf_counter() - t
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    args = ap.parse_args()
+
+    if not predictor.is_ready:
+        sys.exit("PULSE artifacts not found in PULSE/pulse_artifacts/.")
+    rng = np.random.default_rng(42)
+    predictor.metadata  # load once, outside the timings
+    if pulse_pool.enabled:
+        pool_states(synthetic_columns(10, rng))   # spawn + load the workers, outside the timings
+
+    print(f"{'rows':>8} {'legacy s':>10} {'batch s':>10} {'matrix s':>10} {'pool s':>10} {'pool rows/s':>12} {'speedup':>8}  match")
+    for n in args.sizes:
+        columns = synthetic_columns(n, rng)
+        rows = [{k: (v[i] if isinstance(v[i], str) else float(v[i])) for k, v in columns.items()} for i in range(n)]
+
+        legacy, t_legacy = timed(legacy_predict_batch, rows)
+        batch, t_batch = timed(predictor.predict_batch, rows)
+        (states, proba), t_matrix = timed(predictor.predict_matrix, columns)
+        pooled, t_pool = timed(pool_states, columns) if pulse_pool.enabled else (states, t_matrix)
+
+        match = [r["state_id"] for r in legacy] == states.tolist() == pooled.tolist() and legacy == batch
+        print(f"{n:>8} {t_legacy:>10.3f} {t_batch:>10.3f} {t_matrix:>10.3f} {t_pool:>10.3f} {n / t_pool:>12.0f} "
+              f"{t_legacy / min(t_matrix, t_pool):>7.1f}x  {match}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Statement-count regression checks: how many SQL statements a read path issues
+must not grow with the amount of data behind it.
+
+  dashboard  — GET /api/instructor/dashboard, /courses and /analytics for an
+               instructor with 1 vs many courses (app/aggregates.py), with the
+               course_stats rows cold (rebuilt on read) and warm
+  curriculum — load_curriculum() (app/curriculum.py) for a 1-module, 1-quiz
+               course vs a 12-module, 4-quiz one: exactly 4 statements each,
+               with questions or question counts, rendering included
+
+Seeds a scratch database — an in-memory SQLite one unless BENCH_DATABASE_URL
+is set (never point it at a real database) — counts statements with a
+before_cursor_execute listener and exits non-zero if any count differs across
+sizes or from the expected count. Importing app.models still needs
+DATABASE_URL set, as for every other script; nothing is written there.
+Run: python3 bench_queries.py [--sizes 1 10 50] [--only dashboard|curriculum]
+"""
+import sys, os, argparse
+sys.path.insert(0, os.path.dirname(__file__))
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.models import Base, User, Course, Module, Lesson, Enrollment, Payment, Review, RoleEnum, ModuleQuiz, QuizQuestion
+from app.routers import instructor
+from app.curriculum import load_curriculum, editor_modules
+
+URL = os.getenv("BENCH_DATABASE_URL", "sqlite://")
+
+
+class StatementCounter:
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._count)
+
+    def _count(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+    def measure(self, fn, *args, **kwargs) -> int:
+        before = self.count
+        fn(*args, **kwargs)
+        return self.count - before
+
+
+def scratch_db():
+    kwargs = {"poolclass": StaticPool, "connect_args": {"check_same_thread": False}} if URL == "sqlite://" else {}
+    engine = create_engine(URL, **kwargs)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    return engine, sessionmaker(bind=engine)()
+
+
+def seed_instructor(db, n_courses: int) -> User:
+    """An instructor with n_courses, each with 2 modules of 3 lessons, 3 enrolled students, payments and reviews."""
+    tag = f"i{n_courses}"
+    teacher = User(name=f"Teacher {tag}", email=f"{tag}@bench.local", hashed_password="x", role=RoleEnum.instructor)
+    students = [User(name=f"Student {tag}-{k}", email=f"{tag}-s{k}@bench.local", hashed_password="x", role=RoleEnum.student)
+                for k in range(3)]
+    db.add_all([teacher, *students])
+    db.flush()
+    for i in range(n_courses):
+        course = Course(title=f"Course {tag}-{i}", instructor_id=teacher.id, status="published", price=10)
+        db.add(course)
+        db.flush()
+        for m in range(2):
+            module = Module(course_id=course.id, title=f"Module {m}", order=m + 1)
+            db.add(module)
+            db.flush()
+            db.add_all(Lesson(course_id=course.id, module_id=module.id, title=f"Lesson {m}.{k}", order=k + 1)
+                       for k in range(3))
+        for k, s in enumerate(students):
+            db.add(Enrollment(student_id=s.id, course_id=course.id, completion_pct=30.0 * k))
+            db.add(Payment(user_id=s.id, course_id=course.id, amount=10, status="completed"))
+            db.add(Review(student_id=s.id, course_id=course.id, rating=3 + k % 3))
+    db.commit()
+    return teacher
+
+
+def check_dashboard(sizes: list[int]) -> bool:
+    engine, db = scratch_db()
+    counter = StatementCounter(engine)
+    endpoints = {"dashboard": instructor.dashboard, "courses": instructor.my_courses, "analytics": instructor.analytics}
+    teachers = {n: seed_instructor(db, n) for n in sizes}
+    counts = {}
+    for n, teacher in teachers.items():
+        db.expire_all()
+        for name, endpoint in endpoints.items():
+            # The first read rebuilds the instructor's course_stats rows; the rest find them
+            counts.setdefault(f"{name} (cold)" if name == "dashboard" else name, []).append(
+                counter.measure(endpoint, db=db, current_user=teacher))
+        counts.setdefault("dashboard (warm)", []).append(counter.measure(instructor.dashboard, db=db, current_user=teacher))
+    db.close()
+    return report(f"dashboard: statements per request for {' / '.join(map(str, sizes))} courses", counts)
+
+
+def seed_course(db, n_modules: int, n_quizzes: int) -> int:
+    """A course with n_modules of 3 lessons, 2 loose lessons, and one 5-question quiz on each of the first n_quizzes modules."""
+    course = Course(title=f"Curriculum {n_modules}x{n_quizzes}", status="published")
+    db.add(course)
+    db.flush()
+    db.add_all(Lesson(course_id=course.id, title=f"Loose {k}", order=k + 1) for k in range(2))
+    for m in range(n_modules):
+        module = Module(course_id=course.id, title=f"Module {m}", order=m + 1)
+        db.add(module)
+        db.flush()
+        db.add_all(Lesson(course_id=course.id, module_id=module.id, title=f"Lesson {m}.{k}", order=k + 1)
+                   for k in range(3))
+        if m < n_quizzes:
+            quiz = ModuleQuiz(module_id=module.id, title=f"Quiz {m}")
+            db.add(quiz)
+            db.flush()
+            db.add_all(QuizQuestion(quiz_id=quiz.id, question_text=f"Q{k}", correct_answer="a", order=k + 1)
+                       for k in range(5))
+    db.commit()
+    return course.id
+
+
+def check_curriculum(expected: int = 4) -> bool:
+    engine, db = scratch_db()
+    counter = StatementCounter(engine)
+    shapes = [(1, 1), (12, 4)]
+    course_ids = [seed_course(db, *shape) for shape in shapes]
+    counts = {}
+    for cid in course_ids:
+        db.expire_all()
+        counts.setdefault("editor (questions)", []).append(
+            counter.measure(lambda: editor_modules(load_curriculum(db, cid))))
+        db.expire_all()
+        counts.setdefault("question counts", []).append(
+            counter.measure(load_curriculum, db, cid, with_questions=False))
+    db.close()
+    label = " / ".join(f"{m}-module {q}-quiz" for m, q in shapes)
+    return report(f"curriculum: statements per load for a {label} course", counts, expected)
+
+
+def report(title: str, counts: dict[str, list[int]], expected: int | None = None) -> bool:
+    ok = True
+    print(title)
+    for name, per_size in counts.items():
+        flat = len(set(per_size)) == 1 and (expected is None or per_size[0] == expected)
+        ok &= flat
+        verdict = "ok" if flat else (f"EXPECTED {expected}" if len(set(per_size)) == 1 else "GROWS WITH DATA")
+        print(f"  {name:<18} {' / '.join(map(str, per_size)):<16} {verdict}")
+    return ok
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 50], help="course counts for the dashboard check")
+    ap.add_argument("--only", choices=["dashboard", "curriculum"])
+    args = ap.parse_args()
+    ok = True
+    if args.only in (None, "dashboard"):
+        ok &= check_dashboard(args.sizes)
+    if args.only in (None, "curriculum"):
+        ok &= check_curriculum()
+    if not ok:
+        sys.exit("❌ Statement counts regressed.")
+    print("✅ Statement counts are as expected.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Export the trained PULSE artifacts to the compact inference layouts.
+
+  pulse_booster.ubj  — XGBoost native booster (UBJSON), no pickle / sklearn wrapper
+  pulse_trees.npz    — the same trees compiled to flat arrays for app/pulse_trees.py
+  pulse_preproc.npz  — scaler mean/scale + one sorted vocabulary per categorical,
+                       plain arrays readable with np.load(..., allow_pickle=False)
+
+The API prefers these files over the pickles when present. Re-run after every
+retrain. Before anything is written the compiled trees are checked against the
+pickled model's predict_proba on rows over the metadata feature set; the
+export aborts if any probability differs by more than PARITY_TOL, or any
+feature contribution differs from XGBoost's pred_contribs(approx_contribs=True)
+by more than CONTRIB_TOL. Afterwards a
+cold-start comparison of the layouts is printed.
+
+Run: python3 export_pulse.py [--parity-rows 20000] [--bench-runs 5]
+"""
+import sys, os, argparse, json, subprocess
+sys.path.insert(0, os.path.dirname(__file__))
+
+import numpy as np
+from app.pulse_predictor import ARTIFACTS_DIR, BOOSTER_FILE, PREPROC_FILE, TREES_FILE, load_pickled_artifacts
+from app.pulse_trees import compile_booster, TreeEnsemble
+
+PARITY_TOL  = 1e-6
+CONTRIB_TOL = 1e-4   # node means are stored as float32 and summed along each path
+CONTRIB_ROWS = 2000
+
+
+def parity_rows(meta: dict, scaler, encoders, n: int, rng: np.random.Generator) -> np.ndarray:
+    """Scaled rows over the metadata feature set: every vocabulary code plus one past it (unseen), ~2% NaN numerics."""
+    X = np.empty((n, len(meta["feature_columns"])))
+    for j, col in enumerate(meta["feature_columns"]):
+        if col in encoders:
+            X[:, j] = rng.integers(0, len(encoders[col].classes_) + 1, size=n)
+        else:
+            X[:, j] = rng.gamma(2.0, 20.0, size=n) * rng.choice([-1, 1], size=n, p=[0.1, 0.9])
+            X[rng.random(n) < 0.02, j] = np.nan
+    return scaler.transform(X)
+
+
+def check_parity(model, trees: TreeEnsemble, X: np.ndarray) -> float:
+    """Largest absolute probability difference between the pickled model and the compiled trees."""
+    expected = model.predict_proba(X).astype(np.float64)
+    got = trees.predict_proba(X)
+    return float(np.abs(expected - got).max())
+
+
+def check_contrib_parity(booster, trees: TreeEnsemble, X: np.ndarray) -> float:
+    """Largest absolute difference between XGBoost's path attributions and TreeEnsemble.predict_contribs."""
+    import xgboost as xgb
+    best = booster.attr("best_iteration")
+    expected = booster.predict(xgb.DMatrix(X), pred_contribs=True, approx_contribs=True,
+                               iteration_range=(0, int(best) + 1) if best is not None else (0, 0))
+    return float(np.abs(np.asarray(expected, dtype=np.float64) - trees.predict_contribs(X)).max())
+
+
+def export(artifacts_dir=ARTIFACTS_DIR, parity_n: int = 20000):
+    model, scaler, encoders = load_pickled_artifacts(artifacts_dir)
+    with open(artifacts_dir / "pulse_metadata.json") as f:
+        meta = json.load(f)
+
+    booster = model.get_booster()
+    trees = compile_booster(json.loads(booster.save_raw("json")))
+    ensemble = TreeEnsemble(trees)
+    X = parity_rows(meta, scaler, encoders, parity_n, np.random.default_rng(0))
+    diff = check_parity(model, ensemble, X)
+    print(f"parity: max |Δp| = {diff:.2e} over {parity_n} rows ({len(trees['roots'])} trees, depth {int(trees['depth'])})")
+    if diff > PARITY_TOL:
+        sys.exit(f"compiled trees disagree with the pickled model (> {PARITY_TOL}); nothing written.")
+    diff = check_contrib_parity(booster, ensemble, X[:CONTRIB_ROWS])
+    print(f"parity: max |Δcontrib| = {diff:.2e} over {min(parity_n, CONTRIB_ROWS)} rows")
+    if diff > CONTRIB_TOL:
+        sys.exit(f"compiled path attributions disagree with pred_contribs (> {CONTRIB_TOL}); nothing written.")
+
+    booster.save_model(str(artifacts_dir / BOOSTER_FILE))
+    np.savez(artifacts_dir / TREES_FILE, **trees)
+
+    empty = np.zeros(0, dtype=np.float64)
+    arrays = {
+        "mean"           : np.asarray(scaler.mean_,  dtype=np.float64) if getattr(scaler, "with_mean", False) else empty,
+        "scale"          : np.asarray(scaler.scale_, dtype=np.float64) if getattr(scaler, "with_std", False) else empty,
+        "feature_columns": np.asarray(meta["feature_columns"], dtype=str),
+        "categoricals"   : np.asarray(list(encoders), dtype=str),
+    }
+    for col, enc in encoders.items():
+        arrays[f"vocab_{col}"] = np.asarray(enc.classes_).astype(str)
+    np.savez(artifacts_dir / PREPROC_FILE, **arrays)
+
+
+_COLD_START = {
+    # Each snippet runs in a fresh interpreter: imports + artifact load + one prediction
+    "pickled": """
+from app.pulse_predictor import load_pickled_artifacts
+model, scaler, encoders = load_pickled_artifacts()
+model.predict_proba(scaler.transform(np.zeros((1, scaler.n_features_in_))))
+""",
+    "numpy": """
+from app.pulse_trees import TreeEnsemble
+from app.pulse_predictor import ARTIFACTS_DIR, TREES_FILE, PREPROC_FILE
+trees = TreeEnsemble.load(ARTIFACTS_DIR / TREES_FILE)
+with np.load(ARTIFACTS_DIR / PREPROC_FILE, allow_pickle=False) as pre:
+    arrays = {k: pre[k] for k in pre.files}
+trees.predict_proba(np.zeros((1, len(arrays["feature_columns"]))))
+""",
+    "booster": """
+import xgboost as xgb
+from app.pulse_predictor import ARTIFACTS_DIR, BOOSTER_FILE, PREPROC_FILE
+booster = xgb.Booster(); booster.load_model(str(ARTIFACTS_DIR / BOOSTER_FILE))
+with np.load(ARTIFACTS_DIR / PREPROC_FILE, allow_pickle=False) as pre:
+    arrays = {k: pre[k] for k in pre.files}
+booster.inplace_predict(np.zeros((1, len(arrays["feature_columns"]))))
+""",
+}
+
+
+def bench(runs: int):
+    print(f"{'layout':>8} {'best s':>8} {'median s':>9} {'max RSS MB':>11}")
+    here = os.path.dirname(os.path.abspath(__file__))
+    for label, body in _COLD_START.items():
+        # VmHWM (peak RSS) rather than ru_maxrss, which Linux carries over from the forking parent
+        code = ("import time; t = time.perf_counter(); import numpy as np\n" + body +
+                "\nhwm = next(l for l in open('/proc/self/status') if l.startswith('VmHWM')).split()[1]"
+                "\nprint(time.perf_counter() - t, hwm)")
+        runs_out = [
+            subprocess.run([sys.executable, "-c", code], cwd=here, check=True,
+                           capture_output=True, text=True).stdout.split()[-2:]
+            for _ in range(runs)
+        ]
+        times = sorted(float(t) for t, _ in runs_out)
+        rss_mb = max(int(r) for _, r in runs_out) / 1024   # kB
+        print(f"{label:>8} {times[0]:>8.4f} {times[len(times) // 2]:>9.4f} {rss_mb:>11.1f}")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--parity-rows", type=int, default=20000)
+    ap.add_argument("--bench-runs", type=int, default=5)
+    args = ap.parse_args()
+
+    if not (ARTIFACTS_DIR / "pulse_model.pkl").exists():
+        sys.exit("PULSE artifacts not found in PULSE/pulse_artifacts/.")
+    export(parity_n=args.parity_rows)
+    for name in (BOOSTER_FILE, TREES_FILE, PREPROC_FILE):
+        print(f"wrote {ARTIFACTS_DIR / name}")
+    if args.bench_runs:
+        bench(args.bench_runs)
+
+
+if __name__ == "__main__":
+    main()
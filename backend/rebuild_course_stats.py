@@ -0,0 +1,18 @@
+"""
+Rebuild the course_stats table from enrollments, payments, reviews, lessons
+and modules — after bulk imports, seeding or manual SQL edits.
+Run: python3 rebuild_course_stats.py
+"""
+import sys, os
+sys.path.insert(0, os.path.dirname(__file__))
+
+from app.models import SessionLocal
+from app.aggregates import rebuild_course_stats
+from app.catalog import bump_catalog
+
+db = SessionLocal()
+n = rebuild_course_stats(db)
+bump_catalog(db)
+db.commit()
+print(f"✅ Rebuilt course stats for {n} courses.")
+db.close()
@@ -2207,7 +2207,14 @@ export const studentApi = {
 // Messages API (unified — all roles)
 export const messagesApi = {
   getThreads: () => apiCall<any[]>('/messages/threads'),
-  getThread: (peerId: number) => apiCall<any[]>(`/messages/thread/${peerId}`),
+  getThread: (peerId: number, params?: { before_id?: number; after_id?: number; limit?: number }) => {
+    const q = new URLSearchParams()
+    if (params?.before_id) q.set('before_id', String(params.before_id))
+    if (params?.after_id) q.set('after_id', String(params.after_id))
+    if (params?.limit) q.set('limit', String(params.limit))
+    const qs = q.toString()
+    return apiCall<any[]>(`/messages/thread/${peerId}${qs ? `?${qs}` : ''}`)
+  },
   getContacts: (params?: { search?: string; role?: string; course_id?: number }) => {
     const q = new URLSearchParams()
     if (params?.search) q.set('search', params.search)
@@ -2265,11 +2272,24 @@ async function _legacyCall(method: string, url: string, options?: { params?: Rec
     }
     throw new Error(data.detail || `HTTP ${res.status}`)
   }
-  return { data };
+  return { data, headers: Object.fromEntries(res.headers.entries()) as Record<string, string> };
+}
+
+// Paginated admin lists send X-Next-Cursor until the last page; follow it and concatenate
+async function _legacyGetAll(url: string, options?: { params?: Record<string, any> }) {
+  let rows: any[] = [];
+  let cursor: string | undefined;
+  do {
+    const r = await _legacyCall('GET', url, { params: { limit: 500, ...options?.params, cursor } });
+    rows = rows.concat(r.data);
+    cursor = r.headers['x-next-cursor'];
+  } while (cursor);
+  return { data: rows };
 }
 
 const api = {
   get: (url: string, options?: { params?: Record<string, any> }) => _legacyCall('GET', url, options),
+  getAll: (url: string, options?: { params?: Record<string, any> }) => _legacyGetAll(url, options),
   post: (url: string, data?: any) => _legacyCall('POST', url, { data }),
   put: (url: string, data?: any) => _legacyCall('PUT', url, { data }),
   patch: (url: string, data?: any) => _legacyCall('PATCH', url, { data }),
@@ -31,11 +31,13 @@ export default function AdminSidebar() {
       api.get('/api/admin/payouts', { params: { status: 'pending' } }),
       api.get('/api/admin/reports', { params: { status: 'open' } }),
     ]).then(([s, i, a, p, r]) => {
+      // Paginated lists report their full size in X-Total-Count
+      const total = (r: any) => Number(r.headers?.['x-total-count'] ?? (Array.isArray(r.data) ? r.data.length : 0))
       setCounts({
-        students:      Array.isArray(s.data) ? s.data.length : 0,
+        students:      total(s),
         instructors:   Array.isArray(i.data) ? i.data.length : 0,
         admins:        Array.isArray(a.data) ? a.data.length : 0,
-        pendingPayouts:Array.isArray(p.data) ? p.data.length : 0,
+        pendingPayouts:total(p),
         openReports:   Array.isArray(r.data) ? r.data.length : 0,
       })
     }).catch(() => {})
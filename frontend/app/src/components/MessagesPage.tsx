@@ -1,4 +1,4 @@
-import React, { useEffect, useRef, useState } from 'react'
+import React, { useEffect, useLayoutEffect, useRef, useState } from 'react'
 import { messagesApi } from '../api/client'
 import { useAuth } from './AuthContext'
 import { playMessageSound } from '../utils/sounds'
@@ -14,6 +14,9 @@ type Contact = { id: number; name: string; role: string; avatar_initials: string
 type Course = { id: number; title: string; flag_emoji: string }
 type Attachment = { url: string; type: string; name: string }
 
+// The thread endpoint returns the latest PAGE messages; older ones are fetched with before_id on scroll-up
+const PAGE = 50
+
 const GROUPS = [
   { label: '@all students',    role: 'student',     course_id: undefined },
   { label: '@all instructors', role: 'instructor',  course_id: undefined },
@@ -53,6 +56,8 @@ export default function MessagesPage({ role }: { role: 'student' | 'instructor'
   const [threadsLoading, setThreadsLoading] = useState(true)
   const [active, setActive] = useState<Thread | null>(null)
   const [msgs, setMsgs] = useState<Msg[]>([])
+  const [hasOlder, setHasOlder] = useState(false)
+  const [loadingOlder, setLoadingOlder] = useState(false)
   const [text, setText] = useState('')
   const [attachment, setAttachment] = useState<Attachment | null>(null)
   const [uploading, setUploading] = useState(false)
@@ -69,6 +74,8 @@ export default function MessagesPage({ role }: { role: 'student' | 'instructor'
   const [sending, setSending] = useState(false)
 
   const bottomRef   = useRef<HTMLDivElement>(null)
+  const listRef     = useRef<HTMLDivElement>(null)
+  const keepScrollRef = useRef<number | null>(null)   // scrollHeight before older messages were prepended
   const fileRef     = useRef<HTMLInputElement>(null)
   const cFileRef    = useRef<HTMLInputElement>(null)
   const activeRef   = useRef<Thread | null>(null)
@@ -88,30 +95,62 @@ export default function MessagesPage({ role }: { role: 'student' | 'instructor'
 
   useEffect(() => { loadThreads() }, [])
 
-  const prevMsgCountRef = useRef(0)
+  const lastMsgIdRef = useRef(0)
+
+  const loadThread = (peerId: number) => messagesApi.getThread(peerId, { limit: PAGE }).then(data => {
+    lastMsgIdRef.current = data.length ? data[data.length - 1].id : 0
+    setHasOlder(data.length >= PAGE)
+    setMsgs(data)
+  }).catch(() => {})
+
+  // Only fetch messages newer than the last one we already have
+  const loadNewer = (peer: Thread) => messagesApi.getThread(peer.id, { after_id: lastMsgIdRef.current }).then(data => {
+    if (!data.length || activeRef.current?.id !== peer.id) return
+    if (data.some((m: Msg) => m.sender_id === peer.id)) playMessageSound()
+    lastMsgIdRef.current = data[data.length - 1].id
+    setMsgs(prev => [...prev, ...data.filter((m: Msg) => !prev.some(p => p.id === m.id))])
+  }).catch(() => {})
+
+  function loadOlder() {
+    const peer = activeRef.current
+    if (!peer || loadingOlder || !hasOlder || !msgs.length) return
+    setLoadingOlder(true)
+    messagesApi.getThread(peer.id, { before_id: msgs[0].id, limit: PAGE }).then(data => {
+      if (activeRef.current?.id !== peer.id) return
+      keepScrollRef.current = listRef.current?.scrollHeight ?? null
+      setHasOlder(data.length >= PAGE)
+      setMsgs(prev => [...data.filter((m: Msg) => !prev.some(p => p.id === m.id)), ...prev])
+    }).catch(() => {}).finally(() => setLoadingOlder(false))
+  }
 
   useEffect(() => {
     if (!active) return
-    prevMsgCountRef.current = 0
-    messagesApi.getThread(active.id).then(data => {
-      prevMsgCountRef.current = data.length
-      setMsgs(data)
-    }).catch(() => {})
+    lastMsgIdRef.current = 0
+    setHasOlder(false)
+    loadThread(active.id)
   }, [active])
 
   useEffect(() => {
     const id = setInterval(() => {
       loadThreads()
-      if (activeRef.current) messagesApi.getThread(activeRef.current.id).then(data => {
-        if (prevMsgCountRef.current > 0 && data.length > prevMsgCountRef.current) playMessageSound()
-        prevMsgCountRef.current = data.length
-        setMsgs(data)
-      }).catch(() => {})
+      const peer = activeRef.current
+      if (!peer) return
+      if (!lastMsgIdRef.current) { loadThread(peer.id); return }
+      loadNewer(peer)
     }, 3000)
     return () => clearInterval(id)
   }, [])
 
-  useEffect(() => { bottomRef.current?.scrollIntoView({ behavior: 'smooth' }) }, [msgs])
+  useLayoutEffect(() => {
+    const el = listRef.current
+    if (keepScrollRef.current !== null && el) {
+      // Older messages went in above: keep the ones on screen where they were
+      el.scrollTop += el.scrollHeight - keepScrollRef.current
+      keepScrollRef.current = null
+      return
+    }
+    bottomRef.current?.scrollIntoView({ behavior: 'smooth' })
+  }, [msgs])
 
   useEffect(() => {
     if (!showCompose) return
@@ -171,7 +210,7 @@ export default function MessagesPage({ role }: { role: 'student' | 'instructor'
     await messagesApi.send(text.trim(), [active.id], attachment ?? undefined)
     setText('')
     setAttachment(null)
-    messagesApi.getThread(active.id).then(setMsgs)
+    if (lastMsgIdRef.current) loadNewer(active); else loadThread(active.id)
     loadThreads()
   }
 
@@ -247,7 +286,13 @@ export default function MessagesPage({ role }: { role: 'student' | 'instructor'
                 </div>
               </div>
 
-              <div className="ca">
+              <div className="ca" ref={listRef} onScroll={e => { if (e.currentTarget.scrollTop < 40) loadOlder() }}>
+                {hasOlder && (
+                  <button onClick={loadOlder} disabled={loadingOlder}
+                    style={{ alignSelf: 'center', background: 'none', border: '1px solid var(--bdr)', borderRadius: 6, padding: '3px 10px', color: 'var(--mu)', fontSize: 10, fontFamily: 'JetBrains Mono', cursor: 'pointer' }}>
+                    {loadingOlder ? 'Loading…' : 'Load older messages'}
+                  </button>
+                )}
                 {msgs.length === 0 && <div style={{ textAlign: 'center', color: 'var(--mu)', fontSize: 11, fontFamily: 'JetBrains Mono', marginTop: 20 }}>Start the conversation</div>}
                 {msgs.map(m => {
                   const isMine = m.sender_id === user?.id
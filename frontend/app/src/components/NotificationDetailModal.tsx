@@ -39,6 +39,11 @@ export default function NotificationDetailModal({ notifId, onClose }: Props) {
     load()
   }
 
+  async function loadEarlierReplies() {
+    const r = await api.get(`/api/notifications/${notifId}/replies`, { params: { before_id: data.replies[0].id } })
+    setData((d: any) => ({ ...d, replies: [...r.data, ...d.replies] }))
+  }
+
   async function sendReply(e: React.FormEvent) {
     e.preventDefault()
     if (!replyText.trim()) return
@@ -108,7 +113,7 @@ export default function NotificationDetailModal({ notifId, onClose }: Props) {
               />
               {showReactors === r.emoji && r.users?.length > 0 && (
                 <div style={{ position: 'absolute', bottom: 'calc(100% + 6px)', left: 0, background: '#222', border: '1px solid #333', borderRadius: 8, padding: '6px 10px', fontSize: 11, color: '#ccc', whiteSpace: 'nowrap', zIndex: 10, boxShadow: '0 4px 16px rgba(0,0,0,.5)' }}>
-                  {r.users.slice(0, 8).join(', ')}{r.users.length > 8 ? ` +${r.users.length - 8}` : ''}
+                  {r.users.join(', ')}{r.count > r.users.length ? ` +${r.count - r.users.length}` : ''}
                 </div>
               )}
             </div>
@@ -140,9 +145,15 @@ export default function NotificationDetailModal({ notifId, onClose }: Props) {
         {data.allow_replies && (
           <div style={{ borderTop: '1px solid #1f1f1f', paddingTop: 16 }}>
             <div style={{ fontSize: 11, fontFamily: 'JetBrains Mono', color: 'var(--mu)', textTransform: 'uppercase', letterSpacing: '0.08em', marginBottom: 12 }}>
-              Replies ({data.replies?.length ?? 0})
+              Replies ({data.reply_count ?? data.replies?.length ?? 0})
             </div>
             <div style={{ display: 'flex', flexDirection: 'column', gap: 10, marginBottom: 14, maxHeight: 200, overflowY: 'auto' }}>
+              {data.replies?.length > 0 && data.replies.length < data.reply_count && (
+                <button onClick={loadEarlierReplies}
+                  style={{ alignSelf: 'center', background: 'none', border: 'none', color: 'var(--mu)', fontSize: 11, cursor: 'pointer' }}>
+                  Load earlier replies
+                </button>
+              )}
               {data.replies?.length === 0 && <div style={{ fontSize: 12, color: 'var(--mu)', textAlign: 'center', padding: '10px 0' }}>No replies yet. Be the first!</div>}
               {data.replies?.map((rep: any) => (
                 <div key={rep.id} style={{ display: 'flex', gap: 8, alignItems: 'flex-start' }}>
@@ -325,7 +325,7 @@ export default function CourseApprovals() {
 
   const load = () => {
     setLoading(true)
-    api.get('/api/admin/courses', { params: { status: tab } })
+    api.getAll('/api/admin/courses', { params: { status: tab } })
       .then(r => setCourses(r.data)).catch(() => {}).finally(() => setLoading(false))
   }
   useEffect(() => { load() }, [tab])
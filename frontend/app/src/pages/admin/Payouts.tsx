@@ -7,7 +7,7 @@ export default function Payouts() {
   const [payouts, setPayouts] = useState<any[]>([])
   const [loading, setLoading] = useState(true)
   const [tab, setTab] = useState('pending')
-  const load = () => { setLoading(true); api.get('/api/admin/payouts', { params: { status: tab } }).then(r => setPayouts(r.data)).catch(() => {}).finally(() => setLoading(false)) }
+  const load = () => { setLoading(true); api.getAll('/api/admin/payouts', { params: { status: tab } }).then(r => setPayouts(r.data)).catch(() => {}).finally(() => setLoading(false)) }
   useEffect(() => { load() }, [tab])
 
   async function update(id: number, status: string) { await api.patch(`/api/admin/payouts/${id}/status`, { status }); load() }